@@ -1,87 +1,188 @@
-import random
+import argparse
+import asyncio
 import pathlib
-import csv
+import random
 import sys
-import os
-import ast
-import time 
+import threading
+import time
+from gameengine import GameState, RestartGame, find_route, start_game, step
+from gamesave import Autosaver, SaveJournal, open_store
+from gametext import help_text, horizontal_line, render_event, render_greeting, render_invalid_option, render_items, render_map, render_no_route, title
 
 ########################################################################
-# Functions for Game Functionalities
+# Terminal
 ########################################################################
-horizontal_line = "__________________________________________"
 
-def save_game(player_name: str = "", player_state: str = "", player_returns: str = "", player_items: list = [], player_dead_enemies: list = []):
-    """Save the current state of the game
+class Terminal:
+    """Input and output of the terminal game. Lines are read from stdin in a background thread, so the event loop
+    keeps running (and animating) while the player types. Output is collected and written with a single
+    sys.stdout.write, when the player is asked for input or an animation starts.
+    """
+
+    def __init__(self):
+        self.output = []
+        self.lines = None
+        self.loop = None
+        # Running dots animation, which is cancelled when the next line of the player arrives
+        self.animation = None
+        # Total time spent waiting for the player and in animations (for the telemetry)
+        self.input_seconds = 0.0
+        self.animation_seconds = 0.0
+
+    def start(self):
+        """Start reading stdin - has to be called from the running event loop"""
+        self.loop = asyncio.get_running_loop()
+        self.lines = asyncio.Queue()
+        threading.Thread(target=self._read_lines, daemon=True).start()
+
+    def write(self, text: str):
+        """Add text to the output of the current turn"""
+        self.output.append(text)
+
+    def flush(self):
+        """Write the collected output at once"""
+        if self.output:
+            sys.stdout.write("".join(self.output))
+            self.output.clear()
+        sys.stdout.flush()
+
+    def has_input(self) -> bool:
+        """Check if the player already typed the next line"""
+        return not self.lines.empty()
+
+    async def input(self, prompt: str) -> str:
+        """Write the collected output and the prompt, then wait for the next line of the player
+
+        Args:
+            prompt (str): prompt for the player
+
+        Returns:
+            str: line without line ending
+        """
+        self.write(prompt)
+        self.flush()
+        start = time.perf_counter()
+        line = await self.lines.get()
+        self.input_seconds += time.perf_counter() - start
+        # stdin has been closed
+        if line == "":
+            raise EOFError
+        return line.rstrip("\r\n")
+
+    def _read_lines(self):
+        while True:
+            line = sys.stdin.readline()
+            self.loop.call_soon_threadsafe(self._line_arrived, line)
+            if line == "":
+                break
+
+    def _line_arrived(self, line: str):
+        self.lines.put_nowait(line)
+        if self.animation is not None:
+            self.animation.cancel()
+
+terminal = Terminal()
+
+########################################################################
+# Functions for Game Functionalities
+########################################################################
+# Every player can keep several saves (slots) in ~/Documents/codingnomads/projects/CLI-RPG/slots (or in the store
+# chosen with --store)
+store = open_store()
+# Changes of the game are written in the background, so the game never waits for the disk
+autosaver = Autosaver(store)
+# Slot of the current game
+slot = None
+# Save of older versions of the game (a single journal), which is imported into the slots of its player
+journal = SaveJournal()
+# Transcript of the game, if it is recorded with --record
+recorder = None
+# Telemetry of the game, if it is enabled with --telemetry
+telemetry = None
+# Profiler of the game, if it is enabled with --profile
+profiler = None
+
+def save_game(state: GameState):
+    """Save the current state of the game into its slot. It is written by the autosave thread right away, the
+    game doesn´t wait for it.
 
     Args:
-        player_name (str, optional): Name of the player. Defaults to "".
-        player_state (str, optional): State of the game play. Defaults to "".
-        player_returns (str, optional): Tracking, whether player goes down or up the track (return). Defaults to "".
-        player_items (list, optional): Items which player collected. Defaults to [].
-        player_dead_enemies (list, optional): Enemies the player defeated. Defaults to [].
+        state (GameState): current state of the game
     """
-    game_path = pathlib.Path.home().joinpath(
-        "Documents/codingnomads/projects/CLI-RPG/active-game.csv")
-    with open(game_path, "w") as gamefile:
-        row = [player_name, player_state, player_returns,
-               player_items, player_dead_enemies]
-        gamewriter = csv.writer(gamefile)
-        gamewriter.writerow(row)
-
-def open_game():  
+    autosaver.changed(state.player_name, slot, state, immediately=True)
+    if profiler is not None:
+        profiler.snapshot("save")
+
+def close_game():
+    """Write the last changes, close the save store, finish the transcript and write the telemetry of the game"""
+    autosaver.close()
+    store.close()
+    if recorder is not None and "game" in globals():
+        recorder.finish(game)
+    if telemetry is not None:
+        record_saves()
+        telemetry.close()
+    if profiler is not None:
+        profiler.stop()
+
+def record_saves():
+    """Add the saves, which the autosave thread has finished, to the telemetry"""
+    while autosaver.writes:
+        telemetry.save(*autosaver.writes.popleft())
+
+async def open_game(state: GameState = None) -> GameState:
     """Start game by start new session or opening up old one; initialization of values, if necessary
 
+    Args:
+        state (GameState, optional): state of the previous game, which is reset for a new game. Defaults to None.
+
     Returns:
-        All neccessary Information for gameplay
-        str: name of player,
-        str: state of player
-        str: tracking var, whether player goes down or up (return)
-        list: items player collected
-        list: enemies player defeated
+        GameState: All neccessary Information for gameplay
     """
-    game_path = pathlib.Path.home().joinpath(
-        "Documents/codingnomads/projects/CLI-RPG/active-game.csv")
-    # Check if file exists
-    if game_path.exists() == True:
-        with open(game_path, "r") as gamefile:
-            headers = ["player_name", "player_state", "player_returns",
-                       "player_items", "player_dead_enemies"]
-            reader = csv.DictReader(gamefile, fieldnames=headers)
-            player_info = list(reader)[0]
-            player_name = player_info["player_name"]
-            player_state = player_info["player_state"]
-            player_returns = player_info["player_returns"]
-            player_items = ast.literal_eval(player_info["player_items"])
-            player_dead_enemies = ast.literal_eval(player_info["player_dead_enemies"])
+    global slot
+    # Changes of the previous game are written, before the slots are read
+    if not autosaver.flush():
+        terminal.write(f"\nSorry, your last changes couldn´t be saved ({autosaver.error}) - the game tries again later.\n")
+    player_name = await input_and_validation("Tell me your name", ["any"])
+    slots = store.slots(player_name)
+    # The save of an older version of the game becomes a slot of its player - once, its files are renamed afterwards
+    if not slots and journal.exists():
+        saved_state = journal.load()
+        if saved_state is not None and saved_state.player_name == player_name:
+            store.save(player_name, "active-game", saved_state)
+            journal.archive()
+            slots = ["active-game"]
+    # Check if the player has saves
+    while slots:
+        terminal.write(f"\nYour saved games: {', '.join(slots)}\n")
+        choice = await input_and_validation(
+            "Type in the name of a saved game to open it, 'delete' to delete one or 'new' to start a new game",
+            {"new", "delete", *slots})
+        if choice == "new":
+            break
+        if choice == "delete":
+            store.delete(player_name, await input_and_validation("Which game do you want to delete", set(slots)))
+            slots = store.slots(player_name)
+            continue
+        saved_state = store.load(player_name, choice)
+        if profiler is not None:
+            profiler.snapshot("load")
         # Workaround to handle corrupt file
-        if player_name == "":
-            player_name = input_and_validation("Tell me your name", ["any"])
-            player_state = ""
-            player_returns = ""
-            player_items = []
-            player_dead_enemies = []
-        else:
-            print("\nDo you want to start a new game or open your previous one?")
-            start_new_game = input_and_validation(
-                "Type in 'open' to open your game or 'new' to start a new one", {"open", "new"})
-    # No file exists        
-    else:
-        start_new_game = "new"
+        if saved_state is not None:
+            slot = choice
+            return saved_state
+        terminal.write(f"\nSorry, the game '{choice}' can´t be opened.\n")
+        slots.remove(choice)
     # Start new game
-    if start_new_game == "new":
-                player_name = input_and_validation(
-                    "Tell me your name", ["any"])
-                player_state = ""
-                player_returns = ""
-                player_items = []
-                player_dead_enemies = []
-    #Override the saved file with the current game   
-    save_game(player_name, player_state, player_returns, player_items, player_dead_enemies)
-    # Return all necessary items to start game
-    return player_name, player_state, player_returns, player_items, player_dead_enemies
-
-def exit_game(option: str = ""):
+    slot = await input_and_validation("Give your new game a name (a saved game of the same name is replaced)", ["any"])
+    if state is None:
+        state = GameState(player_name)
+    else:
+        state.reset(player_name)
+    store.save(player_name, slot, state)
+    return state
+
+async def exit_game(option: str = ""):
     """Function to end the game aka execution of script
 
     Args:
@@ -90,27 +191,33 @@ def exit_game(option: str = ""):
     """
     # Check if Player wants to restart the game
     if option == "restart":
-        chosen_action = input_and_validation("Would you like to play again? \nType in 'restart' to restart, 'no' to end the game",{"no"})
+        chosen_action = await input_and_validation("Would you like to play again? \nType in 'restart' to restart, 'no' to end the game",{"no"})
         if chosen_action == "no":
+            close_game()
+            terminal.flush()
             sys.exit("\nThanks for playing with us!\n")
     # Game is closed immediatly w/out asking to save
     elif option == "immediate":
+        close_game()
+        terminal.flush()
         sys.exit("\nThanks for playing with us!\n")
     # Ask player to save the game and quit
     else:
-        print(f"{horizontal_line}")
-        print("\nDo you want to save your current state of the game ?")
-        save_game_choice = input_and_validation(
+        terminal.write(f"{horizontal_line}\n")
+        terminal.write("\nDo you want to save your current state of the game ?\n")
+        save_game_choice = await input_and_validation(
             "Type in 'yes' to save your game or 'no' to just leave", {"yes", "no"})
         if save_game_choice == "yes":
-            if "player_name" in globals():
-                save_game(player_name, player_state, player_returns,
-                        player_items, player_dead_enemies)
+            # A game, which is over, isn´t saved (opening it would only kill the player again)
+            if "game" in globals() and not game.is_over():
+                save_game(game)
             else:
-                print("\nSorry, but there is nothing to save.")
+                terminal.write("\nSorry, but there is nothing to save.\n")
+        close_game()
+        terminal.flush()
         sys.exit("\nThanks for playing with us!\n")
 
-def input_and_validation(message: str, valid_options: set) -> str:
+async def input_and_validation(message: str, valid_options: set) -> str:
     """Ask user for input and validate his input based on the provided options. If not valid, ask again.
 
     Args:
@@ -122,606 +229,223 @@ def input_and_validation(message: str, valid_options: set) -> str:
     """
     while True:
         # Ask for User Input
-        user_input = input("\n" + message + ": ")
+        try:
+            user_input = await terminal.input("\n" + message + ": ")
+        except EOFError:
+            await exit_game("immediate")
         # Check if User Input is a predefined keyword which gives player certain options
         ## Exit the game
         if user_input.lower() == "exit":
-            exit_game()
+            await exit_game()
         ## Save the current progress
         elif user_input.lower() == "save":
-            print(f"{horizontal_line}")
-            if "player_name" in globals():
-                save_game(player_name, player_state, player_returns,
-                          player_items, player_dead_enemies)
-                print("\nYour progress has been saved.")
+            terminal.write(f"{horizontal_line}\n")
+            if "game" in globals() and not game.is_over():
+                save_game(game)
+                terminal.write("\nYour progress has been saved.\n")
             else:
-                print("\nSorry, but there is nothing to save.")
-            print(f"{horizontal_line}")
+                terminal.write("\nSorry, but there is nothing to save.\n")
+            terminal.write(f"{horizontal_line}\n")
         ## Display items, which the player currently has
         elif user_input.lower() == "items":
-            print(f"{horizontal_line}")
-            if player_items == []:
-                print("\nYou currently have no items in your bag.")
-            else:
-                name_of_player_items = [x['name'] for x in player_items]
-                print("\nThese are the current items in your bag: " +
-                      ", ".join(name_of_player_items))
-            print(f"{horizontal_line}")
+            terminal.write(render_items(game if "game" in globals() else None))
         ## Display a game map
         elif user_input.lower() == "map":
-            print(f"{horizontal_line}")
-            basic_game_map = ("\n"
-                "            ||             \n"
-                "   left---middle----right  \n"
-                "   ||       ||        ||   \n"
-                )
-            if player_state == "":
-                game_map = basic_game_map
-            elif player_state.startswith("_leftroom"):
-                game_map = basic_game_map + "   You                     "
-            elif player_state.startswith("_middleroom"):
-                if player_state.startswith("_middleroom_go down_oldroom"):
-                    game_map = basic_game_map + (
-                        "            ||             \n"
-                        "            /\\            \n"
-                        "          old modern       \n"
-                        "          ||               \n"
-                        "          You              "
-                        )
-                elif player_state.startswith("_middleroom_go down_modernroom"):
-                    game_map = basic_game_map + (
-                        "            ||             \n"
-                        "            /\\            \n"
-                        "          old modern       \n"
-                        "                ||         \n"
-                        "                You        "
-                        )
-                elif player_state == "_middleroom_go down":
-                    game_map = basic_game_map + (
-                        "            ||             \n"
-                        "            You            \n"
-                        "            /\\            \n"
-                        "          old modern       "
-                        )
-                else: 
-                    game_map = basic_game_map + "            You            "           
-            elif player_state.startswith("_rightroom"):
-                game_map = basic_game_map + "                      You "
-            print(game_map)
-            print(f"{horizontal_line}")
+            terminal.write(render_map(game if "game" in globals() else None))
         ## Display help message
         elif user_input.lower() == "help":
-            print(f"{horizontal_line}")
-            print("\nWelcome to a new Dungeons and Dreagons game.\nLet´s discuss some rules at the beginning. At any time, you can type 'exit' to quit the game, 'save' to save your current progress, 'items' to see your current items, 'map' to see a map of the game or 'help' to view this message again.")
-            print(f"{horizontal_line}")
+            terminal.write(help_text)
+        ## Travel to a visited room (the game engine moves the player)
+        elif user_input.startswith("goto ") and "game" in globals() and valid_options == set(game.options()):
+            try:
+                find_route(game, user_input[5:])
+            except ValueError as error:
+                terminal.write(render_no_route(str(error)))
+                continue
+            terminal.write(f"{horizontal_line}\n")
+            await load_answer()
+            break
         ## Restart the game
         elif user_input.lower() == "restart":
-            print(f"{horizontal_line}")
-            restart_decision = input_and_validation("Are you sure? Type in 'yes' or 'no'",
+            terminal.write(f"{horizontal_line}\n")
+            restart_decision = await input_and_validation("Are you sure? Type in 'yes' or 'no'",
                                                  {"yes", "no"})
             if restart_decision == "yes":
-                os.execv(sys.executable, ['python'] + [sys.argv[0]])
+                raise RestartGame()
         # Start Input-Validation
         ## User may provide anything (eg. his name)
         elif "any" in valid_options:
-            print(f"{horizontal_line}")
-            load_answer()
+            terminal.write(f"{horizontal_line}\n")
+            await load_answer()
             break
         ## User may only provide certain valid options
         elif user_input not in valid_options:
-            options = ""
-            for option in valid_options:
-                options += f"'{option}' or "
-            options = options[:-4]
-            print(f"{horizontal_line}")
-            print(
-                f"\nI am sorry, but you have to type either {options}.", end="\n")
-            print(f"{horizontal_line}")
+            terminal.write(render_invalid_option(valid_options))
         ## User provided a valid option
         else:
-            print(f"{horizontal_line}")
-            load_answer()
+            terminal.write(f"{horizontal_line}\n")
+            await load_answer()
             break
     return user_input
 
-def load_answer(dots_per_second: float = 3):
+async def load_answer(dots_per_second: float = 3):
     """Animation function to make the game look more interative. During a short amount of time, loading-dots are displayed.
+    The animation stops as soon as the player types the next command - or is skipped, if he already did.
 
     Args:
         dots_per_second (float, optional): Provide the ammount of dots, which are load per second. Defaults to 3.
     """
-    # number of characters to print out per second
-    loading_string = "." * 3 # characters to print out one by one (6 dots in this example)
-    for n in range(0,1):
-        #  track both the current character and its index for easier backtracking later
-        for index, char in enumerate(loading_string):
-            # you can check your loading status here
-            # if the loading is done set `loading` to false and break
+    terminal.flush()
+    if terminal.has_input():
+        return
+    start = time.perf_counter()
+    terminal.animation = asyncio.create_task(animate_dots(dots_per_second))
+    # asyncio.wait does not raise, if the animation has been cancelled
+    await asyncio.wait({terminal.animation})
+    terminal.animation = None
+    terminal.animation_seconds += time.perf_counter() - start
+
+async def animate_dots(dots_per_second: float):
+    """Display the loading-dots one by one and remove them again (also if the animation is cancelled)
+
+    Args:
+        dots_per_second (float): ammount of dots, which are load per second
+    """
+    loading_string = "." * 3 # characters to print out one by one
+    index = 0
+    try:
+        for char in loading_string:
             sys.stdout.write(char)  # write the next char to STDOUT
             sys.stdout.flush()  # flush the output
-            time.sleep(1.0 / dots_per_second)  # wait to match our speed
-        index += 1  # lists are zero indexed, we need to increase by one for the accurate count
+            index += 1
+            await asyncio.sleep(1.0 / dots_per_second)  # wait to match our speed
+    finally:
         # backtrack the written characters, overwrite them with space, backtrack again:
         sys.stdout.write("\b" * index + " " * index + "\b" * index)
         sys.stdout.flush()  # flush the output
-    
+
 ########################################################################
-# Functions for Game Interaction
+# Functions for Game Output
 ########################################################################
 
-def choose_doors(*args, can_return: bool = False):
-    """Display given doors to the user and let him decide, which one he would like to go through. Takes current user state and adds user decision.
+async def show_events(events: list):
+    """Display the events, which the game engine returned, to the user
 
     Args:
-        door_names (string): Name of the doors, the user may choose (have to be unique)
-        can_return (bool, optional): Give user the option not only to go through the doors but return to the previous state. Defaults to False.
-
-    Returns:
-        string: new state of the player
-        string: displays if user is going down or up (return)
+        events (list): events of the game engine
     """
-    player_returns = False
-    number_of_doors = len(args)
-    # Visualization of door options (flexible amount if doors) 
-    vis_door_top = ""
-    vis_door_middle = ""
-    vis_door_bottom = ""
-    vis_door_name = ""
-    for door in args:
-        if len(door) > 5:
-            door_name = door[:6]
+    for event in events:
+        if event["type"] == "pause":
+            await load_answer(1)
         else:
-            door_name = door
-        vis_door_top += "  ___  "
-        vis_door_middle += " |   | "
-        vis_door_bottom += "  ---  "
-        vis_door_name += f"{door_name:^7}"
-    vis_door_top += "\n"
-    vis_door_middle += "\n"
-    vis_door_bottom += "\n"
-    vis_door_name += "\n"
-    door_visualization = vis_door_top + \
-        (vis_door_middle * 3) + vis_door_bottom + vis_door_name
-    # Generate string of doors for message, which is displayed to user
-    doors = set(f"{door} door" for door in args)
-    door_options = ""
-    for door in doors:
-        door_options += f"'{door}' or "
-    door_options = door_options[:-4]
-    # Display Message to user and take user input
-    if can_return == False:
-        print(
-            (f"\nOk, {player_name}. I see, that you are standing in front of {number_of_doors} doors.\n"
-            f"{door_visualization}"
-            "Through which one would you like to go?"))
-        chosen_action = input_and_validation(f"Write eithter {door_options} to select either of them", 
-                                         doors)
-    else:
-        doors.add('return')
-        door_visualization += "OR: Return to prev. room\n"
-        print(
-            (f"\nOk, {player_name}. I see, that you are standing in front of {number_of_doors} doors.\n"
-            f"{door_visualization}"
-            "Through which one would you like to go - or do you want to return?"))
-        chosen_action = input_and_validation(f"Write eithter {door_options} to select either of them - you may also type 'return' to go back to the previous room", 
-                                         doors)
-    # Define new player state based on the given input
-    chosen_action = chosen_action.split()[0]
-    if chosen_action == "return":
-        new_state = player_state.rsplit("_", 1)[0]
-        player_returns = True
-    else: 
-        room_to_enter = chosen_action + "room"
-        new_state = f"{player_state}_{room_to_enter}"
-    return new_state, player_returns
-
-def decide_options(options: set):
-    """Display given options to the user and let him decide, which option to take
+            terminal.write(render_event(event, game))
 
-    Args:
-        options (set): available options for user to choose
+########################################################################
+# Game Introduction
+########################################################################
 
-    Returns:
-        string: new state of the player
-        string: displays if user is going down or up (return)
-    """
-    player_returns = False
-    # Generate string of options for message, which is displayed to user
-    string_options = ""
-    for opt in options:
-        string_options += f"'{opt}' or "
-    string_options = string_options[:-4]
-    # Display Message to user and take user input
-    chosen_action = input_and_validation(f"Write eithter {string_options} to select either of them",
-                                                options)
-    # Define new player state based on given input
-    if chosen_action == "return":
-        #Split the last decision-option to return to previous playing state
-        new_state = player_state.rsplit("_", 1)[0]
-        player_returns = True
-    elif chosen_action == "stay":
-        new_state = player_state
-    else: 
-        new_state = f"{player_state}_{chosen_action}" 
-    return new_state, player_returns
-
-def filter_room(items_to_find: list = [], enemies_to_find: list = []) -> dict:
-    """Filter predefined room in order to exclude items, which user already has, as well as enemies, the user already defeated
+async def play(record: str = None):
+    """Play games until the player leaves. A restart starts the next game in the same process: the world, the
+    assets, the save store and the game state object are reused.
 
     Args:
-        items_to_find (list, optional): predefined items of the room. Defaults to [].
-        enemies_to_find (list, optional): predefined enemies of the room. Defaults to [].
-
-    Returns:
-        dict: returns room dict, which contains both filtered items and enemies
+        record (str, optional): file, into which the transcript of the first game is recorded - later games are
+            recorded into numbered files (eg. bug-2.jsonl). Defaults to None.
     """
-    # Example of Input
-    ## items = [{"name": "sowird", "score" : 10, "type":"weapon"}}]
-    ## enemies = [{"name"="dragon", "defeat_items":"", "defeat_condition": "", "loss_consequence": "death", "canHide": True}]
-    filtered_room = {}
-    list_of_enemies = []
-    list_of_items = []
-    #Filter enemies by comparing enemies with defeated enemies
-    if enemies_to_find:
-        for enemy in enemies_to_find:
-            if enemy["name"] not in player_dead_enemies:
-                list_of_enemies.append(enemy)
-    # Filter items by comparing items with player_items
-    elif items_to_find:
-        for item in items_to_find:
-            if item not in player_items:
-                list_of_items.append(item)
-    filtered_room.update({"items": list_of_items})
-    filtered_room.update({"enemies": list_of_enemies})
-    # return the filtered room
-    return filtered_room
-
-def take_item(item: dict = {}):
-    # item = {"name": "", "type":"weapon/multiplier_item/discover_item/special_item/death_item", "score":"", "string_image":""}
-    if item != {}:
-        print(f"\nYou found a new item: {item['name']}! Do you want to take it ?")
-        #Manually add drawings of items
-        if item["string_image"] != "":
-            print(item["string_image"])       
-        chosen_action = input_and_validation("Write either 'take' or 'leave' to select either of them",
-                                                        {"take", "leave"})
-        if chosen_action == "take":
-            if item["type"] == "death_item":
-                print(f"\nUf, to take this {item['name']} wasn´t a good choice. As your gaze beginns to rotate, you realize this wasn´t a good idea.")
-                print(f"The {item['name']} was toxic - you die and loose the game.")
-                print(f"{horizontal_line}")
-                exit_game("restart")
-            else:
-                player_items.append(item)
-
-def fight_enemy(enemy: dict = {}):
-    """Process of player fighting a predefined enemy
+    terminal.start()
+    record_path = record
+    number = 1
+    while True:
+        try:
+            await play_game(record_path)
+        except RestartGame:
+            if recorder is not None:
+                recorder.finish(game)
+            number += 1
+            if record is not None:
+                record_path = pathlib.Path(record).with_name(f"{pathlib.Path(record).stem}-{number}{pathlib.Path(record).suffix}")
+
+async def play_game(record: str = None):
+    """Introduction and game loop of one game
 
     Args:
-        enemy (dict, optional): Predefined enemy. Defaults to {}.
-
-    Returns:
-        As fight may has consequences on user items or enemies defeated by the player, theses variables have to be updates
-        list: items of player
-        list: enemies the player has defeated
-    """
-    # Example of enemy
-    ## enemies = [{"name"="dragon", "defeat_items":"", "defeat_condition": "", "loss_consequence": "death", "canHide": True}]
-    if enemy != {}:
-        print(f"\nOh boy, you have encountered a {enemy['name']}. Would you like to fight it or hide and back off ?")
-        # When encountering an enemy, user may decide to fight or hide
-        chosen_action = input_and_validation("Write eithter 'fight' or 'hide' to select either of them",
-                                                 {"fight", "hide"}) 
-        outcome = "loss"
-        ## User decides to fight
-        if chosen_action == "fight":
-            # The fight outcome depends on two variables: Items and Condition
-            # 1. User need to have all the necessary items to win the fight
-            if set(enemy['defeat_items']).issubset(set([x['name'] for x in player_items])):
-                print("\nLuckily, you have all the necessary weapons: " + ", ".join(enemy['defeat_items']))
-                # 2. Furthermore, each enemy has an individual defeat condition
-                ## There are different kinds of conditions: random, dice, damage, none
-                ### Random: The outcome is decided by random choice
-                if enemy["defeat_condition"] == "random":
-                    num = random.randint(0,1)
-                    if num == 1:
-                        outcome = "win"
-                ### Dice: The outcome depends on a user´s virtual dice throw
-                elif enemy["defeat_condition"].startswith("dice"):
-                    # Predefined condition may be: bigger, smaller or equal to dice number
-                    ## example: dice +6
-                    # Let the user dice
-                    print("\nThe outcome of the fight depends on your dice throw! Are you ready?", end="")
-                    chosen_action = input_and_validation("Type in 'dice' to throw the dices",
-                                                 {"dice"})
-                    num = random.randint(1,6)
-                    print(f"\nYou rolled a {num}")
-                    # Try dice throw with condition
-                    condition = enemy["defeat_condition"].split()[1]
-                    condition_number = int(condition[-1])
-                    ## Dice-Throw-Number bigger than defined number
-                    if condition.startswith("+"):
-                        if num > condition_number:
-                            outcome = "win"
-                    ## Dice-Throw-Number smaller than defined number
-                    elif condition.startswith("-"):
-                        if num < condition_number:
-                            outcome = "win"
-                     ## Dice-Throw-Number euql to defined number
-                    elif condition.startswith("="):
-                        if num == condition_number:
-                            outcome = "win"            
-                #### Damage: The outcome depends on the damage, the user can inflict on enemy
-                elif enemy["defeat_condition"].startswith("damage"):
-                    # Predifend condition contains treshhold of damage and (optional) mulitplier condition (dice / none)
-                    ## Example: damage>10&multiplier 
-                    condition = enemy["defeat_condition"].split(">")[1]
-                    condition_number = int(condition.split("&")[0])
-                    condition_muliplier = condition.split("&")[1]
-                    # Find the user fight-score = damage he inflicts
-                    ## 1. Multiplyier Items
-                    ### Check if user has muliplying items, which multiply the damage of weapons
-                    multiplier_items = [x["score"] for x in player_items if x["type"] == "multiplier_item"]
-                    muliplier = 1
-                    for num in multiplier_items:
-                        muliplier *= num
-                    ### Help user with a hint, if he has no such items
-                    if muliplier == 1:
-                        print("\nBut I noticed, you have no items which amplify the strength of your weapon - this is a pitty.")
-                    ## 2. Weapons
-                    ### Find score of the weapons, which can be used for the concrete enemy
-                    weapon_score = 0
-                    useable_weapon_items = [x["score"] for x in player_items if x["type"] == "weapon" and x["name"] in enemy["defeat_items"]]
-                    for num in useable_weapon_items:
-                            weapon_score += num
-                    ## 3. Combine multiplying items and weapons to fight score = damage
-                    user_fight_score = weapon_score * muliplier
-                    # Apply (external) multiplier if in predefined condition of enemy
-                    ## no external multiplier
-                    if condition_muliplier == "":
-                        if user_fight_score > condition_number:
-                            outcome = "win"
-                    ## external muliplier == dice
-                    elif condition_muliplier == "dice":
-                        # let user throw dices          
-                        print("\nThe outcome of the fight depends on your dice throw! Are you ready?", end="")
-                        chosen_action = input_and_validation("Type in 'dice' to throw the dices",
-                                                    {"dice"})
-                        num = random.randint(1,6)
-                        print(f"\nYou rolled a {num}")
-                        # multiply user fight score with multiplier
-                        user_fight_score *= num
-                        if user_fight_score > condition_number:
-                            outcome = "win"                        
-                else:
-                    outcome = "win"            
-            else: 
-                print(f"\nUf, fighting a {enemy['name']} without the right kind of weapons – this was hopeless.", end=" ")
-        ## User decides to hide
-        elif chosen_action == "hide":
-            # Player can´t hide of all enemies
-            ## If player cant hide but does, he looses the fight
-            if enemy['canHide'] == False:
-                print(f"\nUps, you can´t hide from a {enemy['name']}")
-                outcome = "loss"
-            else: 
-                outcome = "hidden"
-        # Determine consequences of win / loss
-        updated_player_items = player_items
-        updated_player_dead_enemies = player_dead_enemies
-        ## Player lost the fight
-        if outcome == "loss":
-            # Different, predefined consequences
-            ## Death
-            if enemy['loss_consequence'] == "death":
-                print(f"You got eaten by the {enemy['name']} and lost the game. I am sorry.")
-                exit_game("restart")
-            ## Loss of all items, but no death
-            elif enemy['loss_consequence'] == "loose_items":
-                print(f"Whoa, this did not end up lucky for you - you have lost all your items.")
-                updated_player_items = []
-        ## Player won the fight
-        elif outcome == "win":
-            print(f"\nCongratulations, {player_name}! You defeated the {enemy['name']}!")
-            # Add enemy to list of defeated enemies
-            updated_player_dead_enemies.append(enemy["name"])
-            # Check if user has won the game
-            check_win()
-    return updated_player_items, updated_player_dead_enemies
-
-def check_win():
-    """Check if user has won the game. Check user against winning condition and display message.
+        record (str, optional): file, into which the transcript of the game is recorded. Defaults to None.
     """
-    # Winning Condition
-    if set(["dragon","leprechaun"]).issubset(set(player_dead_enemies)):
-        print(f"{horizontal_line}")
-        print(("\n"
-            "#                     #  #  #       #\n"
-            " #         #         #   #  # #     #\n"
-            "  #       # #       #    #  #  #    #\n"
-            "   #     #   #     #     #  #   #   #\n"
-            "    #   #     #   #      #  #    #  #\n"
-            "     # #       # #       #  #     # #\n"
-            "      #         #        #  #       #"    
-        ))
-        print(f"{horizontal_line}")
-        print("\nCongratulations, you have found all the enemies in this place. You may now run around this place for as long as you want - or exit the game.")
-        print(f"{horizontal_line}")
-        input_and_validation("Write 'continue' to continue the game or 'exit' to exit the game",
-                                                     {"continue"})
+    global game, recorder
+    # Introduction
+    terminal.write(title + help_text)
+    # Load current game or initiallize a new game
+    game = await open_game(game if "game" in globals() else None)
+    if record is not None:
+        from gamereplay import TranscriptRecorder
+        # The fights of a recorded game use their own seeded random number generator, so the game can be replayed
+        seed = random.randrange(2 ** 32)
+        game.rng = random.Random(seed)
+        recorder = TranscriptRecorder(record, game, seed)
+    # Display a message that greets them and introduces them to the game world.
+    terminal.write(render_greeting(game.player_name))
+    await load_answer(1)
+    if profiler is not None:
+        profiler.snapshot("startup")
+
+    ####################################################################
+    # Start of the game logic
+    ####################################################################
+    # The game logic lives in gameengine.py - here we only ask the player for the next command and display what happened
+    await show_events(start_game(game))
+    while True:
+        if game.is_over():
+            await exit_game("restart")
+        turn_start = time.perf_counter()
+        input_before, animation_before = terminal.input_seconds, terminal.animation_seconds
+        from_room = game.room
+        command = await input_and_validation(game.pending["message"], set(game.options()))
+        game, events = step(game, command)
+        autosaver.turn(game.player_name, slot, game, from_room, events)
+        if recorder is not None:
+            recorder.record(command)
+        if profiler is not None and game.room != from_room:
+            profiler.snapshot(f"room {game.player_state}")
+        await show_events(events)
+        if telemetry is not None:
+            telemetry.events(events)
+            input_seconds = terminal.input_seconds - input_before
+            animation_seconds = terminal.animation_seconds - animation_before
+            logic_seconds = time.perf_counter() - turn_start - input_seconds - animation_seconds
+            record_saves()
+            telemetry.turn(from_room, game.room, input_seconds, logic_seconds, animation_seconds)
 
 ########################################################################
-# Game Introduction
+# Entry Point
 ########################################################################
-# Introduction
-print(f"\n{horizontal_line}")
-print((
-    "####         ###       ####   \n"
-    "#   #       #   #      #   #  \n"
-    "#    #     #     #     #    #   \n"   
-    "#     #   #       #    #     #    \n"
-    "#     #   #       #    #     #    \n"
-    "#    #    # # # # #    #    #  \n"  
-    "#   #     #       #    #   #   \n"
-    "####      #       #    ####   "
-))
-print(f"{horizontal_line}")
-print("\nWelcome to a new Dungeons and Dreagons game.\nLet´s discuss some rules at the beginning. At any time, you can type 'exit' to quit the game, 'save' to save your current progress, 'items' to see your current items, 'map' to see a map of the game or 'help' to view this message again.")
-print(f"{horizontal_line}")
-# Load current game or initiallize a new game
-player_name, player_state, player_returns, player_items, player_dead_enemies = open_game()
-# Display a message that greets them and introduces them to the game world.
-print((f"""\nHello, {player_name}! I am so happy, that you joined our game world. Let´s start a new Dungeons and Dreagons game.\n"""
-      f"""In order to play, you will have to talk to me and take some decisions. Are you ready? \nGreat! Lets Go…"""))
-print(f"{horizontal_line}")
-load_answer(1)
+# Importing this module has no side effects - the game only starts, when main() is called
 
-########################################################################
-# Start of the game logic
-########################################################################
-while True:
-    # Logic depends on Player states rather than Rooms - To have a logical structure in the code, the if statements are grouped by .startwith()
-    # Each decision-situation may have to deverging messages, depending on the player going down or up (return way) > player_returns
-    ########################################################################
-    # Start-Room
-    if player_state == "":
-        player_state, player_returns = choose_doors("left", "middle", "right")
-
-    ########################################################################
-    # Left-Room 
-    elif player_state.startswith("_leftroom") == True:
-        # Left Room - Start
-        if player_state == "_leftroom":
-            if player_returns == False:
-                print("\nAs you walk into the room behind the left door, you see that the room is empty. You may now decide to return to the previous room or inspect the room further.")
-            else: 
-                print("\nYou are standing on the edge of the seemingless empty room on the left side again - You may now decide to return to the previous room or inspect the room again.")
-            player_state, player_returns = decide_options({"return", "inspect"})
-       # Left Room - Decision: Inspect
-        elif player_state == "_leftroom_inspect":
-            if player_returns == False:
-            # As this is the end of this room-branch, there is no possible return
-                sword_image = ("\n"
-                            "  /\  \n"
-                            " |  | \n"
-                            " |  | \n"
-                            " |  | \n"
-                            " |  | \n"
-                            "-    -\n"
-                            "-    -\n"
-                            " |  | \n"
-                            )
-                sword_item = {"name": "sword", "type":"weapon", "score": 10, "string_image": sword_image}
-                room = filter_room(items_to_find=[sword_item])
-                if room["items"] != []:
-                    print("\nYou start to closely inspect the seemingless empty room - oh what is this:", end=" ")
-                    for item in room["items"]:
-                        take_item(item)
-                else: 
-                    print("\nThere is nothing more to find in this room")
-                print("\nWould you like to stay in the room or return ?")
-                player_state, player_returns = decide_options({"return", "stay"})
-                
-    ########################################################################
-    # Middle-Room 
-    elif player_state.startswith("_middleroom") == True:
-        # Middle-Room-Start
-        if player_state == "_middleroom":
-            if player_returns == False:
-                print("\nOh, this room seems to just be hallway for further adventures. It is a very long and narrow corridor with some light at the end.\nDo you want to go down the hallway or return ?", end="\n")
-            else:
-                print("\nHere you are, back at the beginning of the narrow corridor behind the middle door. Would you like to return through the middle door or head back down the hallway?", end="\n")
-            player_state, player_returns = decide_options({"go down", "return"})
-
-        #Middle-Room-Go Down
-        elif player_state.startswith("_middleroom_go down"):
-            if player_state == "_middleroom_go down":
-                if player_returns == False:
-                    print("\nSo, the light at the end of the corridor is a torch stuck between two doors.")
-                else:
-                    print("\nYou are now standing in front of the two doors again, which are seperated by a torch.")
-                player_state, player_returns = choose_doors("old", "modern", can_return=True)
-            elif player_state.startswith("_middleroom_go down_oldroom"):
-                if player_state == "_middleroom_go down_oldroom":
-                    if player_returns == False:
-                        print("\nThe oak door creaks heavily as you push it, but with some effort you manage to open it. You look into a dusty and mysterious room - where you can´t see anything.")
-                        print("\nWould you like to inspect the dark room or return?")
-                    else: 
-                        print("\nYou stand at the edge of room and extinguish your torch again. You may go back and inspect the room again or return through the old door.")
-                    player_state, player_returns = decide_options({"inspect", "return"})
-                if player_state == "_middleroom_go down_oldroom_inspect":
-                    if "torch" in [x['name'] for x in player_items]:
-                        print("\nWhen you are already about to go into the room, you remeber, that you have picked up a torch before.\nYou light up your torch and look into the room:")
-                        load_answer(1)
-                        print("\nThat was close: You are literally standing on the edge of a cliff. But with the light of the torch you manage to circumvent the danger - and head straight to an old box, which stands right behind the cliff.")
-                        print("\nYou open up the box, and:")
-                        load_answer(1)
-                        ring_image = (
-                        "   __  \n"
-                        " /    \ \n"
-                        "|      |\n"
-                        " \\    /\n"
-                        "   -- \n"                
-                        )
-                        ring_item = {"name": "ring", "type":"multiplier_item", "score": 2, "string_image": ring_image}
-                        room = filter_room(items_to_find=[ring_item])
-                        if room["items"] != []:
-                            for item in room["items"]:
-                                take_item(item)
-                        else: 
-                            print("\nThere is nothing more to find here.")
-                        if "sword" in [x['name'] for x in player_items]:
-                            print("\nThis is a pretty ring - actually, did you realize, that your sword started shining once you took the ring ?")
-                        else: 
-                            print("\nThis is a pretty ring - actually, did you realize, there is a sword engraved on the side of the ring?")
-                        print("\nWould you like to stay here or return ?")
-                        player_state, player_returns = decide_options({"return", "stay"})
-
-                    else:
-                        print("\nIt is super dark in this room - what were you thinking? You carefully take your first leap...")
-                        load_answer(1)
-                        print("and step into the void. You lose your balance and fall into the depths of a cliff. Sorry, you have died and lost the game.")
-                        exit_game("restart")
-            elif player_state.startswith("_middleroom_go down_modernroom"):
-                room = filter_room(enemies_to_find=[{"name" : "leprechaun", "defeat_items": ["sword"], "defeat_condition":"dice -5", "loss_consequence": "loose_items", "canHide": False}])
-                for enemy in room["enemies"]:
-                    player_items, player_dead_enemies = fight_enemy(enemy) 
-                room = filter_room(enemies_to_find=[{"name" : "leprechaun", "defeat_items": ["sword"], "defeat_condition":"dice -5", "loss_consequence": "loose_items", "canHide": False}])
-                if room["enemies"] == []:                    
-                    torch_image = ("\n"
-                        "    \\\\||||||//  \n"
-                        "      \\||||/     \n"    
-                        "       |  |     \n"
-                        "       |  |     \n"
-                        "       |  |     \n"
-                        "       |  |     \n"
-                        )
-                    torch_item = {"name": "torch", "type":"discover_item", "score": 0, "string_image": torch_image}
-
-                    berry_image = ("\n"
-                        "   |       \n"
-                        "  / \\     \n"
-                        "  \\ /     \n"
-                        )
-                    berry_item = {"name": "suspicious berry", "type":"death_item", "score": 0, "string_image": berry_image}
-                    room_items = [
-                        torch_item,
-                        berry_item
-                    ]
-                    room = filter_room(items_to_find=room_items)
-                    print("\nWithout the leprechaun standing in the way you are able to analyze the nest, in which he was collecting his prey.")
-                    for item in room["items"]:
-                        take_item(item)
-
-                print("\nWould you like to stay or return?")
-                player_state, player_returns = decide_options({"stay", "return"})
-
-    ########################################################################
-    # Right-Room
-    elif player_state.startswith("_rightroom"):
-        room = filter_room(enemies_to_find=[{"name" : "dragon", "defeat_items": ["sword"], "defeat_condition":"damage>41&dice", "loss_consequence": "death", "canHide": True}])
-        for enemy in room["enemies"]:
-            player_items, player_dead_enemies = fight_enemy(enemy) 
-        print("\nThere is nothing more to find in this room")
-        print("Would you like to stay in the room or return ?")
-        player_state, player_returns = decide_options({"return", "stay"})
+def main(argv: list = None):
+    """Start the interactive game in the terminal
+
+    Args:
+        argv (list, optional): command line arguments. Defaults to sys.argv[1:].
+    """
+    global store, autosaver, telemetry, profiler
+    parser = argparse.ArgumentParser(description="Dungeons and Dreagons in the terminal")
+    parser.add_argument("--store", metavar="LOCATION", help="store the saves in this directory or in a SQLite database ('sqlite:FILE', see gamedb.py)")
+    parser.add_argument("--autosave-interval", type=float, default=1.0, metavar="SECONDS", help="write the changes of the game at most once in this interval")
+    parser.add_argument("--record", metavar="FILE", help="record the seed and all commands into a transcript (see gamereplay.py)")
+    parser.add_argument("--telemetry", metavar="DIRECTORY", help="write per-turn telemetry and metrics into this directory (see gametelemetry.py)")
+    parser.add_argument("--profile", metavar="DIRECTORY", help="profile the game and write the results into this directory (see gameprofile.py)")
+    arguments = parser.parse_args(argv)
+    # Optional features are only imported, when they are used - so they don´t slow down the start of the game
+    if arguments.store is not None:
+        store = open_store(arguments.store)
+    autosaver = Autosaver(store, arguments.autosave_interval)
+    if arguments.telemetry is not None:
+        from gametelemetry import Telemetry
+        telemetry = Telemetry(arguments.telemetry)
+    if arguments.profile is not None:
+        from gameprofile import GameProfiler
+        profiler = GameProfiler(arguments.profile)
+        profiler.start()
+    asyncio.run(play(arguments.record))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import pathlib
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from gameengine import GameState, choose_doors, fight_enemy, filter_room, start_game, step, throw_dice
+from gamereplay import read_transcript
+from gamesave import Autosaver, SaveStore, open_store
+from gametext import render_doors, render_event
+from gameworld import World, compile_world, world_definition
+
+########################################################################
+# Benchmarks
+########################################################################
+# Measures the hot paths of the game: saving and opening games (the save slots and the autosave, like the game
+# uses them), save slots of many players, filtering rooms,
+# fights, doors and whole playthroughs. Every benchmark runs its operation repeatedly and reports operations per
+# second, the median and 99th percentile latency and the memory allocated per operation (peak of tracemalloc in
+# a separate run, so tracing doesn´t distort the timings).
+# The results can be stored as baseline - later runs are compared with it and regressions are flagged.
+#
+# Usage:
+##   python gamebench.py [--only fight] [--seconds 0.5]
+##   python gamebench.py --save-baseline
+
+baseline_path = pathlib.Path(__file__).parent.joinpath("gamebench-baseline.json")
+# Median time from starting the terminal game until the first prompt, which is never exceeded (many short-lived
+# game processes are started)
+startup_budget_ms = 150
+# Defeat conditions of the enemies in the benchmark world - one for every kind of condition
+fight_conditions = {"random": "random", "dice": "dice +3", "damage": "damage>5", "damage&dice": "damage>20&dice", "none": "none"}
+
+def bench_world(items: int = 10_000, doors: int = 100) -> World:
+    """The default world with many additional items, one enemy per kind of defeat condition and a hall with many doors
+
+    Args:
+        items (int, optional): number of additional items. Defaults to 10_000.
+        doors (int, optional): number of doors in the hall. Defaults to 100.
+
+    Returns:
+        World: compiled world
+    """
+    definition = dict(world_definition)
+    definition["items"] = world_definition["items"] + [
+        {"name": f"gem {number}", "type": "discover_item", "score": 0, "image": ""} for number in range(items)]
+    definition["enemies"] = world_definition["enemies"] + [
+        {"name": f"{kind} enemy", "defeat_items": ["sword"], "defeat_condition": condition, "loss_consequence": "none", "canHide": True}
+        for kind, condition in fight_conditions.items()]
+    definition["rooms"] = world_definition["rooms"] + [
+        {"key": "_hall", "doors": {f"hall{number}": "" for number in range(doors)}}]
+    return compile_world(definition)
+
+########################################################################
+# Operations
+########################################################################
+# Every function prepares a benchmark and returns the operation, which is measured
+
+def save_open(world: World, location: str, inventory: int):
+    # The store is opened like the game opens it - saves are synced to disk
+    store = open_store(location, world)
+    state = GameState("Bench", world=world)
+    for id in range(inventory):
+        state.player_items.add(id)
+    store.save("Bench", "bench", state)
+    rooms = (world.room_ids["_leftroom"], world.room_ids["_rightroom"])
+
+    def operation():
+        # A save after a move appends the change to the slot, opening replays it
+        state.room = rooms[state.room == rooms[0]]
+        store.save("Bench", "bench", state)
+        store.load("Bench", "bench", world)
+    return operation
+
+def save_many(world: World, directory: pathlib.Path, games: int):
+    store = open_store(str(directory.joinpath(f"many-{games}")), world)
+    states = [GameState(f"player {number}", world=world) for number in range(games)]
+    store.save_many([(state.player_name, "bench", state) for state in states])
+    rooms = (world.room_ids["_leftroom"], world.room_ids["_rightroom"])
+
+    def operation():
+        # One write of the autosave thread: every game has moved since the last write
+        for state in states:
+            state.room = rooms[state.room == rooms[0]]
+        store.save_many([(state.player_name, "bench", state) for state in states])
+    return operation
+
+def autosave_flush(world: World, directory: pathlib.Path):
+    store = open_store(str(directory.joinpath("autosave")), world)
+    autosaver = Autosaver(store)
+    state = GameState("Bench", world=world)
+    rooms = (world.room_ids["_leftroom"], world.room_ids["_rightroom"])
+
+    def operation():
+        # A move is handed to the autosave thread, flush waits until it is written (eg. before the slots are listed)
+        state.room = rooms[state.room == rooms[0]]
+        autosaver.changed(state.player_name, "bench", state)
+        autosaver.flush()
+    return operation
+
+def save_slots(world: World, directory: pathlib.Path, players: int):
+    # Syncs are turned off, the benchmark measures the index and not the disk
+    store = SaveStore(directory.joinpath(f"slots-{players}"), sync=False)
+    state = GameState("Bench", world=world)
+    for number in range(players):
+        store.save(f"player {number}", f"slot {number % 3}", state)
+    rng = random.Random(1)
+
+    def operation():
+        # A player lists his slots, opens one, saves into a new one and deletes it again
+        number = rng.randrange(players)
+        player = f"player {number}"
+        store.load(player, store.slots(player)[0], world)
+        store.save(player, "bench", state)
+        store.delete(player, "bench")
+    return operation
+
+def filter_many_items(world: World):
+    state = GameState("Bench", world=world)
+    # The player already has every second item
+    for item in world.items[::2]:
+        if item["type"] != "death_item":
+            state.player_items.add(item["id"])
+    return lambda: filter_room(state, world.items, world.enemies)
+
+def fight(world: World, kind: str):
+    state = GameState("Bench", player_items=[world.item_ids["sword"], world.item_ids["ring"]], world=world, rng=random.Random(1))
+    enemy = world.enemies[world.enemy_ids[f"{kind} enemy"]]
+
+    def operation():
+        events = []
+        state.player_dead_enemies.clear()
+        state.queue.clear()
+        state.pending = None
+        fight_enemy(state, enemy, "fight", events)
+        if state.pending is not None and state.pending["kind"] == "dice":
+            throw_dice(state, enemy, state.pending["fight_score"], events)
+    return operation
+
+def many_doors(world: World):
+    state = GameState("Bench", "_hall", world=world)
+    hall = world.rooms[state.room]
+    door_names = [command.removesuffix(" door") for command in hall.transitions if command != "return"]
+    commands = list(hall.transitions)
+
+    def operation():
+        render_doors(state.player_name, door_names, can_return="return" in hall.transitions)
+        state.room = hall.id
+        choose_doors(state, commands[-1])
+    return operation
+
+def playthrough(world: World, path: pathlib.Path):
+    transcript = read_transcript(path)
+
+    def operation():
+        # Replay the transcript and render every event, like the terminal game does
+        state = GameState(transcript["player_name"], transcript["player_state"], transcript["player_returns"],
+                          [world.item_ids[name] for name in transcript["items"]],
+                          [world.enemy_ids[name] for name in transcript["dead_enemies"]],
+                          world=world, rng=random.Random(transcript["seed"]))
+        events = start_game(state)
+        text = [render_event(event, state) for event in events]
+        for command in transcript["commands"]:
+            state, events = step(state, command)
+            text += [render_event(event, state) for event in events]
+    return operation
+
+def cold_start(directory: pathlib.Path):
+    game_path = pathlib.Path(__file__).parent.joinpath("commandlinegame.py")
+    # A new home directory without a save, so the first prompt asks for the name. Byte code is cached like in a
+    # normal installation (the warm up runs create it).
+    environment = dict(os.environ, HOME=str(directory), PYTHONPYCACHEPREFIX=str(directory.joinpath("pycache")))
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    def operation():
+        process = subprocess.Popen([sys.executable, str(game_path)], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, env=environment)
+        output = b""
+        # Every prompt ends with ': '
+        while not output.endswith(b": "):
+            data = process.stdout.read1(65536)
+            if not data:
+                break
+            output += data
+        process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stdin.close()
+    return operation
+
+def benchmarks(directory: pathlib.Path) -> dict:
+    """All benchmarks
+
+    Args:
+        directory (pathlib.Path): temporary directory for the saves
+
+    Returns:
+        dict: name -> function, which prepares the benchmark and returns the measured operation
+    """
+    world = bench_world()
+    suite = {
+        "save_open_small_inventory": lambda: save_open(world, str(directory.joinpath("small")), 3),
+        "save_open_large_inventory": lambda: save_open(world, str(directory.joinpath("large")), 10_000),
+        "save_open_sqlite": lambda: save_open(world, f"sqlite:{directory.joinpath('saves.db')}", 3),
+        "save_many_100_games": lambda: save_many(world, directory, 100),
+        "autosave_flush": lambda: autosave_flush(world, directory),
+        "save_slots_100000_players": lambda: save_slots(world, directory, 100_000),
+        "filter_room_10000_items": lambda: filter_many_items(world),
+    }
+    for kind in fight_conditions:
+        suite[f"fight_enemy_{kind}"] = lambda kind=kind: fight(world, kind)
+    suite["choose_doors_100_doors"] = lambda: many_doors(world)
+    for path in sorted(pathlib.Path(__file__).parent.joinpath("transcripts").glob("*.jsonl")):
+        suite[f"playthrough_{path.stem}"] = lambda path=path: playthrough(world, path)
+    suite["cold_start_to_first_prompt"] = lambda: cold_start(directory)
+    return suite
+
+########################################################################
+# Measurement
+########################################################################
+
+def measure(operation, seconds: float = 0.5, min_runs: int = 20) -> dict:
+    """Run an operation repeatedly and measure it
+
+    Args:
+        operation (callable): operation without arguments
+        seconds (float, optional): minimum time to run the operation. Defaults to 0.5.
+        min_runs (int, optional): minimum number of runs. Defaults to 20.
+
+    Returns:
+        dict: 'runs', 'ops_per_second', 'p50_us', 'p99_us' and 'alloc_bytes' (peak allocated memory per operation)
+    """
+    # Warm up
+    for _ in range(3):
+        operation()
+    timings = []
+    clock = time.perf_counter_ns
+    deadline = clock() + seconds * 1e9
+    while len(timings) < min_runs or clock() < deadline:
+        start = clock()
+        operation()
+        timings.append(clock() - start)
+    timings.sort()
+    # Memory is measured in a separate run, tracing slows down every allocation
+    allocations = []
+    tracemalloc.start()
+    for _ in range(min(len(timings), 20)):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        operation()
+        allocations.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    allocations.sort()
+    return {"runs": len(timings),
+            "ops_per_second": len(timings) / (sum(timings) / 1e9),
+            "p50_us": timings[len(timings) // 2] / 1000,
+            "p99_us": timings[min(len(timings) - 1, len(timings) * 99 // 100)] / 1000,
+            "alloc_bytes": allocations[len(allocations) // 2]}
+
+def regressions(name: str, result: dict, baseline: dict, tolerance: float) -> list:
+    """Compare a result with the baseline
+
+    Args:
+        name (str): name of the benchmark
+        result (dict): result of measure()
+        baseline (dict): stored results (name -> result)
+        tolerance (float): factor, by which a value may be worse than the baseline
+
+    Returns:
+        list: description of every regression
+    """
+    if name not in baseline:
+        return []
+    found = []
+    # The median is compared instead of the throughput, so a few slow runs (eg. another process) aren´t a regression
+    if result["p50_us"] > baseline[name]["p50_us"] * tolerance:
+        found.append(f"p50 {baseline[name]['p50_us']:.1f} -> {result['p50_us']:.1f} µs")
+    # Small allocations vary between Python versions, so 1 KiB is always tolerated
+    if result["alloc_bytes"] > baseline[name]["alloc_bytes"] * tolerance + 1024:
+        found.append(f"{baseline[name]['alloc_bytes']:,} -> {result['alloc_bytes']:,} bytes allocated")
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the game")
+    parser.add_argument("--only", default="", help="run only benchmarks, which contain this text")
+    parser.add_argument("--seconds", type=float, default=0.5, help="minimum duration of every benchmark")
+    parser.add_argument("--baseline", type=pathlib.Path, default=baseline_path, help="file of the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="factor, by which a result may be worse than the baseline")
+    arguments = parser.parse_args()
+    baseline = {}
+    if arguments.baseline.exists() and not arguments.save_baseline:
+        baseline = json.loads(arguments.baseline.read_text())
+    directory = pathlib.Path(tempfile.mkdtemp(prefix="gamebench-"))
+    results = {}
+    failed = []
+    print(f"{'benchmark':<36} {'ops/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'alloc B/op':>12}")
+    try:
+        for name, prepare in benchmarks(directory).items():
+            if arguments.only not in name:
+                continue
+            result = results[name] = measure(prepare(), arguments.seconds)
+            found = regressions(name, result, baseline, arguments.tolerance)
+            if name == "cold_start_to_first_prompt" and result["p50_us"] > startup_budget_ms * 1000:
+                found.append(f"p50 above the budget of {startup_budget_ms} ms")
+            print(f"{name:<36} {result['ops_per_second']:>12,.0f} {result['p50_us']:>10.1f} {result['p99_us']:>10.1f} "
+                  f"{result['alloc_bytes']:>12,}" + ("  REGRESSION: " + ", ".join(found) if found else ""))
+            if found:
+                failed.append(name)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    if arguments.save_baseline:
+        arguments.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nBaseline stored in {arguments.baseline}")
+    if failed:
+        print(f"\n{len(failed)} regressions compared with {arguments.baseline}")
+        sys.exit(1)
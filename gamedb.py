@@ -0,0 +1,267 @@
+import argparse
+import contextlib
+import json
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from gameengine import GameState
+from gamesave import save_directory
+from gameworld import World, default_world
+
+########################################################################
+# SQLite Save Store
+########################################################################
+# Keeps the save slots of all players in one SQLite database - an alternative to the save store of gamesave.py
+# with the same methods (slots, load, save, save_many, delete, close). The state of a game is normalized:
+## - saves: one row per slot (player, slot, room, returns, time of the save)
+## - save_items: one row per item in the inventory (in the order the items were collected)
+## - save_enemies: one row per defeated enemy
+# Rooms, items and enemies are stored by name, so saves stay readable (and valid), when the ids of a world change,
+# and questions like "how many players have defeated the dragon?" are a query instead of loading every save.
+#
+# The database runs in WAL mode: readers never wait for a writer and a writer only appends to the log, so
+# concurrent sessions hardly block each other. Every thread takes a connection from a small pool; the SQL texts
+# are constants, so sqlite3 reuses the prepared statements of each connection. save_many() writes many saves
+# (eg. autosaves) in one transaction with one sync.
+#
+# Usage:
+##   python commandlinegame.py --store sqlite:saves.db
+##   python gameserver.py --store sqlite:saves.db
+##   python gamedb.py saves.db
+
+schema = """
+CREATE TABLE IF NOT EXISTS saves (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    room TEXT NOT NULL,
+    returns INTEGER NOT NULL,
+    saved_at REAL NOT NULL,
+    UNIQUE (player, slot)
+);
+CREATE TABLE IF NOT EXISTS save_items (
+    save_id INTEGER NOT NULL REFERENCES saves (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (save_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS save_enemies (
+    save_id INTEGER NOT NULL REFERENCES saves (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    enemy TEXT NOT NULL,
+    PRIMARY KEY (save_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS save_items_by_item ON save_items (item);
+CREATE INDEX IF NOT EXISTS save_enemies_by_enemy ON save_enemies (enemy);
+"""
+
+select_slots = "SELECT slot FROM saves WHERE player = ? ORDER BY slot"
+select_save = "SELECT id, room, returns FROM saves WHERE player = ? AND slot = ?"
+select_items = "SELECT item FROM save_items WHERE save_id = ? ORDER BY position"
+select_enemies = "SELECT enemy FROM save_enemies WHERE save_id = ? ORDER BY position"
+# An existing slot keeps its id, so the old rows of its items and enemies are replaced
+upsert_save = """INSERT INTO saves (player, slot, room, returns, saved_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (player, slot) DO UPDATE SET room = excluded.room, returns = excluded.returns, saved_at = excluded.saved_at
+RETURNING id"""
+delete_items = "DELETE FROM save_items WHERE save_id = ?"
+delete_enemies = "DELETE FROM save_enemies WHERE save_id = ?"
+insert_item = "INSERT INTO save_items (save_id, position, item) VALUES (?, ?, ?)"
+insert_enemy = "INSERT INTO save_enemies (save_id, position, enemy) VALUES (?, ?, ?)"
+delete_save = "DELETE FROM saves WHERE player = ? AND slot = ?"
+
+class SqliteStore:
+    """Save slots of many players in a SQLite database
+
+    Args:
+        path (pathlib.Path, optional): file of the database. Defaults to 'saves.db' in save_directory.
+        world (World, optional): world of the saved games (to name rooms, items and enemies). Defaults to default_world.
+        sync (bool, optional): sync every transaction to disk - otherwise only the checkpoints of the WAL are
+            synced, a crash of the operating system may lose the last saves. Defaults to True.
+        pool_size (int, optional): maximum number of open connections. Defaults to 4.
+        timeout (float, optional): seconds, which a writer waits for another writer. Defaults to 10.0.
+    """
+
+    def __init__(self, path: pathlib.Path = save_directory.joinpath("saves.db"), world: World = default_world,
+                 sync: bool = True, pool_size: int = 4, timeout: float = 10.0):
+        self.path = pathlib.Path(path)
+        self.world = world
+        self.sync = sync
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.pool = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        # Number of bytes of the values written by this store (the pages of the database are not counted)
+        self.bytes_written = 0
+
+    def slots(self, player: str) -> list:
+        """Names of the slots of a player
+
+        Args:
+            player (str): name of the player
+
+        Returns:
+            list: sorted names of the slots
+        """
+        with self._connection() as connection:
+            return [slot for slot, in connection.execute(select_slots, (player,))]
+
+    def load(self, player: str, slot: str, world: World = None) -> GameState:
+        """Load the game in a slot
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+            world (World, optional): world of the saved game. Defaults to the world of the store.
+
+        Returns:
+            GameState: the saved game or None, if the slot does not exist or refers to unknown rooms, items or enemies
+        """
+        world = world or self.world
+        with self._connection() as connection:
+            # One read transaction, so a concurrent save of the slot is seen completely or not at all
+            connection.execute("BEGIN")
+            try:
+                row = connection.execute(select_save, (player, slot)).fetchone()
+                if row is None:
+                    return None
+                items = [item for item, in connection.execute(select_items, (row[0],))]
+                enemies = [enemy for enemy, in connection.execute(select_enemies, (row[0],))]
+            finally:
+                connection.execute("COMMIT")
+        try:
+            return GameState(player, row[1], bool(row[2]), [world.item_ids[name] for name in items],
+                             [world.enemy_ids[name] for name in enemies], world=world)
+        except (KeyError, ValueError):
+            return None
+
+    def save(self, player: str, slot: str, state: GameState):
+        """Save a game into a slot (a slot of the same name is replaced)
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+            state (GameState): current state of the game
+        """
+        self.save_many([(player, slot, state)])
+
+    def save_many(self, saves: list):
+        """Save several games in one transaction (eg. the autosaves of many sessions)
+
+        Args:
+            saves (list): (player, slot, state) of every game
+        """
+        now = time.time()
+        rows = [(player, slot, state.player_state, int(state.player_returns), state.player_items.item_names(),
+                 [state.world.enemies[id]["name"] for id in state.player_dead_enemies]) for player, slot, state in saves]
+        with self._connection() as connection:
+            # Take the write lock at the beginning, so the transaction never has to be retried
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for player, slot, room, returns, items, enemies in rows:
+                    save_id, = connection.execute(upsert_save, (player, slot, room, returns, now)).fetchone()
+                    connection.execute(delete_items, (save_id,))
+                    connection.execute(delete_enemies, (save_id,))
+                    connection.executemany(insert_item, [(save_id, position, item) for position, item in enumerate(items)])
+                    connection.executemany(insert_enemy, [(save_id, position, enemy) for position, enemy in enumerate(enemies)])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        # Texts by their length, numbers (ids, positions, returns, time) by 8 bytes
+        with self.lock:
+            self.bytes_written += sum(len(player) + len(slot) + len(room) + 32 + sum(len(name) + 16 for name in items + enemies)
+                                      for player, slot, room, returns, items, enemies in rows)
+
+    def delete(self, player: str, slot: str) -> bool:
+        """Delete a slot
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+
+        Returns:
+            bool: True, if the slot existed
+        """
+        with self._connection() as connection:
+            return connection.execute(delete_save, (player, slot)).rowcount > 0
+
+    def stats(self) -> dict:
+        """Aggregate statistics of all saves - computed by the database without loading any save
+
+        Returns:
+            dict: 'players', 'saves', 'defeated' (enemy -> number of players, who defeated it in any of their
+                saves) and 'items' (item -> number of players, who have it in any of their saves)
+        """
+        with self._connection() as connection:
+            players, saves = connection.execute("SELECT COUNT(DISTINCT player), COUNT(*) FROM saves").fetchone()
+            defeated = dict(connection.execute(
+                "SELECT enemy, COUNT(DISTINCT player) FROM save_enemies JOIN saves ON saves.id = save_id GROUP BY enemy ORDER BY enemy"))
+            items = dict(connection.execute(
+                "SELECT item, COUNT(DISTINCT player) FROM save_items JOIN saves ON saves.id = save_id GROUP BY item ORDER BY item"))
+        return {"players": players, "saves": saves, "defeated": defeated, "items": items}
+
+    def defeated_count(self, enemy: str) -> int:
+        """Number of players, who defeated an enemy in any of their saves (eg. 'dragon')"""
+        with self._connection() as connection:
+            return connection.execute("SELECT COUNT(DISTINCT player) FROM save_enemies JOIN saves ON saves.id = save_id "
+                                      "WHERE enemy = ?", (enemy,)).fetchone()[0]
+
+    def close(self):
+        """Close all connections of the pool"""
+        while True:
+            try:
+                connection = self.pool.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self.lock:
+                self.opened -= 1
+
+    @contextlib.contextmanager
+    def _connection(self):
+        # Reuse an idle connection, open a new one while the pool isn´t full - otherwise wait for one
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.opened < self.pool_size
+                if create:
+                    self.opened += 1
+            try:
+                connection = self._connect() if create else self.pool.get()
+            except BaseException:
+                if create:
+                    with self.lock:
+                        self.opened -= 1
+                raise
+        try:
+            yield connection
+        finally:
+            self.pool.put(connection)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode (isolation_level None): transactions are started explicitly. The connection is used by
+        # one thread at a time, but not always by the thread which opened it.
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False,
+                                     cached_statements=64)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute(f"PRAGMA synchronous = {'FULL' if self.sync else 'NORMAL'}")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.executescript(schema)
+        return connection
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statistics of all saves in a SQLite save store")
+    parser.add_argument("database", nargs="?", default=save_directory.joinpath("saves.db"), help="file of the database")
+    parser.add_argument("--defeated", metavar="ENEMY", help="only print the number of players, who defeated this enemy")
+    arguments = parser.parse_args()
+    store = SqliteStore(arguments.database)
+    if arguments.defeated is not None:
+        print(store.defeated_count(arguments.defeated))
+    else:
+        print(json.dumps(store.stats(), indent=2, ensure_ascii=False))
+    store.close()
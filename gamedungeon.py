@@ -0,0 +1,354 @@
+import argparse
+import collections
+import collections.abc
+import itertools
+import random
+import threading
+import time
+import tracemalloc
+from gameworld import Room, World, compile_registry, compile_room, world_definition
+
+########################################################################
+# Generated Dungeons
+########################################################################
+# Builds large worlds from a seed instead of a hand-written definition. The dungeon is a tree: room 0 is the
+# start, the children of room i are the rooms i * branching + 1 to i * branching + branching, so the neighbours
+# of every room are computed and never stored. Each room is generated from (seed, room id) alone - a description,
+# sometimes an enemy, some loot (maybe guarded by the enemy), dark rooms which can only be entered with a
+# discover item - as a room definition in the format of gameworld.py and compiled like the rooms of the default
+# world. The items (weapon, multiplier_item, discover_item, death_item) and enemies (with the usual defeat
+# conditions: random, dice, damage, damage&dice, none) are generated once from the seed.
+#
+# To win, the boss in the deepest room has to be defeated with its weapon, which lies on the way to the boss.
+# Rooms on this way are never dark and their enemies always let the player hide, so every dungeon can be won.
+#
+# Rooms are generated in chunks, when the engine asks for one of them, and the last chunks are kept in a bounded
+# LRU cache - the memory of a dungeon with millions of rooms is the same as of one with a thousand. A chunk,
+# which was dropped from the cache, is generated again exactly as before. Keys of the rooms are '' for the start
+# and '_room<id>', so saved games refer to the same rooms after a restart.
+#
+# Usage:
+##   python gamedungeon.py [--seed 7] [--rooms 50000] [--branching 3]
+##   python gamedungeon.py --seed 7 --rooms 50000 --stream commands.txt
+
+door_names = ("oak", "iron", "red", "blue", "green", "stone", "wooden", "narrow", "wide", "golden", "crooked", "silver")
+room_adjectives = ("damp", "narrow", "vaulted", "dusty", "flooded", "silent", "crumbling", "torch-lit", "cold", "mossy")
+room_nouns = ("cellar", "hall", "chamber", "crypt", "gallery", "cave", "library", "armory", "shrine", "kitchen")
+room_details = ("Water drips from the ceiling.", "Old bones are scattered on the floor.", "Cobwebs hang in every corner.",
+                "Somewhere in the dark something is scratching at the wall.", "The air smells of smoke and old iron.",
+                "Faded paintings of forgotten kings are hanging on the walls.", "Your steps echo through the room.")
+materials = ("iron", "steel", "bronze", "silver", "obsidian", "bone")
+weapons = ("sword", "axe", "spear", "mace", "dagger", "hammer")
+multipliers = ("ring", "amulet", "crown", "bracelet")
+discover_items = ("torch", "lantern", "glowing crystal")
+death_items = ("suspicious berry", "grey mushroom", "bubbling potion", "rotten apple")
+monsters = ("goblin", "troll", "skeleton", "giant spider", "ogre", "wraith", "bandit", "basilisk", "ghoul", "harpy", "kobold", "leprechaun")
+bosses = ("dragon", "lich", "demon king", "hydra")
+# Images of the asset pack for every type of item
+item_images = {"weapon": "sword", "multiplier_item": "ring", "discover_item": "torch", "death_item": "suspicious berry"}
+
+# Chances, that a room has an enemy, loot or (only rooms without further doors) is dark
+fight_chance = 0.2
+loot_chance = 0.25
+dark_chance = 0.15
+
+class DungeonRooms(collections.abc.Sequence):
+    """Rooms of a dungeon, which are generated in chunks when they are accessed. A chunk is a part of the tree:
+    a room and its descendants down to chunk_depth levels - so a player, who walks through the dungeon, stays
+    in the same chunk for several rooms.
+
+    Args:
+        dungeon (Dungeon): dungeon of the rooms
+        count (int): number of rooms
+        chunk_depth (int): levels of the tree per chunk
+        cache_chunks (int): maximum number of chunks in the cache
+    """
+
+    def __init__(self, dungeon, count: int, chunk_depth: int, cache_chunks: int):
+        self.dungeon = dungeon
+        self.count = count
+        self.chunk_depth = chunk_depth
+        self.cache_chunks = cache_chunks
+        # Id of the first room of a chunk -> ids of its rooms (least recently used first)
+        self.chunks = collections.OrderedDict()
+        # Id of a room -> (id of the first room of its chunk, room) for all rooms in the cache
+        self.cached = {}
+        # Sessions of the server and the autosave thread share the dungeon
+        self.lock = threading.Lock()
+        # Number of chunks, which have been generated (again)
+        self.generated = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, id: int) -> Room:
+        if not 0 <= id < self.count:
+            raise IndexError(f"Room id {id} out of range")
+        with self.lock:
+            entry = self.cached.get(id)
+            if entry is not None:
+                self.chunks.move_to_end(entry[0])
+                return entry[1]
+        # Generate outside of the lock - two threads may generate the same chunk, both get identical rooms
+        first = self.chunk_start(id)
+        ids = self.chunk_ids(first)
+        rooms = [self.dungeon.generate_room(room_id) for room_id in ids]
+        with self.lock:
+            self.generated += 1
+            if first not in self.chunks:
+                self.chunks[first] = ids
+                for room in rooms:
+                    self.cached[room.id] = (first, room)
+            self.chunks.move_to_end(first)
+            while len(self.chunks) > self.cache_chunks:
+                for room_id in self.chunks.popitem(last=False)[1]:
+                    del self.cached[room_id]
+            return self.cached[id][1]
+
+    def chunk_ids(self, first: int) -> list:
+        """Ids of the rooms of a chunk, level by level
+
+        Args:
+            first (int): id of the first room of the chunk
+
+        Returns:
+            list: ids of the rooms
+        """
+        ids = [first]
+        level = [first]
+        for _ in range(self.chunk_depth - 1):
+            level = [child for parent in level for child in self.dungeon.children(parent)]
+            ids += level
+        return ids
+
+    def chunk_start(self, id: int) -> int:
+        """Id of the first room of the chunk of a room (its ancestor on the first level of the chunk)"""
+        ancestors = [id]
+        while ancestors[-1] > 0:
+            ancestors.append(self.dungeon.parent(ancestors[-1]))
+        # ancestors[-1] is the start room on level 0, the room itself is on level len(ancestors) - 1
+        return ancestors[(len(ancestors) - 1) % self.chunk_depth]
+
+class DungeonKeys(collections.abc.Mapping):
+    """Key of a room -> id of the room, computed from the key"""
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __getitem__(self, key: str) -> int:
+        if key == "":
+            return 0
+        number = key[5:] if isinstance(key, str) and key.startswith("_room") else ""
+        if number.isdigit() and str(int(number)) == number and 0 < int(number) < self.count:
+            return int(number)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return map(room_key, range(self.count))
+
+    def __len__(self) -> int:
+        return self.count
+
+class Dungeon(World):
+    """World of a generated dungeon. Rooms are generated, when they are needed.
+
+    Args:
+        seed (int, optional): seed of the dungeon - the same seed always generates the same dungeon. Defaults to 0.
+        rooms (int, optional): number of rooms. Defaults to 50_000.
+        branching (int, optional): doors to further rooms per room. Defaults to 3.
+        chunk_depth (int, optional): levels of the tree, which are generated together. Defaults to 4.
+        cache_chunks (int, optional): maximum number of chunks in memory. Defaults to 64.
+
+    Raises:
+        ValueError: if the dungeon has less than 2 rooms or the branching is not between 1 and len(door_names)
+    """
+
+    def __init__(self, seed: int = 0, rooms: int = 50_000, branching: int = 3, chunk_depth: int = 4, cache_chunks: int = 64):
+        super().__init__()
+        if rooms < 2:
+            raise ValueError("A dungeon needs at least 2 rooms")
+        if not 1 <= branching <= len(door_names):
+            raise ValueError(f"The branching has to be between 1 and {len(door_names)}")
+        self.seed = seed
+        self.branching = branching
+        self.rooms = DungeonRooms(self, rooms, chunk_depth, cache_chunks)
+        self.room_ids = DungeonKeys(rooms)
+        self.start = 0
+        compile_registry(self, self.definition())
+        # The way from the start to the boss in the deepest room, the weapon against the boss lies halfway
+        self.boss_room = rooms - 1
+        way = [self.boss_room]
+        while way[-1] != 0:
+            way.append(self.parent(way[-1]))
+        self.boss_way = frozenset(way)
+        self.weapon_room = way[len(way) // 2]
+
+    def room_id(self, key: str) -> int:
+        """Find the id of a room by its key
+
+        Args:
+            key (str): key of the room ('' or '_room<id>')
+
+        Raises:
+            ValueError: if the dungeon has no room with this key
+
+        Returns:
+            int: id of the room
+        """
+        try:
+            return self.room_ids[key]
+        except KeyError:
+            raise ValueError(f"Unknown room '{key}'") from None
+
+    def parent(self, id: int) -> int:
+        """Id of the room, to which 'return' leads (-1 for the start room)"""
+        return (id - 1) // self.branching if id > 0 else -1
+
+    def children(self, id: int) -> range:
+        """Ids of the rooms behind the doors of a room"""
+        first = id * self.branching + 1
+        return range(min(first, len(self.rooms)), min(first + self.branching, len(self.rooms)))
+
+    def definition(self) -> dict:
+        """Items, enemies and winning enemies of the dungeon (a world definition without rooms)"""
+        rng = random.Random(f"{self.seed}:world")
+        names = rng.sample([f"{material} {weapon}" for material, weapon in itertools.product(materials, weapons)], 7)
+        items = [{"name": name, "type": "weapon", "score": rng.randint(5, 20)} for name in names]
+        items += [{"name": name, "type": "multiplier_item", "score": rng.randint(2, 3)} for name in rng.sample(multipliers, 3)]
+        items += [{"name": name, "type": "discover_item", "score": 0} for name in rng.sample(discover_items, 2)]
+        items += [{"name": name, "type": "death_item", "score": 0} for name in rng.sample(death_items, 3)]
+        for item in items:
+            item["image"] = item_images[item["type"]]
+        # The last weapon is only used against the boss
+        boss_weapon = items[6]
+        enemies = []
+        for name in rng.sample(monsters, 10):
+            weapon = rng.choice(items[:6])
+            enemies.append({"name": name, "defeat_items": [weapon["name"]], "defeat_condition": _defeat_condition(rng, weapon["score"]),
+                            "loss_consequence": rng.choice(("death", "loose_items", "none")), "canHide": rng.random() < 0.7})
+        boss = rng.choice(bosses)
+        enemies.append({"name": boss, "defeat_items": [boss_weapon["name"]], "defeat_condition": f"damage>{boss_weapon['score'] * 3}&dice",
+                        "loss_consequence": "death", "canHide": True})
+        return {"items": items, "enemies": enemies, "winning_enemies": [boss], "assets": world_definition["assets"]}
+
+    def generate_room(self, id: int) -> Room:
+        """Generate and compile a room - the same id always results in the same room
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            Room: compiled room
+        """
+        room = Room(id, room_key(id))
+        compile_room(self, room, self.room_definition(id))
+        return room
+
+    def room_definition(self, id: int) -> dict:
+        """Definition of a room in the format of gameworld.py
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            dict: definition of the room
+        """
+        rng = random.Random(f"{self.seed}:{id}")
+        name = f"{rng.choice(room_adjectives)} {rng.choice(room_nouns)}"
+        children = self.children(id)
+        on_way = id in self.boss_way
+        enter = [f"\nYou enter a {name}. {rng.choice(room_details)}"]
+        if not children and not on_way and rng.random() < dark_chance:
+            item = rng.choice([item for item in self.items if item["type"] == "discover_item"])
+            enter += [{"kind": "requires", "item": item["name"],
+                       "else": ["\nIt is pitch dark in here. You take a careful step forward...", {"kind": "pause"},
+                                "and fall into a deep pit. Sorry, you have died and lost the game.", {"kind": "death", "cause": "pit"}]},
+                      f"\nYour {item['name']} lights up the room just in time - right in front of you is a deep pit."]
+        if id == self.weapon_room:
+            enter.append({"kind": "loot", "items": self.enemies[-1]["defeat_items"], "found_text": "\nA weapon is leaning against the wall:",
+                          "empty_text": ""})
+        guards = []
+        if id == self.boss_room:
+            guards = [self.enemies[-1]["name"]]
+            enter.append({"kind": "fight", "enemy": guards[0]})
+        elif rng.random() < fight_chance:
+            enemies = [enemy for enemy in self.enemies[:-1] if enemy["canHide"] or not on_way]
+            guards = [rng.choice(enemies)["name"]]
+            enter.append({"kind": "fight", "enemy": guards[0]})
+        if rng.random() < loot_chance:
+            enter.append({"kind": "loot", "items": [rng.choice(self.items[:6] + self.items[7:])["name"]], "enemies": guards,
+                          "found_text": "\nSomething is lying on the floor:", "empty_text": "\nThere is nothing more to find here."})
+        definition = {"key": room_key(id), "return": [f"\nYou are back in the {name}."]}
+        parent = self.parent(id)
+        if children:
+            doors = dict(zip(rng.sample(door_names, len(children)), map(room_key, children)))
+            if parent >= 0:
+                doors["return"] = room_key(parent)
+            definition["doors"] = doors
+            enter.append(f"\nThere {'is one door' if len(children) == 1 else f'are {len(children)} doors'} in front of you.")
+        else:
+            definition["options"] = {"stay": room_key(id), "return": room_key(parent)}
+            enter.append("\nWould you like to stay here or return?")
+        definition["enter"] = enter
+        return definition
+
+    def boss_route(self) -> list:
+        """Commands, which lead from the start to the boss"""
+        way = sorted(self.boss_way)
+        return [next(command for command, (target, _) in self.rooms[id].transitions.items() if target == next_id)
+                for id, next_id in zip(way, way[1:])]
+
+def room_key(id: int) -> str:
+    """Key of a room of a dungeon ('' for the start room)"""
+    return f"_room{id}" if id else ""
+
+def _defeat_condition(rng: random.Random, score: int) -> str:
+    # A condition of every kind, which can be met with the weapon against the enemy (and maybe multipliers)
+    kind = rng.choice(("random", "dice", "damage", "damage&dice", "none"))
+    if kind == "dice":
+        compare = rng.choice("+-=")
+        return f"dice {compare}{rng.randint(1, 4) if compare == '+' else rng.randint(3, 6) if compare == '-' else rng.randint(1, 6)}"
+    if kind == "damage":
+        return f"damage>{rng.randint(score // 2, score * 2)}"
+    if kind == "damage&dice":
+        return f"damage>{rng.randint(score, score * 4)}&dice"
+    return kind
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a dungeon and play it in stream mode")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the dungeon")
+    parser.add_argument("--rooms", type=int, default=50_000, help="number of rooms")
+    parser.add_argument("--branching", type=int, default=3, help="doors to further rooms per room")
+    parser.add_argument("--chunk-depth", type=int, default=4, help="levels of the tree, which are generated together")
+    parser.add_argument("--cache-chunks", type=int, default=64, help="maximum number of chunks in memory")
+    parser.add_argument("--stream", metavar="COMMANDS", help="play the commands of this file ('-' for stdin) and print every turn as JSON Lines (see gamestream.py)")
+    arguments = parser.parse_args()
+    dungeon = Dungeon(arguments.seed, arguments.rooms, arguments.branching, arguments.chunk_depth, arguments.cache_chunks)
+    if arguments.stream is not None:
+        import gamestream
+        gamestream.main([arguments.stream], dungeon)
+    else:
+        def walk():
+            # All rooms chunk by chunk, so every chunk is only generated once
+            starts = [0]
+            while starts:
+                ids = dungeon.rooms.chunk_ids(starts.pop())
+                yield from (dungeon.rooms[id] for id in ids)
+                members = set(ids)
+                starts += [child for id in ids for child in dungeon.children(id) if child not in members]
+
+        start = time.perf_counter()
+        enemies = sum(len(room.enemies) for room in walk())
+        duration = time.perf_counter() - start
+        print(f"{len(dungeon.rooms):,} rooms generated in {duration:.2f} s ({len(dungeon.rooms) / duration:,.0f} rooms/s, "
+              f"{dungeon.rooms.generated:,} chunks), {enemies:,} fights")
+        # Walk through all rooms again (the cache only holds the last chunks, so they are generated again)
+        tracemalloc.start()
+        for room in walk():
+            pass
+        print(f"peak memory while generating all rooms: {tracemalloc.get_traced_memory()[1] / 2 ** 20:.1f} MiB "
+              f"({dungeon.rooms.cache_chunks} chunks of {dungeon.rooms.chunk_depth} levels in the cache)")
+        tracemalloc.stop()
+        print("items: " + ", ".join(f"{item['name']} ({item['type']})" for item in dungeon.items))
+        print("enemies: " + ", ".join(f"{enemy['name']} ({enemy['defeat_condition']})" for enemy in dungeon.enemies))
+        print(f"weapon against the boss in room '{room_key(dungeon.weapon_room)}', the way to the boss: {', '.join(dungeon.boss_route())}")
@@ -0,0 +1,606 @@
+import random
+from gameworld import World, default_world, wins_fight
+
+########################################################################
+# Headless Game Engine
+########################################################################
+# The engine contains the whole game logic, but it never reads from stdin, never prints and never sleeps.
+# A playthrough is driven by calling step(state, command) repeatedly - every call returns the (updated) state
+# and a list of events, which describe what happened. The terminal game in commandlinegame.py turns these events
+# into text, but bots and scripted playthroughs may just look at the state and the events.
+#
+# Example:
+##   state = GameState("Jannis")
+##   events = start_game(state)
+##   state, events = step(state, "left door")
+##   state, events = step(state, "goto _leftroom")
+
+########################################################################
+# Inventory
+########################################################################
+
+class InventoryItem:
+    """Record of an item in the inventory of the player
+
+    Attributes:
+        id (int): id of the item in the world
+        name (str): name of the item
+        type (str): type of the item, eg. 'weapon' or 'multiplier_item'
+        score (int): score of the item
+    """
+    __slots__ = ("id", "name", "type", "score")
+
+    def __init__(self, item: dict):
+        self.id = item["id"]
+        self.name = item["name"]
+        self.type = item["type"]
+        self.score = item["score"]
+
+class Inventory:
+    """Items the player collected. Besides the items, the inventory keeps the values needed for fights up to date
+    whenever an item is added or removed - so neither a fight nor filtering a room has to look at all items.
+
+    Args:
+        world (World): world, from which the items are
+        ids (list, optional): ids of the items in the inventory. Defaults to [].
+    """
+    __slots__ = ("world", "records", "names", "weapon_scores", "missing_defeat_items", "_multiplier", "_zero_multipliers")
+
+    def __init__(self, world: World, ids: list = []):
+        self.world = world
+        # id -> record, keeps the order in which the items were collected
+        self.records = {}
+        # name -> record
+        self.names = {}
+        # Per enemy: sum of the scores of the weapons, which can be used against it
+        self.weapon_scores = [0] * len(world.enemies)
+        # Per enemy: number of defeat items, which the player doesn´t have yet
+        self.missing_defeat_items = [len(enemy["defeat_item_ids"]) for enemy in world.enemies]
+        # Product of all multiplier items (a score of 0 is counted separately, so it can be removed again)
+        self._multiplier = 1
+        self._zero_multipliers = 0
+        for id in ids:
+            self.add(id)
+
+    def add(self, id: int):
+        """Add an item to the inventory (an item, which is already in the inventory, is ignored)
+
+        Args:
+            id (int): id of the item
+        """
+        if id in self.records:
+            return
+        record = InventoryItem(self.world.items[id])
+        self.records[id] = record
+        self.names[record.name] = record
+        self._update(record, 1)
+
+    def remove(self, id: int):
+        """Remove an item from the inventory
+
+        Args:
+            id (int): id of the item
+        """
+        record = self.records.pop(id, None)
+        if record is not None:
+            del self.names[record.name]
+            self._update(record, -1)
+
+    def clear(self):
+        """Remove all items from the inventory"""
+        self.__init__(self.world)
+
+    def multiplier(self) -> int:
+        """Product of the scores of all multiplier items
+
+        Returns:
+            int: multiplier for the damage of weapons (1, if the player has no multiplier item)
+        """
+        return 0 if self._zero_multipliers else self._multiplier
+
+    def has_defeat_items(self, enemy: dict) -> bool:
+        """Check if all necessary items to fight an enemy are in the inventory
+
+        Args:
+            enemy (dict): enemy of the world
+
+        Returns:
+            bool: True, if no defeat item of the enemy is missing
+        """
+        return self.missing_defeat_items[enemy["id"]] == 0
+
+    def item_names(self) -> list:
+        """Names of all items in the order, in which they were collected
+
+        Returns:
+            list: names of the items
+        """
+        return list(self.names)
+
+    def _update(self, record: InventoryItem, sign: int):
+        if record.type == "multiplier_item":
+            if record.score == 0:
+                self._zero_multipliers += sign
+            elif sign > 0:
+                self._multiplier *= record.score
+            else:
+                self._multiplier //= record.score
+        for enemy_id in self.world.item_enemies[record.id]:
+            self.missing_defeat_items[enemy_id] -= sign
+            if record.type == "weapon":
+                self.weapon_scores[enemy_id] += sign * record.score
+
+    def __contains__(self, id: int) -> bool:
+        return id in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+########################################################################
+# Visited Rooms
+########################################################################
+
+class VisitedRooms:
+    """Rooms, in which the player has been: a bitset with one bit per room id (a few bytes even for huge worlds
+    and a check without hashing) and the ids in the order, in which the rooms were visited - so the map only has
+    to look at the rooms, which were added since it was drawn the last time.
+
+    Attributes:
+        bits (bytearray): bit id % 8 of byte id // 8 is set for every visited room
+        order (list): ids of the visited rooms in the order, in which they were added (a new list after clear())
+    """
+    __slots__ = ("bits", "order")
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.order = []
+
+    def add(self, id: int):
+        """Add a room (a room, which has been visited before, is ignored)
+
+        Args:
+            id (int): id of the room
+        """
+        byte = id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if not self.bits[byte] >> (id & 7) & 1:
+            self.bits[byte] |= 1 << (id & 7)
+            self.order.append(id)
+
+    def update(self, ids):
+        """Add several rooms
+
+        Args:
+            ids (iterable): ids of the rooms
+        """
+        for id in ids:
+            self.add(id)
+
+    def clear(self):
+        """Remove all rooms"""
+        self.bits = bytearray()
+        self.order = []
+
+    def __contains__(self, id: int) -> bool:
+        byte = id >> 3
+        return 0 <= byte < len(self.bits) and self.bits[byte] >> (id & 7) & 1 == 1
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+########################################################################
+# Game State
+########################################################################
+
+class GameState:
+    """State of a single playthrough. Holds everything, which used to live in the global variables of the script.
+
+    Attributes:
+        world (World): compiled world, in which the game is played
+        player_name (str): Name of the player
+        room (int): id of the room, in which the player is
+        player_returns (bool): Tracking, whether player goes down or up the track (return)
+        player_items (Inventory): items which player collected
+        player_dead_enemies (list): ids of the enemies the player defeated
+        pending (dict): Decision the engine is waiting for - contains 'kind', 'message' and the valid 'options'
+        queue (list): Upcoming actions of the current room, which are processed after the pending decision
+        visited (VisitedRooms): ids of the rooms, in which the player has been (and the rooms above them, through which the
+            player must have come)
+        rng (random.Random): random number generator for the fights - the global generator of the random module by default.
+            A seeded generator makes a playthrough reproducible.
+    """
+
+    def __init__(self, player_name: str = "", player_state: str = None, player_returns: bool = False,
+                 player_items: list = None, player_dead_enemies: list = None, world: World = default_world,
+                 rng: random.Random = None):
+        self.world = world
+        self.player_name = player_name
+        self.room = world.start if player_state is None else world.room_id(player_state)
+        self.player_returns = player_returns
+        self.player_items = Inventory(world, player_items if player_items is not None else [])
+        self.player_dead_enemies = player_dead_enemies if player_dead_enemies is not None else []
+        self.pending = None
+        self.queue = []
+        self.visited = VisitedRooms()
+        self.rng = random if rng is None else rng
+
+    @property
+    def player_state(self) -> str:
+        """Key of the room, in which the player is (the state string of older versions of the game)"""
+        return self.world.rooms[self.room].key
+
+    def options(self) -> tuple:
+        """Return the commands, which are valid for the pending decision
+
+        Returns:
+            tuple: valid commands (empty, if the game is over)
+        """
+        if self.pending is None:
+            return ()
+        return self.pending["options"]
+
+    def is_over(self) -> bool:
+        """Check if the player has died
+
+        Returns:
+            bool: True, if the player has died and no further step is possible
+        """
+        return self.pending is not None and self.pending["kind"] == "dead"
+
+    def reset(self, player_name: str = None):
+        """Start a new game with the same object: the world, the random number generator and the inventory
+        are kept and only emptied - so a restart costs nothing but a few assignments
+
+        Args:
+            player_name (str, optional): Name of the player of the new game. Defaults to the current name.
+        """
+        if player_name is not None:
+            self.player_name = player_name
+        self.room = self.world.start
+        self.player_returns = False
+        self.player_items.clear()
+        self.player_dead_enemies.clear()
+        self.pending = None
+        self.queue = []
+        self.visited.clear()
+
+class RestartGame(Exception):
+    """The player wants to start again - the host of the game (eg. the terminal game or a session of the server)
+    catches it and starts a new game in the same process with GameState.reset()"""
+
+def start_game(state: GameState) -> list:
+    """Enter the room, in which the player currently is. Has to be called once for a new or loaded game.
+
+    Args:
+        state (GameState): state of the game, which should be started
+
+    Returns:
+        list: events, which happened when entering the room
+    """
+    events = []
+    state.pending = None
+    state.queue = []
+    _enter_room(state, events)
+    return events
+
+def step(state: GameState, command: str):
+    """Advance the game by one validated player command
+
+    Args:
+        state (GameState): current state of the game
+        command (str): command of the player, has to be one of state.options() - or 'goto <key of a room>' to
+            travel to a visited room, when the player chooses the next room (see goto())
+
+    Raises:
+        ValueError: if the game is over or the command is not valid for the pending decision
+
+    Returns:
+        GameState: updated state of the game
+        list: events, which happened during this step
+    """
+    if state.pending is None or state.is_over():
+        raise ValueError("There is no pending decision - the game is over or has not been started.")
+    if command not in state.pending["options"]:
+        if command.startswith("goto ") and state.pending["kind"] in ("doors", "options"):
+            return goto(state, command[5:])
+        raise ValueError(f"'{command}' is not a valid option, expected one of {state.pending['options']}")
+    events = []
+    pending = state.pending
+    state.pending = None
+    kind = pending["kind"]
+    if kind == "doors":
+        choose_doors(state, command)
+        _enter_room(state, events)
+    elif kind == "options":
+        decide_options(state, command)
+        _enter_room(state, events)
+    elif kind == "item":
+        take_item(state, pending["item"], command, events)
+        _advance(state, events)
+    elif kind == "fight":
+        fight_enemy(state, pending["enemy"], command, events)
+        _advance(state, events)
+    elif kind == "dice":
+        throw_dice(state, pending["enemy"], pending["fight_score"], events)
+        _advance(state, events)
+    elif kind == "continue":
+        _advance(state, events)
+    return state, events
+
+########################################################################
+# Functions for Game Interaction
+########################################################################
+
+def choose_doors(state: GameState, command: str):
+    """Take the door the player has chosen and move the player into the next room
+
+    Args:
+        state (GameState): current state of the game
+        command (str): chosen door, eg. 'left door' or 'return'
+    """
+    state.room, state.player_returns = state.world.rooms[state.room].transitions[command]
+
+def decide_options(state: GameState, command: str):
+    """Take the option the player has chosen and move the player into the next room
+
+    Args:
+        state (GameState): current state of the game
+        command (str): chosen option, eg. 'inspect', 'stay' or 'return'
+    """
+    state.room, state.player_returns = state.world.rooms[state.room].transitions[command]
+
+def find_route(state: GameState, room_key: str) -> list:
+    """Find the shortest route to a visited room, which doesn´t lead through rooms with enemies, which are still
+    alive, or to dark rooms, which the player can´t see without a discover item
+
+    Args:
+        state (GameState): current state of the game
+        room_key (str): key of the room ('start' for the room, in which the game starts)
+
+    Raises:
+        ValueError: if the player is not choosing the next room or there is no route to the room
+
+    Returns:
+        list: (command, id of the next room) for every step of the route
+    """
+    world = state.world
+    if state.pending is None or state.pending["kind"] not in ("doors", "options"):
+        raise ValueError("You can only travel, when you choose the next room.")
+    target = world.start if room_key == "start" and "start" not in world.room_ids else world.room_id(room_key)
+    if target not in state.visited:
+        raise ValueError(f"You have not been in the room '{room_key}' yet.")
+    if target == state.room:
+        raise ValueError(f"You are already in the room '{room_key}'.")
+    route = world.routes.route(state.room, target)
+    if route is None:
+        raise ValueError(f"There is no way to the room '{room_key}'.")
+    for command, id in route:
+        room = world.rooms[id]
+        # The player may travel to an enemy, but not through it
+        enemies = filter_room(state, enemies_to_find=[world.enemies[enemy] for enemy in room.enemies])["enemies"]
+        if enemies and id != target:
+            raise ValueError(f"The way to the room '{room_key}' is blocked by the {enemies[0]['name']}.")
+        for action in room.return_actions if command == "return" else room.enter_actions:
+            if action["kind"] == "requires" and action["item"] not in state.player_items:
+                raise ValueError(f"The way to the room '{room_key}' leads into a room, which is too dark without "
+                                 f"the {world.items[action['item']]['name']}.")
+    return route
+
+def goto(state: GameState, room_key: str):
+    """Travel to a visited room along the shortest route. The player only stops on the way, if a room asks for
+    another decision than the next room (eg. an item, which was left there).
+
+    Args:
+        state (GameState): current state of the game
+        room_key (str): key of the room ('start' for the room, in which the game starts)
+
+    Raises:
+        ValueError: if there is no route to the room (see find_route())
+
+    Returns:
+        GameState: updated state of the game
+        list: a 'travel' event with the keys of the rooms on the way and the events of the last room
+    """
+    rooms = []
+    for command, id in find_route(state, room_key):
+        state, events = step(state, command)
+        rooms.append(state.player_state)
+        if state.pending is None or state.pending["kind"] not in ("doors", "options"):
+            break
+    return state, [{"type": "travel", "rooms": rooms}] + events
+
+def filter_room(state: GameState, items_to_find: list = [], enemies_to_find: list = []) -> dict:
+    """Filter predefined room in order to exclude items, which user already has, as well as enemies, the user already defeated
+
+    Args:
+        state (GameState): current state of the game
+        items_to_find (list, optional): predefined items of the room. Defaults to [].
+        enemies_to_find (list, optional): predefined enemies of the room. Defaults to [].
+
+    Returns:
+        dict: returns room dict, which contains both filtered items and enemies
+    """
+    list_of_enemies = [enemy for enemy in enemies_to_find if enemy["id"] not in state.player_dead_enemies]
+    list_of_items = [item for item in items_to_find if item["id"] not in state.player_items]
+    return {"items": list_of_items, "enemies": list_of_enemies}
+
+def take_item(state: GameState, item: dict, command: str, events: list):
+    """Take or leave an item the player has found
+
+    Args:
+        state (GameState): current state of the game
+        item (dict): item the player has found
+        command (str): 'take' or 'leave'
+        events (list): list, to which the events are appended
+    """
+    if command == "take":
+        if item["type"] == "death_item":
+            _die(state, item["name"], events)
+        else:
+            state.player_items.add(item["id"])
+            events.append({"type": "item_taken", "item": item["name"]})
+
+def fight_enemy(state: GameState, enemy: dict, command: str, events: list):
+    """Process of player fighting a predefined enemy, after he decided to fight or hide
+
+    Args:
+        state (GameState): current state of the game
+        enemy (dict): enemy the player encountered
+        command (str): 'fight' or 'hide'
+        events (list): list, to which the events are appended
+    """
+    outcome = "loss"
+    ## User decides to fight
+    if command == "fight":
+        # 1. User need to have all the necessary items to win the fight
+        if not state.player_items.has_defeat_items(enemy):
+            events.append({"type": "missing_weapons", "enemy": enemy["name"]})
+        else:
+            events.append({"type": "weapons", "enemy": enemy["name"], "weapons": list(enemy["defeat_items"])})
+            # 2. Furthermore, each enemy has an individual defeat condition (parsed once, when the world is compiled)
+            condition = enemy["condition"]
+            ### Random: The outcome is decided by random choice
+            if condition["kind"] == "random":
+                if wins_fight(condition, dice=state.rng.randint(0, 1)):
+                    outcome = "win"
+            ### Dice: The outcome depends on a user´s virtual dice throw
+            elif condition["kind"] == "dice":
+                _ask_dice(state, enemy, None, events)
+                return
+            ### Damage: The outcome depends on the damage, the user can inflict on enemy
+            elif condition["kind"] == "damage":
+                multiplier = state.player_items.multiplier()
+                if multiplier == 1:
+                    events.append({"type": "no_multiplier"})
+                user_fight_score = state.player_items.weapon_scores[enemy["id"]] * multiplier
+                if condition["multiplier"] == "dice":
+                    _ask_dice(state, enemy, user_fight_score, events)
+                    return
+                if wins_fight(condition, user_fight_score):
+                    outcome = "win"
+            else:
+                outcome = "win"
+    ## User decides to hide
+    elif command == "hide":
+        if enemy["canHide"] == False:
+            events.append({"type": "cannot_hide", "enemy": enemy["name"]})
+        else:
+            outcome = "hidden"
+    _fight_consequences(state, enemy, outcome, events)
+
+def throw_dice(state: GameState, enemy: dict, fight_score, events: list):
+    """Throw the dice for a fight, which depends on a dice throw
+
+    Args:
+        state (GameState): current state of the game
+        enemy (dict): enemy the player fights
+        fight_score (int): damage of the player for 'damage>..&dice' conditions, None for 'dice' conditions
+        events (list): list, to which the events are appended
+    """
+    num = state.rng.randint(1, 6)
+    events.append({"type": "dice", "number": num})
+    outcome = "win" if wins_fight(enemy["condition"], fight_score or 0, num) else "loss"
+    _fight_consequences(state, enemy, outcome, events)
+
+def check_win(state: GameState) -> bool:
+    """Check if user has won the game
+
+    Args:
+        state (GameState): current state of the game
+
+    Returns:
+        bool: True, if all enemies of the winning condition are defeated
+    """
+    return state.world.winning_enemies.issubset(set(state.player_dead_enemies))
+
+########################################################################
+# Internal helpers
+########################################################################
+
+def _ask_dice(state: GameState, enemy: dict, fight_score, events: list):
+    events.append({"type": "dice_prompt"})
+    state.pending = {"kind": "dice", "message": "Type in 'dice' to throw the dices", "options": ("dice",),
+                     "enemy": enemy, "fight_score": fight_score}
+
+def _fight_consequences(state: GameState, enemy: dict, outcome: str, events: list):
+    events.append({"type": "fight_result", "enemy": enemy["name"], "outcome": outcome})
+    ## Player lost the fight
+    if outcome == "loss":
+        if enemy["loss_consequence"] == "death":
+            _die(state, enemy["name"], events)
+        elif enemy["loss_consequence"] == "loose_items":
+            lost_items = state.player_items.item_names()
+            state.player_items.clear()
+            events.append({"type": "items_lost", "items": lost_items})
+    ## Player won the fight
+    elif outcome == "win":
+        state.player_dead_enemies.append(enemy["id"])
+        if check_win(state):
+            events.append({"type": "win"})
+            state.queue.insert(0, {"kind": "continue"})
+
+def _die(state: GameState, cause: str, events: list):
+    events.append({"type": "death", "cause": cause})
+    state.queue = []
+    state.pending = {"kind": "dead", "message": "", "options": (), "cause": cause}
+
+def _advance(state: GameState, events: list):
+    """Process the queued actions of the current room until the player has to take a decision"""
+    while state.pending is None and state.queue:
+        action = state.queue.pop(0)
+        kind = action["kind"]
+        if kind == "message":
+            if "if_item" in action and action["if_item"] not in state.player_items:
+                text = action["else_text"]
+            else:
+                text = action["text"]
+            events.append({"type": "message", "text": text})
+        elif kind == "pause":
+            events.append({"type": "pause"})
+        elif kind == "fight":
+            if filter_room(state, enemies_to_find=[action["enemy"]])["enemies"]:
+                events.append({"type": "enemy", "enemy": action["enemy"]["name"]})
+                state.pending = {"kind": "fight", "message": "Write eithter 'fight' or 'hide' to select either of them",
+                                 "options": ("fight", "hide"), "enemy": action["enemy"]}
+        elif kind == "loot":
+            # Items are only accessible, if all enemies of the room are defeated
+            if filter_room(state, enemies_to_find=action.get("enemies", []))["enemies"]:
+                continue
+            items = filter_room(state, items_to_find=action["items"])["items"]
+            text = action["found_text"] if items else action["empty_text"]
+            if text:
+                events.append({"type": "message", "text": text})
+            state.queue[0:0] = [{"kind": "item", "item": item} for item in items]
+        elif kind == "item":
+            events.append({"type": "item_found", "item": action["item"]["name"], "item_id": action["item"]["id"]})
+            state.pending = {"kind": "item", "message": "Write either 'take' or 'leave' to select either of them",
+                             "options": ("take", "leave"), "item": action["item"]}
+        elif kind == "continue":
+            state.pending = {"kind": "continue", "message": "Write 'continue' to continue the game or 'exit' to exit the game",
+                             "options": ("continue",)}
+        elif kind == "death":
+            _die(state, action["cause"], events)
+        elif kind == "requires":
+            # Without the required item, the rest of the room is replaced by the alternative actions
+            if action["item"] not in state.player_items:
+                state.queue = list(action["else"])
+        elif kind == "prompt":
+            if action["event"] is not None:
+                events.append(action["event"])
+            state.pending = action["pending"]
+
+def _enter_room(state: GameState, events: list):
+    """Queue the actions of the room, in which the player is, and process them"""
+    room = state.world.rooms[state.room]
+    if state.room not in state.visited:
+        # A loaded game may start deep in the world - the rooms above a room have been passed on the way into it
+        state.visited.update(state.world.routes.path(state.room))
+    state.queue = list(room.return_actions if state.player_returns else room.enter_actions)
+    _advance(state, events)
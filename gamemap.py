@@ -0,0 +1,264 @@
+import argparse
+import random
+import time
+import weakref
+from gameengine import GameState, start_game, step
+from gameworld import World
+
+########################################################################
+# Game Map
+########################################################################
+# The map is drawn from the world graph instead of by hand: every room is a line, the rooms behind its doors are
+# the lines below it (the rooms form a tree, see Routes in gameworld.py). Rooms, in which the player hasn´t
+# been yet, are hidden in the fog - only the doors leading to them are shown:
+##   start
+##   ├─ left door: _leftroom
+##   │  └─ inspect: ???
+##   ├─ middle door: _middleroom  <- You
+##   │  └─ go down: ???
+##   └─ right door: ???
+# The names of the rooms are the ones used by 'goto'.
+#
+# Nothing is drawn twice: the layout of a room (the lines in front of it and the door, which leads into it) is
+# computed once per world and shared by all games. Every game keeps the lines of its map - when the player moves,
+# only the rooms, which were visited since the last map, and the two lines with the marker of the player are drawn
+# again. The rooms, which were visited, are read from the bitset and the order of GameState.visited.
+#
+# Usage:
+##   python gamemap.py [--rooms 5000] [--seed 1]
+
+unknown_room = "???"
+player_marker = "  <- You"
+# Lines per block of a map (a block is split, when it has twice as many lines)
+map_block_size = 64
+
+class MapLayout:
+    """Position of the rooms of a world on the map - computed once per room, when the room appears on a map
+
+    Args:
+        world (World): compiled world
+    """
+
+    def __init__(self, world: World):
+        self.world = world
+        # Id of a room -> (lines in front of the room, lines in front of the rooms below it, command leading into it)
+        self.rooms = {}
+        # Id of a room -> ids of the rooms behind its doors
+        self.children = {}
+
+    def room(self, id: int) -> tuple:
+        """Layout of a room
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            tuple: lines in front of the room, lines in front of the rooms below it and the command, which leads
+                into the room (None for the top of a tree)
+        """
+        layout = self.rooms.get(id)
+        if layout is None:
+            parent = self.world.rooms[id].parent
+            if parent >= 0:
+                self.below(parent)
+            # A room, which is not behind a door of the room it returns to, starts a tree of its own
+            layout = self.rooms.setdefault(id, ("", "", None))
+        return layout
+
+    def below(self, id: int) -> list:
+        """Rooms behind the doors of a room (see World.children())
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            list: ids of the rooms
+        """
+        children = self.children.get(id)
+        if children is None:
+            children = list(self.world.children(id))
+            # The first door, which leads into a room, names it
+            commands = {}
+            for command, (target, returns) in self.world.rooms[id].transitions.items():
+                if not returns:
+                    commands.setdefault(target, command)
+            lines = self.room(id)[1]
+            for index, child in enumerate(children):
+                last = index == len(children) - 1
+                self.rooms[child] = (lines + ("└─ " if last else "├─ "), lines + ("   " if last else "│  "), commands[child])
+            self.children[id] = children
+        return children
+
+    def line(self, id: int, visited: bool, here: bool = False) -> str:
+        """Line of a room on the map
+
+        Args:
+            id (int): id of the room
+            visited (bool): the player has been in the room (otherwise its name is hidden)
+            here (bool, optional): the player is in the room. Defaults to False.
+
+        Returns:
+            str: line of the room
+        """
+        lines, _, command = self.room(id)
+        name = (self.world.rooms[id].key or "start") if visited else unknown_room
+        return f"{lines}{name if command is None else f'{command}: {name}'}{player_marker if here else ''}"
+
+class MapBlock:
+    """Consecutive lines of a map and their text (None, when a line has changed)"""
+    __slots__ = ("ids", "lines", "text")
+
+    def __init__(self, ids: list, lines: list):
+        self.ids = ids
+        self.lines = lines
+        self.text = None
+
+class MapView:
+    """Map of one game, which is only drawn again where it has changed. The lines are kept in small blocks, which
+    keep their text - so a change only joins the lines of its block again and not the whole map.
+
+    Args:
+        layout (MapLayout): layout of the world of the game
+    """
+
+    def __init__(self, layout: MapLayout):
+        self.layout = layout
+        # Visited rooms, which are on the map (GameState.visited.order, a new game has a new list)
+        self.visited = None
+        self.count = 0
+        # Blocks of lines from top to bottom and id of a room -> its block
+        self.blocks = []
+        self.block_of = {}
+        self.player = -1
+        self.text = ""
+        # Number of lines, which have been drawn
+        self.drawn = 0
+
+    def draw(self, state: GameState) -> str:
+        """Draw the changes of the map since the last call
+
+        Args:
+            state (GameState): current state of the game
+
+        Returns:
+            str: map of the game (without a line break at the end)
+        """
+        layout = self.layout
+        visited = state.visited
+        if visited.order is not self.visited:
+            self.__init__(layout)
+            self.visited = visited.order
+        if self.count == len(visited) and self.player == state.room:
+            return self.text
+        for id in visited.order[self.count:]:
+            if id not in self.block_of:
+                # The top of a new tree
+                if not self.blocks or len(self.blocks[-1].ids) >= map_block_size:
+                    self.blocks.append(MapBlock([], []))
+                self.blocks[-1].ids.append(id)
+                self.blocks[-1].lines.append("")
+                self.block_of[id] = self.blocks[-1]
+            self._set_line(id, layout.line(id, True, id == self.player))
+            # The rooms behind the doors come out of the fog (as unknown rooms)
+            children = [child for child in layout.below(id) if child not in self.block_of]
+            if children:
+                self._insert(id, children, [layout.line(child, child in visited) for child in children])
+        self.count = len(visited)
+        if self.player != state.room:
+            if self.player in self.block_of:
+                self._set_line(self.player, layout.line(self.player, True))
+            self.player = state.room
+            if self.player in self.block_of:
+                self._set_line(self.player, layout.line(self.player, True, True))
+        for block in self.blocks:
+            if block.text is None:
+                block.text = "\n".join(block.lines)
+        self.text = "\n".join([block.text for block in self.blocks])
+        return self.text
+
+    def _set_line(self, id: int, line: str):
+        block = self.block_of[id]
+        block.lines[block.ids.index(id)] = line
+        block.text = None
+        self.drawn += 1
+
+    def _insert(self, id: int, ids: list, lines: list):
+        # Insert lines below the line of a room - a block, which gets too large, is split in two
+        block = self.block_of[id]
+        index = block.ids.index(id) + 1
+        block.ids[index:index] = ids
+        block.lines[index:index] = lines
+        block.text = None
+        for child in ids:
+            self.block_of[child] = block
+        self.drawn += len(ids)
+        if len(block.ids) > 2 * map_block_size:
+            half = len(block.ids) // 2
+            second = MapBlock(block.ids[half:], block.lines[half:])
+            del block.ids[half:], block.lines[half:]
+            for moved in second.ids:
+                self.block_of[moved] = second
+            self.blocks.insert(self.blocks.index(block) + 1, second)
+
+# The layouts of all worlds and the maps of all games (forgotten, when the world or the game is not used anymore)
+_layouts = weakref.WeakKeyDictionary()
+_views = weakref.WeakKeyDictionary()
+
+def draw_map(state: GameState) -> str:
+    """Map of a game (see above)
+
+    Args:
+        state (GameState): current state of the game
+
+    Returns:
+        str: map of the game ("" for a game, which has not been started)
+    """
+    view = _views.get(state)
+    if view is None or view.layout.world is not state.world:
+        layout = _layouts.get(state.world)
+        if layout is None:
+            layout = _layouts[state.world] = MapLayout(state.world)
+        view = _views[state] = MapView(layout)
+    return view.draw(state)
+
+if __name__ == "__main__":
+    from gamedungeon import Dungeon
+    parser = argparse.ArgumentParser(description="Measure how fast the map of a large generated dungeon is drawn")
+    parser.add_argument("--rooms", type=int, default=5000, help="number of rooms, which the player visits")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the dungeon and the walk")
+    arguments = parser.parse_args()
+    state = GameState("Bot", world=Dungeon(arguments.seed, arguments.rooms * 10), rng=random.Random(arguments.seed))
+    rng = random.Random(arguments.seed)
+    start_game(state)
+    # Walk randomly (and without dying) until enough rooms are visited - the map is drawn after every move
+    seconds = []
+    while len(state.visited) < arguments.rooms:
+        pending = state.pending
+        if pending["kind"] == "item":
+            command = "leave"
+        elif pending["kind"] == "fight":
+            command = "hide" if pending["enemy"]["canHide"] else "fight"
+        elif pending["kind"] in ("doors", "options"):
+            # Prefer doors to unvisited rooms
+            transitions = state.world.rooms[state.room].transitions
+            unvisited = [option for option in pending["options"] if transitions[option][0] not in state.visited]
+            command = rng.choice(unvisited or pending["options"])
+        else:
+            command = pending["options"][0]
+        state, _ = step(state, command)
+        if state.is_over():
+            # Start again in the same dungeon, but keep the rooms visited so far and their map
+            previous = state
+            state = GameState("Bot", world=previous.world, rng=previous.rng)
+            state.visited = previous.visited
+            _views[state] = _views.pop(previous)
+            start_game(state)
+        start = time.perf_counter()
+        draw_map(state)
+        seconds.append(time.perf_counter() - start)
+    seconds.sort()
+    view = _views[state]
+    print(f"{len(state.visited):,} visited rooms, {len(view.block_of):,} lines on the map, {len(seconds):,} moves")
+    print(f"drawing the map after a move: p50 {seconds[len(seconds) // 2] * 1e6:.1f} µs, "
+          f"p99 {seconds[len(seconds) * 99 // 100] * 1e6:.1f} µs, max {seconds[-1] * 1e6:.1f} µs")
+    print(f"{view.drawn:,} lines drawn in total ({view.drawn / len(seconds):.1f} per move)")
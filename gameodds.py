@@ -0,0 +1,105 @@
+import argparse
+import itertools
+import time
+import numpy as np
+from gameworld import World, default_world, fight_score, wins_fight
+
+########################################################################
+# Fight Odds Analyzer
+########################################################################
+# Computes the probability to win a fight against every enemy of the world for every combination of items,
+# which has an influence on the fight (the defeat items of the enemy and all multiplier items).
+# The exact odds are calculated from the six faces of the dice. In addition the fights are simulated with
+# NumPy: instead of throwing every dice one by one, the number of throws per face is drawn from a
+# multinomial distribution - so millions of throws take microseconds.
+#
+# Usage:
+##   python gameodds.py [--rolls 1000000] [--seed 1]
+
+def inventory_combinations(world: World, enemy: dict) -> list:
+    """All combinations of items, which may change the outcome of a fight against an enemy
+
+    Args:
+        world (World): compiled world
+        enemy (dict): enemy of the world
+
+    Returns:
+        list: tuples of item ids
+    """
+    relevant_items = sorted(set(enemy["defeat_item_ids"]) |
+                            {item["id"] for item in world.items if item["type"] == "multiplier_item"})
+    combinations = []
+    for size in range(len(relevant_items) + 1):
+        combinations += itertools.combinations(relevant_items, size)
+    return combinations
+
+def win_table(world: World, enemy: dict, item_ids: tuple) -> np.ndarray:
+    """Outcome of a fight for each face of the dice
+
+    Args:
+        world (World): compiled world
+        enemy (dict): enemy of the world
+        item_ids (tuple): ids of the items of the player
+
+    Returns:
+        np.ndarray: array with 6 booleans - True, if the player wins with this dice throw
+    """
+    if not enemy["defeat_item_ids"].issubset(item_ids):
+        return np.zeros(6, dtype=bool)
+    condition = enemy["condition"]
+    # Random conditions have two outcomes: every odd face counts as 1, so both have the same chance
+    if condition["kind"] == "random":
+        return np.array([wins_fight(condition, dice=face % 2) for face in range(1, 7)])
+    score = fight_score(world, enemy, item_ids)
+    return np.array([wins_fight(condition, score, face) for face in range(1, 7)])
+
+def fight_odds(world: World = default_world, rolls: int = 1_000_000, seed: int = None) -> list:
+    """Calculate exact and simulated odds to win against every enemy for every relevant item combination
+
+    Args:
+        world (World, optional): compiled world. Defaults to default_world.
+        rolls (int, optional): number of simulated dice throws per combination. Defaults to 1_000_000.
+        seed (int, optional): seed of the random number generator. Defaults to None.
+
+    Returns:
+        list: one dict per enemy and item combination with 'enemy', 'items', 'exact' and 'simulated'
+    """
+    rows = []
+    for enemy in world.enemies:
+        for item_ids in inventory_combinations(world, enemy):
+            rows.append({"enemy": enemy["name"], "items": [world.items[id]["name"] for id in item_ids],
+                         "wins": win_table(world, enemy, item_ids)})
+    if not rows:
+        return []
+    wins = np.stack([row["wins"] for row in rows])
+    exact = wins.mean(axis=1)
+    # Simulate all combinations at once: number of throws per face for every combination
+    throws = np.random.default_rng(seed).multinomial(rolls, np.full(6, 1 / 6), size=len(rows))
+    simulated = (throws * wins).sum(axis=1) / rolls
+    for row, exact_odds, simulated_odds in zip(rows, exact, simulated):
+        del row["wins"]
+        row["exact"] = float(exact_odds)
+        row["simulated"] = float(simulated_odds)
+    return rows
+
+def print_table(rows: list):
+    """Display the odds as table
+
+    Args:
+        rows (list): result of fight_odds()
+    """
+    print(f"{'enemy':<12} {'items':<30} {'exact':>8} {'simulated':>10}")
+    for row in rows:
+        items = ", ".join(row["items"]) or "-"
+        print(f"{row['enemy']:<12} {items:<30} {row['exact']:>8.2%} {row['simulated']:>10.2%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Odds to win the fights against the enemies of the game")
+    parser.add_argument("--rolls", type=int, default=1_000_000, help="simulated dice throws per item combination")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the simulation")
+    arguments = parser.parse_args()
+    start = time.perf_counter()
+    odds = fight_odds(rolls=arguments.rolls, seed=arguments.seed)
+    duration = time.perf_counter() - start
+    print_table(odds)
+    print(f"\n{len(odds)} combinations with {arguments.rolls} throws each in {duration * 1000:.1f} ms")
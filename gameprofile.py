@@ -0,0 +1,141 @@
+import cProfile
+import collections
+import io
+import pathlib
+import pstats
+import sys
+import threading
+import tracemalloc
+
+########################################################################
+# Profiling Mode
+########################################################################
+# Profiles a whole game session in three ways at once:
+## - cProfile (deterministic): every function call of the main loop and its helpers
+## - a sampling profiler: a background thread records the stack of the main thread every few milliseconds.
+##   Samples, in which the game only waits for the player, are skipped - so the stacks show where the time of
+##   the turns goes. They are written as collapsed stacks ("function;function;function count"), which can be
+##   read by flamegraph.pl, speedscope or inferno.
+## - tracemalloc: snapshots of the allocated memory after the start, after entering each room and after saving
+##   and loading. The report lists the largest allocations of every snapshot and what grew since the last one.
+#
+# Files in the profile directory:
+## - profile.pstats: cProfile data (python -m pstats profile.pstats, snakeviz, ...)
+## - profile.txt: functions with the highest cumulative time and the helpers of the game loop
+## - stacks.collapsed: collapsed stacks of the sampling profiler
+## - allocations.txt: top allocations per snapshot
+#
+# Usage:
+##   python commandlinegame.py --profile profile/
+
+# Helpers of the game loop, which are listed separately in profile.txt
+helper_functions = ("input_and_validation", "choose_doors", "decide_options", "filter_room", "fight_enemy", "throw_dice", "save_game", "open_game")
+# Functions, in which the main thread waits (for input or the next animation frame)
+idle_functions = {"select", "poll", "epoll", "_run_once"}
+
+class GameProfiler:
+    """Profiler for a game session
+
+    Args:
+        directory (pathlib.Path): directory of the profile files
+        interval (float, optional): seconds between two samples of the sampling profiler. Defaults to 0.005.
+        top (int, optional): number of entries in the reports. Defaults to 20.
+    """
+
+    def __init__(self, directory: pathlib.Path, interval: float = 0.005, top: int = 20):
+        self.directory = pathlib.Path(directory)
+        self.interval = interval
+        self.top = top
+        self.profile = cProfile.Profile()
+        # Stack (tuple of code objects, outermost first) -> number of samples
+        self.stacks = collections.Counter()
+        # Name of the phase -> tracemalloc snapshot (in the order the phases first happened)
+        self.snapshots = {}
+        self.stopped = threading.Event()
+        self.sampler = None
+        self.running = False
+        # The profilers themselves are not profiled, while a snapshot is taken
+        self.taking_snapshot = False
+
+    def start(self):
+        """Start profiling the calling thread"""
+        tracemalloc.start(25)
+        self.sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+        self.sampler.start()
+        self.running = True
+        self.profile.enable()
+
+    def snapshot(self, phase: str):
+        """Take a memory snapshot - a later snapshot of the same phase replaces the earlier one
+
+        Args:
+            phase (str): name of the phase, eg. 'startup', 'room _leftroom' or 'save'
+        """
+        if not self.running:
+            return
+        self.profile.disable()
+        self.taking_snapshot = True
+        self.snapshots[phase] = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, __file__)))
+        self.taking_snapshot = False
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling and write the profile files"""
+        if not self.running:
+            return
+        self.profile.disable()
+        self.running = False
+        self.stopped.set()
+        self.sampler.join()
+        tracemalloc.stop()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(self.directory.joinpath("profile.pstats"))
+        self.directory.joinpath("profile.txt").write_text(self._profile_report(), encoding="utf-8")
+        with open(self.directory.joinpath("stacks.collapsed"), "w", encoding="utf-8") as stacks_file:
+            for stack, count in self.stacks.most_common():
+                stacks_file.write(";".join(f"{code.co_name} ({pathlib.Path(code.co_filename).name}:{code.co_firstlineno})"
+                                           for code in stack) + f" {count}\n")
+        self.directory.joinpath("allocations.txt").write_text(self._allocation_report(), encoding="utf-8")
+
+    def _sample(self, thread_id: int):
+        while not self.stopped.wait(self.interval):
+            if self.taking_snapshot:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            if frame is None or frame.f_code.co_name in idle_functions:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def _profile_report(self) -> str:
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.sort_stats("cumulative")
+        output.write("Functions with the highest cumulative time\n")
+        stats.print_stats(self.top)
+        output.write("\nHelpers of the game loop\n")
+        stats.print_stats("|".join(rf"\({name}\)" for name in helper_functions))
+        return output.getvalue()
+
+    def _allocation_report(self) -> str:
+        lines = []
+        previous = None
+        for phase, snapshot in self.snapshots.items():
+            statistics = snapshot.statistics("lineno")
+            total = sum(statistic.size for statistic in statistics)
+            lines.append(f"=== {phase}: {total / 1024:.1f} KiB in {sum(statistic.count for statistic in statistics)} blocks")
+            lines.append(f"Top {self.top} allocations:")
+            lines += [f"  {statistic}" for statistic in statistics[:self.top]]
+            if previous is not None:
+                lines.append(f"Top {self.top} changes since the previous snapshot:")
+                lines += [f"  {statistic}" for statistic in snapshot.compare_to(previous, "lineno")[:self.top]]
+            lines.append("")
+            previous = snapshot
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,237 @@
+import argparse
+import json
+import random
+import sys
+import time
+from gameengine import GameState, start_game, step
+from gameworld import World, default_world
+
+########################################################################
+# Transcripts: Recording and Replay
+########################################################################
+# A transcript contains everything, which is needed to play a game again: the seed of the random number
+# generator, the state at the beginning and every validated command of the player. It is a JSON Lines file:
+##   {"seed": 42, "player_name": "Jannis", "player_state": "", "player_returns": false, "items": [], "dead_enemies": []}
+##   {"command": "left door"}
+##   ...
+##   {"final": {"player_state": "_leftroom", "items": ["sword"], "dead_enemies": []}}
+# Every line is written as soon as it is known, so the transcript of a crashed game is still usable. The final
+# line is the expected result of a replay - it can also be added or corrected with --update.
+#
+# The replay drives the headless engine directly: no prompts, no animations, no output.
+# With --saves every game is also autosaved like in the terminal game (into a temporary save store) and its slot
+# is opened again afterwards - the saved game has to be playable (eg. not saved in the room, in which the player
+# died).
+#
+# Usage:
+##   python commandlinegame.py --record bug.jsonl
+##   python gamereplay.py bug.jsonl [more.jsonl ...] [--repeat 1000] [--update] [--saves]
+
+class TranscriptRecorder:
+    """Writes the transcript of a game while it is played
+
+    Args:
+        path (str): file of the transcript
+        state (GameState): state of the game at the beginning of the recording
+        seed (int): seed of the random number generator of the game
+    """
+
+    def __init__(self, path: str, state: GameState, seed: int):
+        self.file = open(path, "w", encoding="utf-8")
+        self._write({"seed": seed, "player_name": state.player_name, "player_state": state.player_state,
+                     "player_returns": state.player_returns, **final_state(state)})
+
+    def record(self, command: str):
+        """Add a validated command of the player
+
+        Args:
+            command (str): command, which was passed to step()
+        """
+        self._write({"command": command})
+
+    def finish(self, state: GameState):
+        """Add the final state as expected result and close the transcript
+
+        Args:
+            state (GameState): state of the game at the end of the recording
+        """
+        if self.file is None:
+            return
+        self._write({"final": final_state(state)})
+        self.file.close()
+        self.file = None
+
+    def _write(self, line: dict):
+        self.file.write(json.dumps(line) + "\n")
+        self.file.flush()
+
+def final_state(state: GameState) -> dict:
+    """Values of a state, which are compared by a replay
+
+    Args:
+        state (GameState): state of the game
+
+    Returns:
+        dict: 'player_state', 'items' and 'dead_enemies' (names)
+    """
+    return {"player_state": state.player_state, "items": state.player_items.item_names(),
+            "dead_enemies": [state.world.enemies[id]["name"] for id in state.player_dead_enemies]}
+
+def read_transcript(path: str) -> dict:
+    """Read a transcript
+
+    Args:
+        path (str): file of the transcript
+
+    Returns:
+        dict: the first line of the transcript with 'commands' (list) and 'final' (dict or None)
+    """
+    with open(path, encoding="utf-8") as transcript_file:
+        lines = [json.loads(line) for line in transcript_file if line.strip()]
+    if not lines or "seed" not in lines[0]:
+        raise ValueError(f"{path} is not a transcript")
+    transcript = dict(lines[0])
+    transcript["commands"] = [line["command"] for line in lines[1:] if "command" in line]
+    transcript["final"] = next((line["final"] for line in reversed(lines) if "final" in line), None)
+    return transcript
+
+def replay(transcript: dict, world: World = default_world) -> GameState:
+    """Play the commands of a transcript
+
+    Args:
+        transcript (dict): result of read_transcript()
+        world (World, optional): compiled world. Defaults to default_world.
+
+    Returns:
+        GameState: state after the last command
+
+    Raises:
+        ValueError: if a command isn´t valid in the replayed game
+    """
+    state = initial_state(transcript, world)
+    start_game(state)
+    for command in transcript["commands"]:
+        state, _ = step(state, command)
+    return state
+
+def initial_state(transcript: dict, world: World = default_world) -> GameState:
+    """State of the game at the beginning of a transcript
+
+    Args:
+        transcript (dict): result of read_transcript()
+        world (World, optional): compiled world. Defaults to default_world.
+
+    Returns:
+        GameState: state, on which start_game() hasn´t been called yet
+    """
+    return GameState(transcript["player_name"], transcript["player_state"], transcript["player_returns"],
+                     [world.item_ids[name] for name in transcript["items"]],
+                     [world.enemy_ids[name] for name in transcript["dead_enemies"]],
+                     world=world, rng=random.Random(transcript["seed"]))
+
+def check_saves(transcript: dict, world: World = default_world) -> list:
+    """Play a transcript with the autosave of the game into a temporary save store, then open the slot again
+
+    Args:
+        transcript (dict): result of read_transcript()
+        world (World, optional): compiled world. Defaults to default_world.
+
+    Raises:
+        ValueError: if a command isn´t valid in the replayed game
+
+    Returns:
+        list: description of every problem - empty, if the saved game can be opened and played
+    """
+    # The save store is only imported, when it is checked
+    import tempfile
+    from gamesave import Autosaver, SaveStore
+    with tempfile.TemporaryDirectory() as directory:
+        store = SaveStore(directory, sync=False)
+        autosaver = Autosaver(store, interval=0)
+        state = initial_state(transcript, world)
+        # A new game is saved into its slot before it starts (see open_game)
+        store.save(state.player_name, "replay", state)
+        start_game(state)
+        for command in transcript["commands"]:
+            from_room = state.room
+            state, events = step(state, command)
+            autosaver.turn(state.player_name, "replay", state, from_room, events)
+        written = autosaver.flush()
+        autosaver.close()
+        saved = store.load(state.player_name, "replay", world)
+        store.close()
+    if not written:
+        return [f"autosave failed: {autosaver.error}"]
+    if saved is None:
+        return ["the saved game can´t be opened"]
+    start_game(saved)
+    if saved.is_over():
+        return [f"the saved game is over, when it is opened again (in '{saved.player_state}')"]
+    return []
+
+def compare(expected: dict, actual: dict) -> list:
+    """Differences between the expected and the actual final state
+
+    Args:
+        expected (dict): expected values (result of final_state())
+        actual (dict): actual values (result of final_state())
+
+    Returns:
+        list: description of every difference - empty, if the states are equal
+    """
+    return [f"{key}: expected {expected[key]!r}, got {actual[key]!r}" for key in expected if expected[key] != actual.get(key)]
+
+def update_transcript(path: str, final: dict):
+    """Replace the final line of a transcript
+
+    Args:
+        path (str): file of the transcript
+        final (dict): new expected final state
+    """
+    with open(path, encoding="utf-8") as transcript_file:
+        lines = [line for line in transcript_file if line.strip() and "final" not in json.loads(line)]
+    lines.append(json.dumps({"final": final}) + "\n")
+    with open(path, "w", encoding="utf-8") as transcript_file:
+        transcript_file.writelines(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded games and check their final state")
+    parser.add_argument("transcripts", nargs="+", help="transcript files (JSON Lines)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every transcript this many times (for timing)")
+    parser.add_argument("--update", action="store_true", help="store the final state of the replay as expected result")
+    parser.add_argument("--saves", action="store_true", help="also autosave every game and check, that its slot can be opened and played again")
+    arguments = parser.parse_args()
+    failed = 0
+    for path in arguments.transcripts:
+        transcript = read_transcript(path)
+        start = time.perf_counter()
+        try:
+            for _ in range(arguments.repeat):
+                state = replay(transcript)
+        except ValueError as error:
+            print(f"FAILED {path}: {error}")
+            failed += 1
+            continue
+        duration = time.perf_counter() - start
+        if arguments.saves:
+            problems = check_saves(transcript)
+            if problems:
+                print(f"FAILED {path}: " + "; ".join(problems))
+                failed += 1
+                continue
+        turns = len(transcript["commands"]) * arguments.repeat
+        actual = final_state(state)
+        if arguments.update:
+            update_transcript(path, actual)
+            differences = []
+        elif transcript["final"] is None:
+            differences = ["no expected final state (record it with --update)"]
+        else:
+            differences = compare(transcript["final"], actual)
+        if differences:
+            print(f"FAILED {path}: " + "; ".join(differences))
+            failed += 1
+        else:
+            print(f"ok     {path}: {turns} turns in {duration * 1000:.1f} ms ({turns / max(duration, 1e-9):,.0f} turns/s)")
+    if failed:
+        sys.exit(1)
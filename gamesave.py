@@ -0,0 +1,1147 @@
+import collections
+import contextlib
+import csv
+import hashlib
+import mmap
+import os
+import pathlib
+import re
+import struct
+import threading
+import time
+import zlib
+from gameengine import GameState, Inventory
+from gameworld import World, default_world
+try:
+    import fcntl
+except ImportError:
+    # No file locks (eg. on Windows) - then only the threads of one process may share a save store
+    fcntl = None
+
+########################################################################
+# Binary Save Format
+########################################################################
+# Saves are stored in a compact binary format. Every file starts with a header:
+##   4 bytes magic (b"CRPS" for snapshots, b"CRPJ" for journals), 1 byte version, 1 byte flags
+# Flag 1 means, that every snapshot / journal record ends with a CRC32 checksum (4 bytes).
+# All numbers are stored as varints (7 bits per byte, the highest bit marks, that another byte follows) - so
+# the ids of rooms, items and enemies mostly need a single byte.
+#
+# Snapshot (after the header):
+##   sequence number, length of name, name (utf-8), room id, returns (0/1), number of items, item ids...,
+##   number of defeated enemies, enemy ids...
+# Journal record (after the header):
+##   length of the record, sequence number, opcode, arguments
+##   room: room id, returns (0/1)  |  item: item id  |  clear: -  |  enemy: enemy id
+
+save_format_version = 1
+snapshot_magic = b"CRPS"
+journal_magic = b"CRPJ"
+flag_checksum = 1
+
+op_room = 1
+op_item = 2
+op_clear = 3
+op_enemy = 4
+# Number of arguments of every opcode
+op_arguments = {op_room: 2, op_item: 1, op_clear: 0, op_enemy: 1}
+
+def encode_varint(number: int, out: bytearray):
+    """Append a non-negative integer as varint
+
+    Args:
+        number (int): number to encode
+        out (bytearray): buffer, to which the varint is appended
+    """
+    while number > 0x7f:
+        out.append((number & 0x7f) | 0x80)
+        number >>= 7
+    out.append(number)
+
+def decode_varint(data: bytes, position: int):
+    """Read a varint
+
+    Args:
+        data (bytes): encoded data
+        position (int): position of the varint in data
+
+    Raises:
+        ValueError: if the data ends in the middle of the varint
+
+    Returns:
+        int: decoded number
+        int: position after the varint
+    """
+    number = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("Save data ends in the middle of a number")
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
+
+def encode_state(fields: dict, sequence: int = 0, checksum: bool = True) -> bytes:
+    """Encode the fields of a game into a binary snapshot
+
+    Args:
+        fields (dict): fields of the game - name, room id, returns, item ids and enemy ids
+        sequence (int, optional): sequence number of the last journal record included. Defaults to 0.
+        checksum (bool, optional): append a CRC32 checksum. Defaults to True.
+
+    Returns:
+        bytes: binary snapshot including header
+    """
+    body = bytearray()
+    encode_varint(sequence, body)
+    name = fields["name"].encode("utf-8")
+    encode_varint(len(name), body)
+    body += name
+    encode_varint(fields["room"], body)
+    body.append(1 if fields["returns"] else 0)
+    for ids in (fields["items"], fields["enemies"]):
+        encode_varint(len(ids), body)
+        for id in ids:
+            encode_varint(id, body)
+    header = snapshot_magic + bytes([save_format_version, flag_checksum if checksum else 0])
+    if checksum:
+        body += zlib.crc32(body).to_bytes(4, "little")
+    return header + bytes(body)
+
+def decode_state(data: bytes, world: World = default_world):
+    """Decode a binary snapshot
+
+    Args:
+        data (bytes): binary snapshot including header
+        world (World, optional): world of the saved game, used to validate the ids. Defaults to default_world.
+
+    Raises:
+        ValueError: if the snapshot is corrupt, from a newer version of the game or refers to unknown ids
+
+    Returns:
+        dict: fields of the game
+        int: sequence number of the last journal record included
+    """
+    fields, sequence = _decode_state(data)
+    _validate(fields, world)
+    return fields, sequence
+
+def _decode_state(data: bytes):
+    # decode_state() without checking the ids against a world
+    flags = _check_header(data, snapshot_magic)
+    body = data[6:]
+    if flags & flag_checksum:
+        body, checksum = body[:-4], body[-4:]
+        if zlib.crc32(body).to_bytes(4, "little") != checksum:
+            raise ValueError("Checksum of the save does not match")
+    sequence, position = decode_varint(body, 0)
+    length, position = decode_varint(body, position)
+    if position + length > len(body):
+        raise ValueError("Save data ends in the middle of the name")
+    fields = {"name": body[position:position + length].decode("utf-8")}
+    fields["room"], position = decode_varint(body, position + length)
+    if position >= len(body):
+        raise ValueError("Save data ends before the room")
+    fields["returns"] = body[position] == 1
+    position += 1
+    for key in ("items", "enemies"):
+        count, position = decode_varint(body, position)
+        fields[key] = []
+        for _ in range(count):
+            id, position = decode_varint(body, position)
+            fields[key].append(id)
+    if position != len(body):
+        raise ValueError("Save data has unexpected trailing bytes")
+    return fields, sequence
+
+def _check_header(data: bytes, magic: bytes) -> int:
+    if len(data) < 6 or data[:4] != magic:
+        raise ValueError("File is not a save of this game")
+    if data[4] > save_format_version:
+        raise ValueError(f"Save has version {data[4]}, but this game only reads versions up to {save_format_version}")
+    return data[5]
+
+def _validate(fields: dict, world: World):
+    if fields["room"] >= len(world.rooms):
+        raise ValueError(f"Unknown room id {fields['room']}")
+    if any(id >= len(world.items) for id in fields["items"]):
+        raise ValueError("Unknown item id")
+    if any(id >= len(world.enemies) for id in fields["enemies"]):
+        raise ValueError("Unknown enemy id")
+
+########################################################################
+# Journaled Saves
+########################################################################
+# Instead of rewriting the whole save, every save appends only the changes since the last save to a journal.
+# From time to time the journal is compacted into a snapshot, which contains the full state of the game and the
+# sequence number of the last record it includes. A game is loaded by reading the snapshot and replaying all
+# journal records with a higher sequence number. A record, which was only partly written during a crash (or
+# whose checksum does not match), ends the replay - so the save is always consistent.
+
+save_directory = pathlib.Path.home().joinpath("Documents/codingnomads/projects/CLI-RPG")
+
+class SaveJournal:
+    """Append-only journal of state changes with periodic snapshots
+
+    Args:
+        directory (pathlib.Path, optional): directory of the save files. Defaults to save_directory.
+        name (str, optional): name of the save. Defaults to "active-game".
+        snapshot_every (int, optional): number of journal records, after which the journal is compacted. Defaults to 100.
+        sync_every (int, optional): number of saves, after which the journal is synced to disk. Defaults to 10.
+        sync_interval (float, optional): seconds, after which the journal is synced to disk. Defaults to 1.0.
+        checksum (bool, optional): protect snapshots and journal records with a CRC32 checksum. Defaults to True.
+    """
+
+    def __init__(self, directory: pathlib.Path = save_directory, name: str = "active-game",
+                 snapshot_every: int = 100, sync_every: int = 10, sync_interval: float = 1.0, checksum: bool = True):
+        self.snapshot_path = pathlib.Path(directory).joinpath(f"{name}.sav")
+        self.journal_path = pathlib.Path(directory).joinpath(f"{name}.journal")
+        self.legacy_path = pathlib.Path(directory).joinpath(f"{name}.csv")
+        self.snapshot_every = snapshot_every
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.checksum = checksum
+        self.sequence = 0
+        self.journal_records = 0
+        self.unsynced_saves = 0
+        self.last_sync = time.monotonic()
+        self.saved = None
+        self.journal_file = None
+        # Number of bytes written by this journal (snapshots and records)
+        self.bytes_written = 0
+
+    def exists(self) -> bool:
+        """Check if there is a save, which can be loaded
+
+        Returns:
+            bool: True, if a snapshot or an old CSV save exists
+        """
+        return self.snapshot_path.exists() or self.legacy_path.exists()
+
+    def load(self, world: World = default_world) -> GameState:
+        """Load the latest snapshot and replay the journal
+
+        Args:
+            world (World, optional): world of the saved game. Defaults to default_world.
+
+        Returns:
+            GameState: the saved game or None, if there is no save or it is corrupt
+        """
+        try:
+            if self.snapshot_path.exists():
+                fields, self.sequence = decode_state(self.snapshot_path.read_bytes(), world)
+            elif self.legacy_path.exists():
+                fields = read_legacy_save(self.legacy_path, world)
+            else:
+                return None
+            if fields is None:
+                return None
+            self.journal_records = self._replay(fields, world)
+        except ValueError:
+            return None
+        state = _state(fields, world)
+        self.saved = fields
+        # An old CSV save is converted once into the new format
+        if not self.snapshot_path.exists():
+            self.snapshot(state)
+        return state
+
+    def save(self, state: GameState):
+        """Append the changes since the last save to the journal
+
+        Args:
+            state (GameState): current state of the game
+        """
+        current = _fields(state)
+        records = _changes(self.saved, current) if self.saved is not None else None
+        if records is None:
+            # A new game (or a state, which can´t be described by changes) is written as snapshot
+            self.snapshot(state)
+            return
+        if records:
+            self._append(records)
+        self.saved = current
+        if self.journal_records >= self.snapshot_every:
+            self.snapshot(state)
+
+    def snapshot(self, state: GameState):
+        """Write the full state into a new snapshot and start an empty journal
+
+        Args:
+            state (GameState): current state of the game
+        """
+        self.close()
+        fields = _fields(state)
+        # Write the snapshot into a temporary file and replace the old one, so a crash leaves either of them intact
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.snapshot_path.with_suffix(".tmp")
+        data = encode_state(fields, self.sequence, self.checksum)
+        with open(temporary_path, "wb") as snapshot_file:
+            snapshot_file.write(data)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+        # Records up to the sequence number are part of the snapshot now
+        with open(self.journal_path, "wb") as journal_file:
+            journal_file.write(journal_magic + bytes([save_format_version, flag_checksum if self.checksum else 0]))
+        self.bytes_written += len(data) + len(journal_magic) + 2
+        self.journal_records = 0
+        self.saved = fields
+
+    def archive(self):
+        """Rename the files of the save (eg. after it has been imported into a save slot), so it isn´t loaded again.
+        They are kept as <name>.imported.sav, <name>.imported.journal and <name>.imported.csv.
+        """
+        self.close()
+        for path in (self.snapshot_path, self.journal_path, self.legacy_path):
+            if path.exists():
+                os.replace(path, path.with_name(f"{path.stem}.imported{path.suffix}"))
+
+    def flush(self, sync: bool = True):
+        """Write buffered records to the operating system and optionally sync them to disk
+
+        Args:
+            sync (bool, optional): also sync the journal to disk. Defaults to True.
+        """
+        if self.journal_file is None:
+            return
+        self.journal_file.flush()
+        if sync:
+            os.fsync(self.journal_file.fileno())
+            self.unsynced_saves = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        """Sync and close the journal file"""
+        if self.journal_file is not None:
+            self.flush()
+            self.journal_file.close()
+            self.journal_file = None
+
+    def _append(self, records: list):
+        if self.journal_file is None:
+            self.journal_file = open(self.journal_path, "ab")
+        data = bytearray()
+        for record in records:
+            self.sequence += 1
+            body = bytearray()
+            encode_varint(self.sequence, body)
+            for number in record:
+                encode_varint(number, body)
+            if self.checksum:
+                body += zlib.crc32(body).to_bytes(4, "little")
+            encode_varint(len(body), data)
+            data += body
+        self.journal_file.write(data)
+        self.bytes_written += len(data)
+        self.journal_records += len(records)
+        # Syncs are batched: only every few saves or after some time the journal is synced to disk
+        self.unsynced_saves += 1
+        sync = self.unsynced_saves >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval
+        self.flush(sync)
+
+    def _replay(self, fields: dict, world: World) -> int:
+        if not self.journal_path.exists():
+            return 0
+        data = self.journal_path.read_bytes()
+        try:
+            flags = _check_header(data, journal_magic)
+        except ValueError:
+            return 0
+        replayed = 0
+        position = 6
+        while position < len(data):
+            try:
+                length, start = decode_varint(data, position)
+                if start + length > len(data):
+                    break
+                body = data[start:start + length]
+                if flags & flag_checksum:
+                    body, checksum = body[:-4], body[-4:]
+                    if zlib.crc32(body).to_bytes(4, "little") != checksum:
+                        break
+                sequence, offset = decode_varint(body, 0)
+                record = []
+                while offset < len(body):
+                    number, offset = decode_varint(body, offset)
+                    record.append(number)
+                if sequence > self.sequence:
+                    _apply(fields, record)
+                    self.sequence = sequence
+                    replayed += 1
+            except (ValueError, IndexError):
+                break
+            position = start + length
+        _validate(fields, world)
+        return replayed
+
+########################################################################
+# Save Slots
+########################################################################
+# Every player can keep several named saves (slots). All slots of all players are stored in two files, which
+# are shared by every game on the host:
+## - saves.dat: append-only data file. After a header (b"CRPD", version, flags, 8 bytes generation) it contains
+##   records: kind (1 byte), length of the body, body. A state record contains a binary snapshot (see above), a
+##   changes record the changes of a slot since its previous record: position and length of the previous record,
+##   journal records (opcode, arguments) - followed by a CRC32 checksum. A directory record contains the slots of
+##   one player: length of name, name, number of slots and per slot length of the slot name, slot name, position
+##   and length of its latest record, number of changes records since its state record and the bytes of all its
+##   records - followed by a CRC32 checksum.
+## - saves.idx: hash table, which maps every player to his latest directory record. It is mapped into memory:
+##   a header (b"CRPX", version, generation, capacity, players, used buckets, bytes of garbage) and buckets of
+##   8 bytes hash of the name, 8 bytes position and 4 bytes length of the directory record.
+# Listing, loading and deleting slots need a single hash lookup and a few reads - independent of the number of
+# saves. Like the journal above, a save appends only the changes since the last save of the slot (and a new
+# directory record) and updates one bucket - every few changes the slot is written as a new state record again.
+# Records, which have been replaced, are garbage; when there is too much of it, the live records are copied into
+# new files (compaction), which also merges the changes of every slot into its state.
+# The index can always be rebuilt from the data file: it is rebuilt, if it is missing or if its generation does
+# not match the data file (eg. after a crash during a compaction). Processes are synchronized with a lock file.
+
+store_data_magic = b"CRPD"
+store_index_magic = b"CRPX"
+store_data_header = struct.Struct("<4sBBQ")
+store_index_header = struct.Struct("<4sB3xQIII4xQ")
+store_bucket = struct.Struct("<QQI4x")
+# Hashes of empty and deleted buckets, no name has these hashes
+bucket_empty = 0
+bucket_deleted = 1
+record_state = 1
+record_directory = 2
+record_changes = 3
+
+class SaveStore:
+    """Named save slots of many players in one data file with an on-disk hash index
+
+    Args:
+        directory (pathlib.Path, optional): directory of the store. Defaults to the directory 'slots' in save_directory.
+        sync (bool, optional): sync every change to disk before it is visible in the index. Defaults to True.
+        checksum (bool, optional): protect the saved states with a CRC32 checksum. Defaults to True.
+        capacity (int, optional): initial number of buckets of the index. Defaults to 1024.
+        load_factor (float, optional): share of used buckets, above which the index grows. Defaults to 0.7.
+        garbage_ratio (float, optional): share of garbage in the data file, above which it is compacted. Defaults to 0.5.
+        snapshot_every (int, optional): number of changes records, after which a slot is written as state again. Defaults to 100.
+        cache_slots (int, optional): number of slots, whose last saved state is kept to write only the changes. Defaults to 4096.
+    """
+
+    def __init__(self, directory: pathlib.Path = save_directory.joinpath("slots"), sync: bool = True, checksum: bool = True,
+                 capacity: int = 1024, load_factor: float = 0.7, garbage_ratio: float = 0.5, snapshot_every: int = 100,
+                 cache_slots: int = 4096):
+        self.directory = pathlib.Path(directory)
+        self.data_path = self.directory.joinpath("saves.dat")
+        self.index_path = self.directory.joinpath("saves.idx")
+        self.lock_path = self.directory.joinpath("saves.lock")
+        self.sync = sync
+        self.checksum = checksum
+        self.initial_capacity = capacity
+        self.load_factor = load_factor
+        self.garbage_ratio = garbage_ratio
+        self.snapshot_every = snapshot_every
+        self.cache_slots = cache_slots
+        # (player, slot) -> (fields, generation of the data file, position of the latest record) of the slots, which
+        # were saved last by this store (least recently saved first)
+        self.saved = collections.OrderedDict()
+        # Compaction is only worth it above this size
+        self.min_garbage = 1 << 20
+        self.lock = threading.Lock()
+        self.lock_file = None
+        self.data_fd = None
+        self.index_file = None
+        self.index = None
+        # Number of bytes written by this store (records and rewritten files)
+        self.bytes_written = 0
+
+    def __len__(self) -> int:
+        """Number of players with at least one slot"""
+        with self._locked():
+            return self._header()[4]
+
+    def slots(self, player: str) -> list:
+        """Names of the slots of a player
+
+        Args:
+            player (str): name of the player
+
+        Returns:
+            list: sorted names of the slots
+        """
+        with self._locked():
+            entry = self._find(player)[1]
+        return sorted(entry[2]) if entry is not None else []
+
+    def load(self, player: str, slot: str, world: World = default_world) -> GameState:
+        """Load the game in a slot
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+            world (World, optional): world of the saved game. Defaults to default_world.
+
+        Returns:
+            GameState: the saved game or None, if the slot does not exist or is corrupt
+        """
+        with self._locked():
+            entry = self._find(player)[1]
+            if entry is None or slot not in entry[2]:
+                return None
+            try:
+                fields = self._read_slot(*entry[2][slot][:3])
+                _validate(fields, world)
+            except ValueError:
+                return None
+        return _state(fields, world)
+
+    def save(self, player: str, slot: str, state: GameState):
+        """Save a game into a slot (a slot of the same name is replaced)
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+            state (GameState): current state of the game
+        """
+        self.save_many([(player, slot, state)])
+
+    def save_many(self, saves: list):
+        """Save several games at once, they are synced to disk together (eg. the autosaves of many sessions)
+
+        Args:
+            saves (list): (player, slot, state) of every game
+        """
+        current = [(player, slot, _fields(state)) for player, slot, state in saves]
+        with self._locked(exclusive=True):
+            for player, slot, fields in current:
+                bucket, entry = self._find(player)
+                slots = dict(entry[2]) if entry is not None else {}
+                garbage = entry[1] if entry is not None else 0
+                generation = self._header()[2]
+                # Only the changes are written, if this store saved the slot last (and it hasn´t been moved since)
+                saved = self.saved.get((player, slot))
+                records = None
+                if saved is not None and slot in slots and saved[1:] == (generation, slots[slot][0]) and \
+                        slots[slot][2] < self.snapshot_every:
+                    records = _changes(saved[0], fields)
+                    if not records:
+                        continue
+                position = os.fstat(self.data_fd).st_size
+                if records is None:
+                    if slot in slots:
+                        garbage += slots[slot][3]
+                    body = encode_state(fields, checksum=self.checksum)
+                    record = _store_record(record_state, body)
+                    slots[slot] = (position + len(record) - len(body), len(body), 0, len(record))
+                else:
+                    previous_position, previous_length, changes, size = slots[slot]
+                    body = _encode_changes(previous_position, previous_length, records)
+                    record = _store_record(record_changes, body)
+                    slots[slot] = (position + len(record) - len(body), len(body), changes + 1, size + len(record))
+                directory_record = _store_record(record_directory, _encode_directory(player, slots))
+                self._append(record + directory_record)
+                self._set_bucket(bucket, player, position + len(record), len(directory_record), entry is None, garbage)
+                self.saved[(player, slot)] = (fields, generation, slots[slot][0])
+                self.saved.move_to_end((player, slot))
+                if len(self.saved) > self.cache_slots:
+                    self.saved.popitem(last=False)
+                self._maintain()
+            self._sync()
+
+    def delete(self, player: str, slot: str) -> bool:
+        """Delete a slot
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+
+        Returns:
+            bool: True, if the slot existed
+        """
+        with self._locked(exclusive=True):
+            bucket, entry = self._find(player)
+            if entry is None or slot not in entry[2]:
+                return False
+            slots = dict(entry[2])
+            garbage = entry[1] + slots.pop(slot)[3]
+            self.saved.pop((player, slot), None)
+            # The directory is written even if it is empty, so a rebuilt index doesn´t bring the slot back
+            directory_record = _store_record(record_directory, _encode_directory(player, slots))
+            position = self._append(directory_record)
+            if slots:
+                self._set_bucket(bucket, player, position, len(directory_record), False, garbage)
+            else:
+                self._clear_bucket(bucket, garbage + len(directory_record))
+            self._maintain()
+            self._sync()
+            return True
+
+    def compact(self):
+        """Copy the live records into new files, which drops all garbage"""
+        with self._locked(exclusive=True):
+            self._compact()
+
+    def close(self):
+        """Close the files of the store"""
+        with self.lock:
+            self._close_files()
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool = False):
+        with self.lock:
+            if self.lock_file is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.lock_file = open(self.lock_path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if not self._current():
+                    # Another process replaced the files (or they don´t exist yet) - opening them may write
+                    if fcntl is not None and not exclusive:
+                        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+                    if not self._current():
+                        self._open_files()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _current(self) -> bool:
+        if self.data_fd is None:
+            return False
+        try:
+            return os.stat(self.data_path).st_ino == os.fstat(self.data_fd).st_ino and \
+                os.stat(self.index_path).st_ino == os.fstat(self.index_file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _open_files(self):
+        self._close_files()
+        generation = None
+        if self.data_path.exists():
+            with open(self.data_path, "rb") as data_file:
+                header = data_file.read(store_data_header.size)
+            if len(header) == store_data_header.size:
+                magic, version, _, generation = store_data_header.unpack(header)
+                if magic != store_data_magic:
+                    raise ValueError(f"{self.data_path} is not a save store of this game")
+                if version > save_format_version:
+                    raise ValueError(f"Save store has version {version}, but this game only reads versions up to {save_format_version}")
+        if generation is None:
+            generation = self._write_data(b"")
+        self.data_fd = os.open(self.data_path, os.O_RDWR | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        if not self._open_index(generation):
+            self._rebuild(generation)
+            self._open_index(generation)
+
+    def _open_index(self, generation: int) -> bool:
+        try:
+            index_file = open(self.index_path, "r+b")
+        except FileNotFoundError:
+            return False
+        try:
+            index = mmap.mmap(index_file.fileno(), 0)
+        except ValueError:
+            index_file.close()
+            return False
+        magic, _, index_generation, capacity = store_index_header.unpack_from(index)[:4] \
+            if len(index) >= store_index_header.size else (b"", 0, None, 0)
+        if magic != store_index_magic or index_generation != generation or \
+                len(index) != store_index_header.size + capacity * store_bucket.size:
+            index.close()
+            index_file.close()
+            return False
+        self.index_file = index_file
+        self.index = index
+        return True
+
+    def _close_files(self):
+        if self.index is not None:
+            self.index.close()
+            self.index_file.close()
+            self.index = self.index_file = None
+        if self.data_fd is not None:
+            os.close(self.data_fd)
+            self.data_fd = None
+
+    def _header(self) -> tuple:
+        # magic, version, generation, capacity, players, used buckets, garbage
+        return store_index_header.unpack_from(self.index)
+
+    def _find(self, player: str):
+        # Bucket of the player (or the free bucket for him) and his directory: (position, length, slots)
+        key = _store_key(player)
+        capacity = self._header()[3]
+        bucket = key % capacity
+        free = None
+        while True:
+            hash, position, length = store_bucket.unpack_from(self.index, store_index_header.size + bucket * store_bucket.size)
+            if hash == bucket_empty:
+                return (bucket if free is None else free), None
+            if hash == bucket_deleted:
+                if free is None:
+                    free = bucket
+            elif hash == key:
+                directory = _decode_directory(os.pread(self.data_fd, length, position))
+                # Different names with the same hash are told apart by the name in the directory
+                if directory is not None and directory[0] == player:
+                    return bucket, (position, length, directory[1])
+            bucket = (bucket + 1) % capacity
+
+    def _read_slot(self, position: int, length: int, changes: int) -> dict:
+        # Fields of a slot: its state record and the changes records after it (without checking the ids)
+        chain = []
+        for _ in range(changes):
+            position, length, records = _decode_changes(os.pread(self.data_fd, length, position))
+            chain.append(records)
+        fields = _decode_state(os.pread(self.data_fd, length, position))[0]
+        for records in reversed(chain):
+            for record in records:
+                _apply(fields, record)
+        return fields
+
+    def _append(self, data: bytes) -> int:
+        position = os.fstat(self.data_fd).st_size
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.data_fd, view):]
+        self.bytes_written += len(data)
+        return position
+
+    def _sync(self):
+        # The records are on disk, before the index refers to them
+        if self.sync:
+            os.fsync(self.data_fd)
+            self.index.flush()
+
+    def _set_bucket(self, bucket: int, player: str, position: int, length: int, new: bool, garbage: int):
+        magic, version, generation, capacity, players, used, total_garbage = self._header()
+        if new:
+            players += 1
+            hash = store_bucket.unpack_from(self.index, store_index_header.size + bucket * store_bucket.size)[0]
+            used += hash == bucket_empty
+        store_bucket.pack_into(self.index, store_index_header.size + bucket * store_bucket.size, _store_key(player), position, length)
+        store_index_header.pack_into(self.index, 0, magic, version, generation, capacity, players, used, total_garbage + garbage)
+
+    def _clear_bucket(self, bucket: int, garbage: int):
+        magic, version, generation, capacity, players, used, total_garbage = self._header()
+        store_bucket.pack_into(self.index, store_index_header.size + bucket * store_bucket.size, bucket_deleted, 0, 0)
+        store_index_header.pack_into(self.index, 0, magic, version, generation, capacity, players - 1, used, total_garbage + garbage)
+
+    def _maintain(self):
+        _, _, generation, capacity, players, used, garbage = self._header()
+        if garbage > max(self.min_garbage, os.fstat(self.data_fd).st_size * self.garbage_ratio):
+            self._compact()
+        elif used > capacity * self.load_factor:
+            # Grow, if most used buckets are players - otherwise deleted buckets are only cleaned up
+            self._write_index(generation, self._entries(), garbage, capacity * 2 if players > capacity * self.load_factor / 2 else capacity)
+            self._open_files()
+
+    def _entries(self) -> list:
+        # (player hash, position, length) of all players
+        entries = []
+        for bucket in range(self._header()[3]):
+            entry = store_bucket.unpack_from(self.index, store_index_header.size + bucket * store_bucket.size)
+            if entry[0] > bucket_deleted:
+                entries.append(entry)
+        return entries
+
+    def _compact(self):
+        records = bytearray()
+        entries = []
+        for hash, position, length in self._entries():
+            player, slots = _decode_directory(os.pread(self.data_fd, length, position))
+            start = store_data_header.size + len(records)
+            moved = {}
+            for slot, (slot_position, slot_length, changes, size) in slots.items():
+                if changes:
+                    # The changes are merged into a new state record
+                    try:
+                        body = encode_state(self._read_slot(slot_position, slot_length, changes), checksum=self.checksum)
+                    except ValueError:
+                        # A slot, which can´t be read anymore, can´t be loaded either - it is dropped
+                        continue
+                    records += _store_record(record_state, body)
+                    slot_length = len(body)
+                else:
+                    head = _record_size(slot_length) - slot_length
+                    records += os.pread(self.data_fd, slot_length + head, slot_position - head)
+                moved[slot] = (store_data_header.size + len(records) - slot_length, slot_length, 0, _record_size(slot_length))
+            directory_record = _store_record(record_directory, _encode_directory(player, moved))
+            entries.append((hash, store_data_header.size + len(records), len(directory_record)))
+            records += directory_record
+        generation = self._write_data(records)
+        self._write_index(generation, entries, 0, self._header()[3])
+        self._open_files()
+
+    def _rebuild(self, generation: int):
+        # Read all records of the data file, the last directory of every player wins
+        with open(self.data_path, "rb") as data_file:
+            data = data_file.read()
+        directories = {}
+        live = 0
+        position = store_data_header.size
+        while position < len(data):
+            try:
+                length, start = decode_varint(data, position + 1)
+            except ValueError:
+                break
+            if start + length > len(data) or data[position] not in (record_state, record_directory, record_changes):
+                break
+            if data[position] == record_directory:
+                directory = _decode_directory(data[position:start + length])
+                if directory is None:
+                    break
+                directories[directory[0]] = (position, start + length - position, directory[1])
+            position = start + length
+        # A record, which was only partly written during a crash, is cut off
+        if position < len(data):
+            os.truncate(self.data_path, position)
+        entries = []
+        for player, (record_position, length, slots) in directories.items():
+            if slots:
+                entries.append((_store_key(player), record_position, length))
+                live += length + sum(size for _, _, _, size in slots.values())
+        self._write_index(generation, entries, position - store_data_header.size - live,
+                          max(self.initial_capacity, int(len(entries) / self.load_factor) * 2))
+
+    def _write_data(self, records: bytes) -> int:
+        generation = int.from_bytes(os.urandom(8), "little")
+        self._replace(self.data_path, store_data_header.pack(store_data_magic, save_format_version, 0, generation) + records)
+        return generation
+
+    def _write_index(self, generation: int, entries: list, garbage: int, capacity: int):
+        buckets = bytearray(capacity * store_bucket.size)
+        for hash, position, length in entries:
+            bucket = hash % capacity
+            while store_bucket.unpack_from(buckets, bucket * store_bucket.size)[0] != bucket_empty:
+                bucket = (bucket + 1) % capacity
+            store_bucket.pack_into(buckets, bucket * store_bucket.size, hash, position, length)
+        header = store_index_header.pack(store_index_magic, save_format_version, generation, capacity, len(entries), len(entries), garbage)
+        self._replace(self.index_path, header + buckets)
+
+    def _replace(self, path: pathlib.Path, data: bytes):
+        # Write into a temporary file and replace the old one, so a crash leaves either of them intact
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as temporary_file:
+            temporary_file.write(data)
+            temporary_file.flush()
+            if self.sync:
+                os.fsync(temporary_file.fileno())
+        os.replace(temporary_path, path)
+        self.bytes_written += len(data)
+
+def open_store(location: str = None, world: World = default_world):
+    """Open the store of the save slots - every store has the methods slots, load, save, save_many, delete and close
+
+    Args:
+        location (str, optional): 'sqlite:FILE' for a SQLite database (see gamedb.py) or the directory of a SaveStore.
+            Defaults to None (the SaveStore in save_directory).
+        world (World, optional): world of the saved games. Defaults to default_world.
+
+    Returns:
+        SaveStore | gamedb.SqliteStore: the opened store
+    """
+    if location is None:
+        return SaveStore()
+    if location.startswith("sqlite:"):
+        # SQLite is only imported, when it is used
+        from gamedb import SqliteStore
+        return SqliteStore(location.removeprefix("sqlite:"), world)
+    return SaveStore(location)
+
+def _store_key(player: str) -> int:
+    # A stable hash (the built-in hash of strings differs between processes), which is never empty or deleted
+    return max(int.from_bytes(hashlib.blake2b(player.encode("utf-8"), digest_size=8).digest(), "little"), bucket_deleted + 1)
+
+def _store_record(kind: int, body: bytes) -> bytes:
+    record = bytearray([kind])
+    encode_varint(len(body), record)
+    return bytes(record + body)
+
+def _record_size(length: int) -> int:
+    # Size of a record with a body of this length
+    head = bytearray()
+    encode_varint(length, head)
+    return 1 + len(head) + length
+
+def _encode_directory(player: str, slots: dict) -> bytes:
+    body = bytearray()
+    name = player.encode("utf-8")
+    encode_varint(len(name), body)
+    body += name
+    encode_varint(len(slots), body)
+    for slot, numbers in slots.items():
+        slot_name = slot.encode("utf-8")
+        encode_varint(len(slot_name), body)
+        body += slot_name
+        for number in numbers:
+            encode_varint(number, body)
+    body += zlib.crc32(body).to_bytes(4, "little")
+    return bytes(body)
+
+def _decode_directory(record: bytes):
+    # Name of the player and his slots (name -> position, length, changes, size) - or None, if the record is corrupt
+    try:
+        length, position = decode_varint(record, 1)
+        body = record[position:position + length]
+        if record[0] != record_directory or len(body) != length or zlib.crc32(body[:-4]).to_bytes(4, "little") != body[-4:]:
+            return None
+        length, position = decode_varint(body, 0)
+        player = body[position:position + length].decode("utf-8")
+        count, position = decode_varint(body, position + length)
+        slots = {}
+        for _ in range(count):
+            length, position = decode_varint(body, position)
+            slot = body[position:position + length].decode("utf-8")
+            position += length
+            numbers = []
+            for _ in range(4):
+                number, position = decode_varint(body, position)
+                numbers.append(number)
+            slots[slot] = tuple(numbers)
+        return player, slots
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return None
+
+def _encode_changes(position: int, length: int, records: list) -> bytes:
+    body = bytearray()
+    encode_varint(position, body)
+    encode_varint(length, body)
+    for record in records:
+        for number in record:
+            encode_varint(number, body)
+    body += zlib.crc32(body).to_bytes(4, "little")
+    return bytes(body)
+
+def _decode_changes(body: bytes) -> tuple:
+    # Position and length of the previous record of the slot and the journal records
+    if len(body) < 4 or zlib.crc32(body[:-4]).to_bytes(4, "little") != body[-4:]:
+        raise ValueError("Checksum of the changes does not match")
+    body = body[:-4]
+    position, offset = decode_varint(body, 0)
+    length, offset = decode_varint(body, offset)
+    records = []
+    while offset < len(body):
+        opcode, offset = decode_varint(body, offset)
+        if opcode not in op_arguments:
+            raise ValueError(f"Unknown opcode {opcode}")
+        record = [opcode]
+        for _ in range(op_arguments[opcode]):
+            number, offset = decode_varint(body, offset)
+            record.append(number)
+        records.append(record)
+    return position, length, records
+
+########################################################################
+# Autosave
+########################################################################
+# Games are saved automatically, when their state changes (the player enters another room, takes an item or a
+# fight ends) - but never, when the player has died. The game only copies the ids of its state and goes on - a
+# background thread writes them. Changes, which happen shortly after each other, are coalesced: the thread writes
+# at most once per interval (all games, which changed in the meantime, in one save_many). So a crash loses at
+# most the changes of one interval.
+
+# Events of the game engine, which change the saved state
+autosave_events = frozenset(("item_taken", "items_lost", "fight_result"))
+
+class Autosaver:
+    """Writes changed games into a store of save slots in a background thread
+
+    Args:
+        store (SaveStore): store of the save slots (any store of open_store)
+        interval (float, optional): minimum seconds between two writes. Defaults to 1.0.
+    """
+
+    def __init__(self, store, interval: float = 1.0):
+        self.store = store
+        self.interval = interval
+        self.condition = threading.Condition()
+        # (player, slot) -> (fields, world) of the latest state, which hasn´t been written yet
+        self.pending = {}
+        # A save of the player, which is written without waiting for the interval
+        self.immediate = False
+        self.writing = False
+        self.closed = False
+        self.last_write = 0.0
+        self.thread = None
+        # Duration and bytes of the latest finished writes (for the telemetry - collected by the game thread)
+        self.writes = collections.deque(maxlen=1000)
+        # Last error of a write - the changes are written again with the next write
+        self.error = None
+        # Number of writes, which have been started, and number of the last write, which failed
+        self.started = 0
+        self.failed = 0
+
+    def changed(self, player: str, slot: str, state: GameState, immediately: bool = False):
+        """Remember the current state of a game, it is written by the background thread
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+            state (GameState): current state of the game
+            immediately (bool, optional): write without waiting for the interval (eg. the player typed 'save'). Defaults to False.
+        """
+        fields = _fields(state)
+        with self.condition:
+            self.pending[(player, slot)] = (fields, state.world)
+            self.immediate = self.immediate or immediately
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def turn(self, player: str, slot: str, state: GameState, from_room: int, events: list):
+        """Remember the state after a turn, if the turn changed it. A turn, which ends the game (the player died), is
+        not saved - the slot keeps the state before it, otherwise opening the slot would kill the player again.
+
+        Args:
+            player (str): name of the player
+            slot (str): name of the slot
+            state (GameState): state of the game after the turn
+            from_room (int): id of the room before the turn
+            events (list): events of the game engine
+        """
+        if state.is_over():
+            return
+        if state.room != from_room or any(event["type"] in autosave_events for event in events):
+            self.changed(player, slot, state)
+
+    def flush(self) -> bool:
+        """Write all remembered states now and wait until they are written
+
+        Returns:
+            bool: True, if they have been written - False, if a write failed (see error). The failed changes are
+                written again after the interval.
+        """
+        with self.condition:
+            # Only a write, which starts after this call, contains all remembered states
+            first = self.started + 1
+            while (self.pending or self.writing) and self.thread is not None and self.thread.is_alive():
+                if self.failed >= first:
+                    return False
+                if self.pending and not self.immediate:
+                    self.immediate = True
+                    self.condition.notify_all()
+                self.condition.wait()
+            return not self.pending
+
+    def close(self):
+        """Write all remembered states and stop the background thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                # Coalesce: wait for more changes until the interval since the last write has passed
+                while self.pending and not (self.closed or self.immediate):
+                    delay = self.last_write + self.interval - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, {}
+                self.immediate = False
+                self.writing = True
+                self.started += 1
+                number = self.started
+            start = time.perf_counter()
+            written = self.store.bytes_written
+            try:
+                self.store.save_many([(player, slot, _state(fields, world)) for (player, slot), (fields, world) in batch.items()])
+                self.writes.append((time.perf_counter() - start, self.store.bytes_written - written))
+                self.error = None
+            except Exception as error:
+                self.error = error
+                with self.condition:
+                    # Newer states of the same games replace the failed ones
+                    self.pending = {**batch, **self.pending}
+                    self.failed = number
+                    if self.closed:
+                        self.writing = False
+                        self.condition.notify_all()
+                        return
+            self.last_write = time.monotonic()
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+def read_legacy_save(path: pathlib.Path, world: World = default_world) -> dict:
+    """Read a save file of older versions of the game (active-game.csv) without evaluating its content as Python
+
+    Args:
+        path (pathlib.Path): path of the CSV file
+        world (World, optional): world of the saved game. Defaults to default_world.
+
+    Raises:
+        ValueError: if the save refers to rooms, items or enemies, which do not exist
+
+    Returns:
+        dict: fields of the saved game or None, if the file is empty
+    """
+    with open(path, "r") as gamefile:
+        headers = ["player_name", "player_state", "player_returns",
+                   "player_items", "player_dead_enemies"]
+        rows = list(csv.DictReader(gamefile, fieldnames=headers))
+    if not rows or not rows[0]["player_name"]:
+        return None
+    player_info = rows[0]
+    # Items were saved as list of dicts and enemies as list of strings - only the names are needed
+    item_names = re.findall(r"'name': '([^']*)'", player_info["player_items"] or "")
+    enemy_names = re.findall(r"'([^']*)'", player_info["player_dead_enemies"] or "")
+    try:
+        return {"name": player_info["player_name"],
+                "room": world.room_id(player_info["player_state"] or ""),
+                "returns": player_info["player_returns"] == "True",
+                "items": [world.item_ids[name] for name in item_names],
+                "enemies": [world.enemy_ids[name] for name in enemy_names]}
+    except KeyError as error:
+        raise ValueError(f"Unknown item or enemy {error}")
+
+def _fields(state: GameState) -> dict:
+    return {"name": state.player_name, "room": state.room, "returns": state.player_returns,
+            "items": list(state.player_items), "enemies": list(state.player_dead_enemies)}
+
+def _state(fields: dict, world: World) -> GameState:
+    state = GameState(fields["name"], world=world)
+    state.room = fields["room"]
+    state.player_returns = fields["returns"]
+    state.player_items = Inventory(world, fields["items"])
+    state.player_dead_enemies = list(fields["enemies"])
+    return state
+
+def _changes(saved: dict, current: dict) -> list:
+    # Journal records, which turn the saved fields into the current ones - None, if a snapshot has to be written
+    if saved["name"] != current["name"] or current["enemies"][:len(saved["enemies"])] != saved["enemies"]:
+        return None
+    records = []
+    if (current["room"], current["returns"]) != (saved["room"], saved["returns"]):
+        records.append((op_room, current["room"], int(current["returns"])))
+    if current["items"][:len(saved["items"])] != saved["items"]:
+        records.append((op_clear,))
+        records += [(op_item, id) for id in current["items"]]
+    else:
+        records += [(op_item, id) for id in current["items"][len(saved["items"]):]]
+    records += [(op_enemy, id) for id in current["enemies"][len(saved["enemies"]):]]
+    return records
+
+def _apply(fields: dict, record: list):
+    if record[0] == op_room:
+        fields["room"] = record[1]
+        fields["returns"] = record[2] == 1
+    elif record[0] == op_item:
+        fields["items"].append(record[1])
+    elif record[0] == op_clear:
+        fields["items"] = []
+    elif record[0] == op_enemy:
+        fields["enemies"].append(record[1])
@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import pathlib
+import re
+import time
+from gameengine import GameState, RestartGame, find_route, start_game, step
+from gamesave import Autosaver, SaveJournal, open_store, save_directory
+from gametelemetry import Telemetry
+from gametext import help_text, horizontal_line, render_event, render_greeting, render_invalid_option, render_items, render_map, render_no_route, title
+from gameworld import World, default_world
+
+########################################################################
+# Game Server
+########################################################################
+# Serves the game over TCP, so players can connect with telnet or netcat. All connections are handled by one
+# asyncio event loop: every connection gets its own GameSession, but all sessions share the compiled world.
+# A session, which waits for the next command, is only a suspended coroutine with a small read buffer - so
+# thousands of idle players cost a few megabytes and no CPU time.
+# Every player can keep several saves (slots) - the slots of all players are kept in one shared save store in
+# the save directory of the server.
+#
+# Usage:
+##   python gameserver.py [--host 127.0.0.1] [--port 4000] [--idle-timeout 600]
+##   telnet 127.0.0.1 4000
+
+server_save_directory = save_directory.joinpath("server")
+# Longest line a client may send - the read buffer of a connection never grows beyond it
+max_line_length = 1024
+
+class SessionClosed(Exception):
+    """The player left the game or the connection was lost"""
+
+class GameServer:
+    """Shared data of all sessions
+
+    Args:
+        world (World, optional): compiled world, which is shared by all sessions. Defaults to default_world.
+        directory (pathlib.Path, optional): directory of the saves of the players. Defaults to server_save_directory.
+        idle_timeout (float, optional): seconds, after which an idle connection is closed - 0 to never close it. Defaults to 600.
+        telemetry (Telemetry, optional): telemetry of the server, every session records into a telemetry of its own
+            (see Telemetry.session()). Defaults to None.
+        store (str, optional): location of the save slots ('sqlite:FILE' or a directory, see open_store). Defaults to
+            the directory 'slots' in the save directory.
+        autosave_interval (float, optional): minimum seconds between two writes of the autosave. Defaults to 1.0.
+    """
+
+    def __init__(self, world: World = default_world, directory=server_save_directory, idle_timeout: float = 600,
+                 telemetry: Telemetry = None, store: str = None, autosave_interval: float = 1.0):
+        self.world = world
+        self.directory = directory
+        self.idle_timeout = idle_timeout
+        self.telemetry = telemetry
+        self.store = open_store(store or str(pathlib.Path(directory).joinpath("slots")), world)
+        # The changes of all sessions are written together by one background thread
+        self.autosaver = Autosaver(self.store, autosave_interval)
+        # Names of the players, which are currently connected (every save may only be used by one session)
+        self.players = set()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Callback for asyncio.start_server, runs one session per connection"""
+        await GameSession(self, reader, writer).run()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 4000):
+        """Accept connections until the server is stopped
+
+        Args:
+            host (str, optional): address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): port to listen on. Defaults to 4000.
+        """
+        server = await asyncio.start_server(self.handle, host, port, limit=max_line_length, backlog=1024)
+        addresses = ", ".join(str(socket.getsockname()) for socket in server.sockets)
+        print(f"Serving the game on {addresses}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.autosaver.close()
+            self.store.close()
+            if self.telemetry is not None:
+                self.record_saves()
+                self.telemetry.close()
+
+    def record_saves(self):
+        """Add the saves, which the autosave thread has finished, to the telemetry. The autosave writes the games of
+        all sessions together, so its writes are counted by the telemetry of the server and not by a session."""
+        while self.autosaver.writes:
+            self.telemetry.save(*self.autosaver.writes.popleft())
+
+class GameSession:
+    """State of one connected player
+
+    Args:
+        server (GameServer): server, which accepted the connection
+        reader (asyncio.StreamReader): incoming data of the connection
+        writer (asyncio.StreamWriter): outgoing data of the connection
+    """
+    __slots__ = ("server", "reader", "writer", "player_name", "slot", "journal", "game", "input_seconds", "telemetry")
+
+    def __init__(self, server: GameServer, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.player_name = None
+        self.slot = None
+        self.journal = None
+        self.game = None
+        # Total time spent waiting for the player (for the telemetry)
+        self.input_seconds = 0.0
+        # Turns and fights of this session (merged into the telemetry of the server)
+        self.telemetry = server.telemetry.session() if server.telemetry is not None else None
+
+    async def run(self):
+        """Play with the player until he leaves"""
+        try:
+            self.write(title + help_text)
+            await self.login()
+            while True:
+                try:
+                    await self.play()
+                except RestartGame:
+                    continue
+        except (SessionClosed, ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            await self.close()
+
+    async def login(self):
+        """Ask for the name of the player and reserve his saves"""
+        while True:
+            player_name = await self.ask("Tell me your name", ["any"])
+            if player_name not in self.server.players:
+                break
+            self.write(f"\nSorry, {player_name} is already playing at the moment. Please choose another name.\n")
+        self.player_name = player_name
+        self.server.players.add(player_name)
+        # Save of older versions of the server, which is imported into the slots of the player. Names were used as
+        # file names, so anything but letters, numbers, '-' and '_' is replaced.
+        save_name = re.sub(r"[^A-Za-z0-9_-]", "_", player_name)[:64] or "_"
+        self.journal = SaveJournal(self.server.directory, save_name)
+
+    async def play(self):
+        """Open the game of the player and play until he dies"""
+        self.game = await self.open_game()
+        self.write(render_greeting(self.game.player_name))
+        self.show_events(start_game(self.game))
+        telemetry = self.telemetry
+        while not self.game.is_over():
+            turn_start = time.perf_counter()
+            input_before = self.input_seconds
+            from_room = self.game.room
+            command = await self.ask(self.game.pending["message"], set(self.game.options()))
+            self.game, events = step(self.game, command)
+            self.server.autosaver.turn(self.player_name, self.slot, self.game, from_room, events)
+            self.show_events(events)
+            if telemetry is not None:
+                self.server.record_saves()
+                telemetry.events(events)
+                input_seconds = self.input_seconds - input_before
+                telemetry.turn(from_room, self.game.room, input_seconds, time.perf_counter() - turn_start - input_seconds)
+        chosen_action = await self.ask("Would you like to play again? \nType in 'restart' to restart, 'no' to end the game", {"no"})
+        if chosen_action == "no":
+            raise SessionClosed()
+
+    async def open_game(self) -> GameState:
+        """Open a saved game of the player or start a new one
+
+        Returns:
+            GameState: All neccessary Information for gameplay
+        """
+        # Saves are synced to disk, so the files are accessed in a worker thread and never block the other sessions
+        store = self.server.store
+        # Changes of the previous game are written, before the slots are read
+        if not await asyncio.to_thread(self.server.autosaver.flush):
+            self.write(f"\nSorry, your last changes couldn´t be saved ({self.server.autosaver.error}) - the server tries again later.\n")
+        slots = await asyncio.to_thread(store.slots, self.player_name)
+        # The save of an older version of the server becomes a slot of the player - once, its files are renamed afterwards
+        if not slots and self.journal.exists():
+            state = await asyncio.to_thread(self.journal.load, self.server.world)
+            if state is not None and state.player_name == self.player_name:
+                await asyncio.to_thread(store.save, self.player_name, "active-game", state)
+                await asyncio.to_thread(self.journal.archive)
+                slots = ["active-game"]
+        while slots:
+            self.write(f"\nYour saved games: {', '.join(slots)}\n")
+            choice = await self.ask("Type in the name of a saved game to open it, 'delete' to delete one or 'new' to start a new game",
+                                    {"new", "delete", *slots})
+            if choice == "new":
+                break
+            if choice == "delete":
+                slot = await self.ask("Which game do you want to delete", set(slots))
+                await asyncio.to_thread(store.delete, self.player_name, slot)
+                slots = await asyncio.to_thread(store.slots, self.player_name)
+                continue
+            state = await asyncio.to_thread(store.load, self.player_name, choice, self.server.world)
+            # Workaround to handle corrupt file
+            if state is not None:
+                self.slot = choice
+                return state
+            self.write(f"\nSorry, the game '{choice}' can´t be opened.\n")
+            slots.remove(choice)
+        self.slot = await self.ask("Give your new game a name (a saved game of the same name is replaced)", ["any"])
+        # After a restart the state object of the previous game is reused
+        if self.game is None:
+            state = GameState(self.player_name, world=self.server.world)
+        else:
+            state = self.game
+            state.reset(self.player_name)
+        await asyncio.to_thread(store.save, self.player_name, self.slot, state)
+        return state
+
+    async def ask(self, message: str, valid_options: set) -> str:
+        """Ask the player for input and validate his input based on the provided options. If not valid, ask again.
+
+        Args:
+            message (str): Message, which prompts the player to input a value
+            valid_options (set): Valid options, which the player may return as input
+
+        Returns:
+            str: input of the player, which has been validated
+        """
+        while True:
+            self.write("\n" + message + ": ")
+            user_input = await self.read_line()
+            command = user_input.lower()
+            # Check if the input is a predefined keyword which gives player certain options
+            if command == "exit":
+                self.write(f"{horizontal_line}\n\nDo you want to save your current state of the game ?\n")
+                if await self.ask("Type in 'yes' to save your game or 'no' to just leave", {"yes", "no"}) == "yes":
+                    self.save_game()
+                raise SessionClosed()
+            elif command == "save":
+                self.write(f"{horizontal_line}\n")
+                self.save_game()
+                self.write(f"{horizontal_line}\n")
+            elif command == "items":
+                self.write(render_items(self.game))
+            elif command == "map":
+                self.write(render_map(self.game))
+            elif command == "help":
+                self.write(help_text)
+            elif user_input.startswith("goto ") and self.game is not None and valid_options == set(self.game.options()):
+                try:
+                    find_route(self.game, user_input[5:])
+                except ValueError as error:
+                    self.write(render_no_route(str(error)))
+                    continue
+                self.write(f"{horizontal_line}\n")
+                return user_input
+            elif command == "restart":
+                self.write(f"{horizontal_line}\n")
+                if await self.ask("Are you sure? Type in 'yes' or 'no'", {"yes", "no"}) == "yes":
+                    raise RestartGame()
+            # User may provide anything (eg. his name)
+            elif "any" in valid_options:
+                self.write(f"{horizontal_line}\n")
+                return user_input
+            elif user_input not in valid_options:
+                self.write(render_invalid_option(valid_options))
+            else:
+                self.write(f"{horizontal_line}\n")
+                return user_input
+
+    def save_game(self):
+        """Save the game of the player - the autosave thread writes it right away, the session doesn´t wait for it.
+        A game, which is over, isn´t saved (opening it would only kill the player again)."""
+        if self.game is None or self.game.is_over():
+            self.write("\nSorry, but there is nothing to save.\n")
+        else:
+            self.server.autosaver.changed(self.player_name, self.slot, self.game, immediately=True)
+            self.write("\nYour progress has been saved.\n")
+
+    def show_events(self, events: list):
+        """Send the events, which the game engine returned, to the player
+
+        Args:
+            events (list): events of the game engine
+        """
+        self.write("".join(render_event(event, self.game) for event in events))
+
+    def write(self, text: str):
+        """Queue text for the player - telnet expects CRLF line endings"""
+        self.writer.write(text.replace("\n", "\r\n").encode())
+
+    async def read_line(self) -> str:
+        """Send the queued text and wait for the next line of the player
+
+        Returns:
+            str: line without line ending and telnet control characters
+        """
+        await self.writer.drain()
+        timeout = self.server.idle_timeout or None
+        start = time.perf_counter()
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout)
+        except (asyncio.LimitOverrunError, ValueError):
+            self.write("\nSorry, this line is too long.\n")
+            raise SessionClosed()
+        self.input_seconds += time.perf_counter() - start
+        if not line:
+            raise SessionClosed()
+        return "".join(char for char in line.decode(errors="ignore") if char.isprintable()).strip()
+
+    async def close(self):
+        """Close the connection"""
+        self.server.players.discard(self.player_name)
+        if self.telemetry is not None:
+            self.telemetry.close()
+        try:
+            self.write("\nThanks for playing with us!\n")
+            await self.writer.drain()
+            self.writer.close()
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the game over TCP (connect with telnet or netcat)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=4000, help="port to listen on")
+    parser.add_argument("--save-dir", default=server_save_directory, help="directory of the saves of the players")
+    parser.add_argument("--store", metavar="LOCATION", help="store the saves in a SQLite database ('sqlite:FILE', see gamedb.py) or another directory")
+    parser.add_argument("--autosave-interval", type=float, default=1.0, metavar="SECONDS", help="write the changes of all games at most once in this interval")
+    parser.add_argument("--idle-timeout", type=float, default=600, help="seconds, after which idle players are disconnected (0: never)")
+    parser.add_argument("--telemetry", metavar="DIRECTORY", help="write per-turn telemetry and metrics into this directory (see gametelemetry.py)")
+    arguments = parser.parse_args()
+    telemetry = Telemetry(arguments.telemetry) if arguments.telemetry is not None else None
+    game_server = GameServer(directory=arguments.save_dir, idle_timeout=arguments.idle_timeout, telemetry=telemetry,
+                             store=arguments.store, autosave_interval=arguments.autosave_interval)
+    try:
+        asyncio.run(game_server.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,287 @@
+import argparse
+import heapq
+import math
+import sys
+import time
+from gameworld import World, default_world, fight_score, wins_fight
+
+########################################################################
+# State-Space Solver
+########################################################################
+# Explores every state of the world, which a player can reach: (room, collected items, defeated enemies).
+# Items and defeated enemies are stored as bitsets, so a state is a tuple of three integers.
+# Entering a room is expanded into all possible outcomes - every decision of the player (fight or hide, take or
+# leave) and every outcome of a fight with its probability. The outcomes of a room only depend on the room and the
+# bitsets, so they are calculated once and kept in a transposition table.
+# The solver reports:
+## - the shortest winning route (fewest commands, assuming the player has luck in every fight)
+## - the most probable winning route (highest product of the probabilities of all fights on the route)
+## - states, from which the game can´t be won anymore, and the causes of death
+#
+# Usage (exits with status 1, if the game can´t be won - so it can be used as regression gate):
+##   python gamesolver.py [--show 10]
+
+win_node = 0
+
+class Solver:
+    """Solver for a compiled world
+
+    Args:
+        world (World, optional): compiled world. Defaults to default_world.
+    """
+
+    def __init__(self, world: World = default_world):
+        self.world = world
+        self.winning_mask = 0
+        for id in world.winning_enemies:
+            self.winning_mask |= 1 << id
+        # Transposition tables
+        self.room_outcomes = {}
+        self.fight_odds = {}
+        # Explored graph: index of a node -> state, edges of a node: (target node, commands, probability)
+        self.nodes = [("win",)]
+        self.node_ids = {("win",): win_node}
+        self.edges = [[]]
+        self.deaths = {}
+
+    def outcomes(self, room_id: int, returns: bool, items: int, dead: int) -> list:
+        """All outcomes of entering a room
+
+        Args:
+            room_id (int): id of the room
+            returns (bool): whether the player returns to the room
+            items (int): bitset of the items of the player
+            dead (int): bitset of the defeated enemies
+
+        Returns:
+            list: tuples (commands, probability, result) - result is ('state', room, items, dead), ('win',) or ('dead', cause)
+        """
+        key = (room_id, returns, items, dead)
+        if key not in self.room_outcomes:
+            room = self.world.rooms[room_id]
+            results = []
+            self._play(room_id, room.return_actions if returns else room.enter_actions, 0, items, dead, (), 1.0, results)
+            self.room_outcomes[key] = results
+        return self.room_outcomes[key]
+
+    def solve(self) -> dict:
+        """Explore all reachable states and find the winning routes
+
+        Returns:
+            dict: 'states', 'winnable', 'unwinnable' (list of states), 'deaths' (cause -> number of ways to die),
+            'shortest' and 'most_probable' (dicts with 'commands' and 'probability', None if the game can´t be won)
+        """
+        start = time.perf_counter()
+        start_node = self._node(("start",))
+        self._add_edges(start_node, (), self.outcomes(self.world.start, False, 0, 0))
+        # Breadth-first exploration of all reachable states
+        index = start_node
+        while index < len(self.nodes):
+            node = self.nodes[index]
+            if node[0] == "state":
+                room_id, items, dead = node[1:]
+                for command, (target, returns) in self.world.rooms[room_id].transitions.items():
+                    self._add_edges(index, (command,), self.outcomes(target, returns, items, dead))
+            index += 1
+        winnable = self._winnable()
+        states = [node for node in self.nodes if node[0] == "state"]
+        return {"states": len(states),
+                "winnable": sum(1 for id, node in enumerate(self.nodes) if node[0] == "state" and winnable[id]),
+                "unwinnable": [node[1:] for id, node in enumerate(self.nodes) if node[0] == "state" and not winnable[id]],
+                "deaths": dict(self.deaths),
+                "shortest": self._route(start_node, lambda commands, probability: len(commands)),
+                "most_probable": self._route(start_node, lambda commands, probability: -math.log(probability)),
+                "seconds": time.perf_counter() - start}
+
+    def describe(self, state: tuple) -> str:
+        """Readable description of a state
+
+        Args:
+            state (tuple): (room id, items bitset, defeated enemies bitset)
+
+        Returns:
+            str: description with room key, items and defeated enemies
+        """
+        room_id, items, dead = state
+        item_names = [item["name"] for item in self.world.items if items >> item["id"] & 1]
+        enemy_names = [enemy["name"] for enemy in self.world.enemies if dead >> enemy["id"] & 1]
+        return f"room '{self.world.rooms[room_id].key}', items: {', '.join(item_names) or '-'}, defeated: {', '.join(enemy_names) or '-'}"
+
+    def _node(self, node: tuple) -> int:
+        if node not in self.node_ids:
+            self.node_ids[node] = len(self.nodes)
+            self.nodes.append(node)
+            self.edges.append([])
+        return self.node_ids[node]
+
+    def _add_edges(self, index: int, prefix: tuple, outcomes: list):
+        for commands, probability, result in outcomes:
+            if result[0] == "dead":
+                self.deaths[result[1]] = self.deaths.get(result[1], 0) + 1
+                continue
+            self.edges[index].append((self._node(result), prefix + commands, probability))
+
+    def _winnable(self) -> list:
+        # Reverse reachability from the win node
+        reverse_edges = [[] for _ in self.nodes]
+        for source, edges in enumerate(self.edges):
+            for target, _, _ in edges:
+                reverse_edges[target].append(source)
+        winnable = [False] * len(self.nodes)
+        winnable[win_node] = True
+        stack = [win_node]
+        while stack:
+            for source in reverse_edges[stack.pop()]:
+                if not winnable[source]:
+                    winnable[source] = True
+                    stack.append(source)
+        return winnable
+
+    def _route(self, start_node: int, cost) -> dict:
+        # Dijkstra from the start node to the win node, cost(commands, probability) is the weight of an edge
+        distances = {start_node: 0}
+        previous = {}
+        queue = [(0, start_node)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if node == win_node:
+                break
+            if distance > distances[node]:
+                continue
+            for target, commands, probability in self.edges[node]:
+                new_distance = distance + cost(commands, probability)
+                if new_distance < distances.get(target, math.inf):
+                    distances[target] = new_distance
+                    previous[target] = (node, commands, probability)
+                    heapq.heappush(queue, (new_distance, target))
+        if win_node not in previous:
+            return None
+        route = []
+        route_probability = 1.0
+        node = win_node
+        while node != start_node:
+            node, commands, probability = previous[node]
+            route[0:0] = commands
+            route_probability *= probability
+        return {"commands": route, "probability": route_probability}
+
+    def _play(self, room_id: int, actions: tuple, index: int, items: int, dead: int,
+              commands: tuple, probability: float, results: list):
+        """Process the actions of a room from index on and add every possible outcome to results"""
+        while index < len(actions):
+            action = actions[index]
+            kind = action["kind"]
+            index += 1
+            if kind == "requires":
+                if not items >> action["item"] & 1:
+                    actions, index = action["else"], 0
+            elif kind == "death":
+                results.append((commands, probability, ("dead", action["cause"])))
+                return
+            elif kind == "fight":
+                enemy = action["enemy"]
+                if dead >> enemy["id"] & 1:
+                    continue
+                self._fight(room_id, actions, index, items, dead, commands, probability, results, enemy)
+                return
+            elif kind == "loot":
+                if any(not dead >> enemy["id"] & 1 for enemy in action["enemies"]):
+                    continue
+                available = [item for item in action["items"] if not items >> item["id"] & 1]
+                self._loot(room_id, actions, index, available, items, dead, commands, probability, results)
+                return
+            elif kind == "prompt":
+                results.append((commands, probability, ("state", room_id, items, dead)))
+                return
+
+    def _fight(self, room_id: int, actions: tuple, index: int, items: int, dead: int,
+               commands: tuple, probability: float, results: list, enemy: dict):
+        # Hide
+        if enemy["canHide"]:
+            self._play(room_id, actions, index, items, dead, commands + ("hide",), probability, results)
+        else:
+            self._loss(room_id, actions, index, items, dead, commands + ("hide",), probability, results, enemy)
+        # Fight
+        if not all(items >> id & 1 for id in enemy["defeat_item_ids"]):
+            self._loss(room_id, actions, index, items, dead, commands + ("fight",), probability, results, enemy)
+            return
+        condition = enemy["condition"]
+        if condition["kind"] == "dice" or condition["multiplier"] == "dice":
+            commands += ("fight", "dice")
+        else:
+            commands += ("fight",)
+        odds = self._odds(enemy, items)
+        if odds > 0:
+            dead_enemies = dead | 1 << enemy["id"]
+            if dead_enemies & self.winning_mask == self.winning_mask:
+                results.append((commands, probability * odds, ("win",)))
+            else:
+                self._play(room_id, actions, index, items, dead_enemies, commands, probability * odds, results)
+        if odds < 1:
+            self._loss(room_id, actions, index, items, dead, commands, probability * (1 - odds), results, enemy)
+
+    def _loss(self, room_id: int, actions: tuple, index: int, items: int, dead: int,
+              commands: tuple, probability: float, results: list, enemy: dict):
+        if enemy["loss_consequence"] == "death":
+            results.append((commands, probability, ("dead", enemy["name"])))
+            return
+        if enemy["loss_consequence"] == "loose_items":
+            items = 0
+        self._play(room_id, actions, index, items, dead, commands, probability, results)
+
+    def _loot(self, room_id: int, actions: tuple, index: int, available: list, items: int, dead: int,
+              commands: tuple, probability: float, results: list):
+        if not available:
+            self._play(room_id, actions, index, items, dead, commands, probability, results)
+            return
+        item = available[0]
+        self._loot(room_id, actions, index, available[1:], items, dead, commands + ("leave",), probability, results)
+        if item["type"] == "death_item":
+            results.append((commands + ("take",), probability, ("dead", item["name"])))
+        else:
+            self._loot(room_id, actions, index, available[1:], items | 1 << item["id"], dead,
+                       commands + ("take",), probability, results)
+
+    def _odds(self, enemy: dict, items: int) -> float:
+        key = (enemy["id"], items)
+        if key not in self.fight_odds:
+            condition = enemy["condition"]
+            if condition["kind"] == "random":
+                odds = 0.5
+            else:
+                item_ids = [item["id"] for item in self.world.items if items >> item["id"] & 1]
+                score = fight_score(self.world, enemy, item_ids)
+                odds = sum(wins_fight(condition, score, face) for face in range(1, 7)) / 6
+            self.fight_odds[key] = odds
+        return self.fight_odds[key]
+
+def print_report(solver: Solver, report: dict, show: int = 10):
+    """Display the result of the solver
+
+    Args:
+        solver (Solver): solver, which created the report
+        report (dict): result of Solver.solve()
+        show (int, optional): number of unwinnable states to display. Defaults to 10.
+    """
+    print(f"Explored {report['states']} states in {report['seconds'] * 1000:.1f} ms, "
+          f"{report['winnable']} of them can still be won.")
+    for title, route in (("Shortest winning route", report["shortest"]), ("Most probable winning route", report["most_probable"])):
+        if route is None:
+            print(f"\n{title}: the game can´t be won")
+        else:
+            print(f"\n{title} ({len(route['commands'])} commands, probability {route['probability']:.2%}):")
+            print("  " + ", ".join(route["commands"]))
+    print("\nWays to die: " + (", ".join(f"{cause} ({count})" for cause, count in report["deaths"].items()) or "-"))
+    print(f"\nStates, from which the game can´t be won anymore: {len(report['unwinnable'])}")
+    for state in report["unwinnable"][:show]:
+        print("  " + solver.describe(state))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find winning routes and unwinnable states of the game")
+    parser.add_argument("--show", type=int, default=10, help="number of unwinnable states to display")
+    arguments = parser.parse_args()
+    solver = Solver()
+    report = solver.solve()
+    print_report(solver, report, arguments.show)
+    if report["shortest"] is None:
+        sys.exit(1)
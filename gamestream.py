@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import random
+import sys
+from gameengine import GameState, start_game, step
+from gameworld import World, default_world
+
+########################################################################
+# Stream Mode
+########################################################################
+# Plays the game without prompts, animations or prose for bots and test harnesses: commands are read line by
+# line from stdin or a file, the answer to every command is one JSON object per line (JSON Lines):
+##   {"turn": 1, "command": "left door", "room": "_leftroom", "returns": false, "items": [], "defeated": [],
+##    "items_gained": [], "items_lost": [], "fight": null, "won": false, "death": null,
+##    "decision": "options", "message": "...", "options": ["return", "inspect"]}
+# Turn 0 is the start of the game. An invalid command is answered with {"turn": ..., "command": ..., "error": ...,
+# "options": [...]} and doesn´t change the game. 'restart' starts a new game, 'exit' ends the stream.
+#
+# Input is read in large chunks and all complete lines of a chunk are answered with a single write - so a bot,
+# which waits for every answer, gets it right away, and a pipe full of commands is processed in batches.
+#
+# Usage:
+##   python gamestream.py commands.txt [--seed 42] [--name Bot]
+##   bot | python gamestream.py | bot
+
+# Bytes read from the input at once
+chunk_size = 1 << 16
+
+def turn_event(turn: int, command: str, state: GameState, events: list) -> dict:
+    """Summary of one turn
+
+    Args:
+        turn (int): number of the turn (0 for the start of the game)
+        command (str): command of the turn (None for the start of the game)
+        state (GameState): state after the turn
+        events (list): events of the game engine during the turn
+
+    Returns:
+        dict: the new state, the changes of the turn and the next decision (see above)
+    """
+    gained = []
+    lost = []
+    fight = None
+    won = False
+    death = None
+    for event in events:
+        kind = event["type"]
+        if kind == "item_taken":
+            gained.append(event["item"])
+        elif kind == "items_lost":
+            lost += event["items"]
+        elif kind == "fight_result":
+            fight = {"enemy": event["enemy"], "outcome": event["outcome"]}
+        elif kind == "win":
+            won = True
+        elif kind == "death":
+            death = event["cause"]
+    pending = state.pending
+    enemies = state.world.enemies
+    return {"turn": turn, "command": command, "room": state.player_state, "returns": state.player_returns,
+            "items": state.player_items.item_names(), "defeated": [enemies[id]["name"] for id in state.player_dead_enemies],
+            "items_gained": gained, "items_lost": lost, "fight": fight, "won": won, "death": death,
+            "decision": pending["kind"] if pending is not None else None,
+            "message": pending["message"] if pending is not None else "",
+            "options": pending["options"] if pending is not None else ()}
+
+def play_stream(input_fd: int, output_fd: int, state: GameState):
+    """Play the commands of a stream until it ends or the command 'exit' arrives
+
+    Args:
+        input_fd (int): file descriptor of the commands (one per line)
+        output_fd (int): file descriptor, to which the JSON Lines are written
+        state (GameState): state of the game, which is started
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, check_circular=False, separators=(",", ":")).encode
+    turn = 0
+    output = [encode(turn_event(turn, None, state, start_game(state)))]
+    rest = b""
+    while True:
+        _write(output_fd, output)
+        output = []
+        chunk = os.read(input_fd, chunk_size)
+        if not chunk:
+            # The last command may have no line ending
+            lines = [rest] if rest.strip() else []
+        else:
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+        for line in lines:
+            command = line.decode("utf-8", errors="replace").strip()
+            if not command:
+                continue
+            turn += 1
+            if command == "exit":
+                _write(output_fd, output)
+                return
+            if command == "restart":
+                state.reset()
+                output.append(encode(turn_event(turn, command, state, start_game(state))))
+                continue
+            try:
+                state, events = step(state, command)
+            except ValueError as error:
+                output.append(encode({"turn": turn, "command": command, "error": str(error), "options": state.options()}))
+                continue
+            output.append(encode(turn_event(turn, command, state, events)))
+        if not chunk:
+            _write(output_fd, output)
+            return
+
+def _write(output_fd: int, lines: list):
+    if not lines:
+        return
+    data = memoryview(("\n".join(lines) + "\n").encode("utf-8"))
+    while data:
+        data = data[os.write(output_fd, data):]
+
+def main(argv: list = None, world: World = default_world):
+    """Play a stream of commands
+
+    Args:
+        argv (list, optional): command line arguments. Defaults to sys.argv[1:].
+        world (World, optional): compiled world. Defaults to default_world.
+    """
+    parser = argparse.ArgumentParser(description="Play the game with commands from a stream and write every turn as JSON Lines")
+    parser.add_argument("commands", nargs="?", default="-", help="file with one command per line ('-' for stdin)")
+    parser.add_argument("--seed", type=int, help="seed of the random number generator of the fights")
+    parser.add_argument("--name", default="Player", help="name of the player")
+    arguments = parser.parse_args(argv)
+    state = GameState(arguments.name, world=world, rng=random.Random(arguments.seed))
+    sys.stdout.flush()
+    if arguments.commands == "-":
+        play_stream(sys.stdin.fileno(), sys.stdout.fileno(), state)
+    else:
+        input_fd = os.open(arguments.commands, os.O_RDONLY)
+        try:
+            play_stream(input_fd, sys.stdout.fileno(), state)
+        finally:
+            os.close(input_fd)
+
+if __name__ == "__main__":
+    main()
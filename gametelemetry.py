@@ -0,0 +1,256 @@
+import bisect
+import json
+import os
+import pathlib
+import time
+from gameworld import World, default_world
+
+########################################################################
+# Telemetry
+########################################################################
+# Records every turn of the game: the transition from one room to the next, the time spent waiting for the
+# player, in the game logic and in animations, saves (duration and bytes) and the outcome of fights.
+# Recording a turn only updates counters and histograms and appends a tuple of numbers to a buffer - the
+# JSON Lines and Prometheus texts are created, when the buffer is written (every few turns and at the end).
+#
+# Files in the telemetry directory:
+## - turns.jsonl: one JSON object per turn
+## - metrics.prom: all counters and histograms in the Prometheus text format (eg. for the textfile collector
+##   of the node exporter), replaced atomically on every flush
+#
+# Usage:
+##   python commandlinegame.py --telemetry telemetry/
+##   python gameserver.py --telemetry telemetry/
+
+# Upper bounds of the histogram buckets
+seconds_buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+bytes_buckets = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+class Histogram:
+    """Histogram with fixed buckets
+
+    Args:
+        buckets (tuple): sorted upper bounds of the buckets
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Add a value to the histogram"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        """Add the values of another histogram with the same buckets"""
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def prometheus(self, name: str, help: str) -> list:
+        """Lines of the histogram in the Prometheus text format"""
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{name}_sum {self.sum}", f"{name}_count {self.count}"]
+        return lines
+
+class Telemetry:
+    """Counters, histograms and turn records of one game or of all sessions of a server. Every session of a server
+    records into its own telemetry (see session()), so the saves and fights since the last turn of a session are
+    added to its next turn and not to the turn of another session. The telemetry of the server merges them, when
+    it writes its files.
+
+    Args:
+        directory (pathlib.Path): directory of turns.jsonl and metrics.prom (None for the telemetry of a session)
+        world (World, optional): world of the game (to name the rooms). Defaults to default_world.
+        flush_every (int, optional): number of turns, after which the files are written. Defaults to 100.
+        flush_interval (float, optional): seconds, after which the files are written. Defaults to 10.0.
+    """
+
+    def __init__(self, directory: pathlib.Path, world: World = default_world, flush_every: int = 100, flush_interval: float = 10.0):
+        self.directory = pathlib.Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.world = world
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        # Turns, which have not been written yet: (time, from room, to room, input, logic, animation, save seconds, save bytes, fights)
+        self.turns = []
+        self.turn_count = 0
+        # (from room id, to room id) -> number of turns
+        self.transitions = {}
+        # (enemy name, outcome) -> number of fights
+        self.fight_outcomes = {}
+        self.input_seconds = Histogram(seconds_buckets)
+        self.logic_seconds = Histogram(seconds_buckets)
+        self.animation_seconds = Histogram(seconds_buckets)
+        self.save_seconds = Histogram(seconds_buckets)
+        self.save_bytes = Histogram(bytes_buckets)
+        # Saves and fights since the last turn, they are added to the next turn record
+        self.pending_save_seconds = 0.0
+        self.pending_save_bytes = 0
+        self.pending_fights = ()
+        # Telemetry of the server, into which this telemetry of a session is merged - and the open sessions of a server
+        self.parent = None
+        self.sessions = set()
+        # Turns of this telemetry and its sessions since the last flush
+        self.unwritten = 0
+
+    def session(self) -> "Telemetry":
+        """Telemetry of one session of a server
+
+        Returns:
+            Telemetry: telemetry, into which the session records its turns - it is merged into this telemetry when
+                the files are written and when it is closed at the end of the session
+        """
+        session = Telemetry(None, self.world, self.flush_every, self.flush_interval)
+        session.parent = self
+        self.sessions.add(session)
+        return session
+
+    def turn(self, from_room: int, to_room: int, input_seconds: float, logic_seconds: float, animation_seconds: float = 0.0):
+        """Record a turn
+
+        Args:
+            from_room (int): id of the room before the turn
+            to_room (int): id of the room after the turn
+            input_seconds (float): time spent waiting for the player
+            logic_seconds (float): time spent in the game logic (and the rendering of the output)
+            animation_seconds (float, optional): time spent in animations. Defaults to 0.0.
+        """
+        self.turn_count += 1
+        key = (from_room, to_room)
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.input_seconds.observe(input_seconds)
+        self.logic_seconds.observe(logic_seconds)
+        self.animation_seconds.observe(animation_seconds)
+        self.turns.append((time.time(), from_room, to_room, input_seconds, logic_seconds, animation_seconds,
+                           self.pending_save_seconds, self.pending_save_bytes, self.pending_fights))
+        self.pending_save_seconds = 0.0
+        self.pending_save_bytes = 0
+        self.pending_fights = ()
+        # The turns of a session are written by the telemetry of the server
+        root = self.parent or self
+        root.unwritten += 1
+        if root.unwritten >= root.flush_every or time.monotonic() - root.last_flush >= root.flush_interval:
+            root.flush()
+
+    def save(self, seconds: float, written: int):
+        """Record a save
+
+        Args:
+            seconds (float): duration of the save
+            written (int): bytes written by the save
+        """
+        self.save_seconds.observe(seconds)
+        self.save_bytes.observe(written)
+        self.pending_save_seconds += seconds
+        self.pending_save_bytes += written
+
+    def events(self, events: list):
+        """Record the fights among the events of the game engine
+
+        Args:
+            events (list): events of the game engine
+        """
+        for event in events:
+            if event["type"] == "fight_result":
+                key = (event["enemy"], event["outcome"])
+                self.fight_outcomes[key] = self.fight_outcomes.get(key, 0) + 1
+                self.pending_fights += key
+
+    def merge(self, other: "Telemetry"):
+        """Add the counters and histograms of another telemetry (eg. of a session) to this one
+
+        Args:
+            other (Telemetry): telemetry of the same world
+        """
+        self.turn_count += other.turn_count
+        for key, count in other.transitions.items():
+            self.transitions[key] = self.transitions.get(key, 0) + count
+        for key, count in other.fight_outcomes.items():
+            self.fight_outcomes[key] = self.fight_outcomes.get(key, 0) + count
+        for histogram, other_histogram in zip(self._histograms(), other._histograms()):
+            histogram.merge(other_histogram)
+
+    def flush(self):
+        """Append the recorded turns (also of the sessions) to turns.jsonl and replace metrics.prom"""
+        if self.parent is not None:
+            self.parent.flush()
+            return
+        for session in self.sessions:
+            self.turns += session.turns
+            session.turns.clear()
+        # The turns of the sessions are written in the order, in which they were played
+        self.turns.sort(key=lambda turn: turn[0])
+        rooms = self.world.rooms
+        lines = []
+        for wall_time, from_room, to_room, input_seconds, logic_seconds, animation_seconds, save_seconds, save_bytes, fights in self.turns:
+            turn = {"time": round(wall_time, 3), "from": rooms[from_room].key, "to": rooms[to_room].key,
+                    "input_wait": input_seconds, "logic": logic_seconds, "animation": animation_seconds}
+            if save_bytes:
+                turn.update(save_seconds=save_seconds, save_bytes=save_bytes)
+            if fights:
+                turn["fights"] = [{"enemy": enemy, "outcome": outcome} for enemy, outcome in zip(fights[::2], fights[1::2])]
+            lines.append(json.dumps(turn) + "\n")
+        if lines:
+            with open(self.directory.joinpath("turns.jsonl"), "a", encoding="utf-8") as turns_file:
+                turns_file.writelines(lines)
+        self.turns.clear()
+        # Write into a temporary file first, so a collector never reads a half written file
+        metrics_path = self.directory.joinpath("metrics.prom")
+        temporary_path = metrics_path.with_suffix(".tmp")
+        temporary_path.write_text("\n".join(self.prometheus()) + "\n", encoding="utf-8")
+        os.replace(temporary_path, metrics_path)
+        self.last_flush = time.monotonic()
+        self.unwritten = 0
+
+    def close(self):
+        """Write everything, which has been recorded - a session is merged into the telemetry of the server"""
+        if self.parent is not None:
+            self.parent.sessions.discard(self)
+            self.parent.merge(self)
+            self.parent.turns += self.turns
+            self.turns.clear()
+            self.parent = None
+            return
+        self.flush()
+
+    def prometheus(self) -> list:
+        """Lines of all metrics (of this telemetry and its sessions) in the Prometheus text format"""
+        total = self
+        if self.sessions:
+            total = Telemetry(None, self.world)
+            for telemetry in (self, *self.sessions):
+                total.merge(telemetry)
+        rooms = self.world.rooms
+        lines = ["# HELP cli_rpg_turns_total Turns played", "# TYPE cli_rpg_turns_total counter",
+                 f"cli_rpg_turns_total {total.turn_count}",
+                 "# HELP cli_rpg_transitions_total Turns by room before and after the turn", "# TYPE cli_rpg_transitions_total counter"]
+        for (from_room, to_room), count in sorted(total.transitions.items()):
+            lines.append(f'cli_rpg_transitions_total{{from="{_label(rooms[from_room].key)}",to="{_label(rooms[to_room].key)}"}} {count}')
+        lines += ["# HELP cli_rpg_fights_total Fights by enemy and outcome", "# TYPE cli_rpg_fights_total counter"]
+        for (enemy, outcome), count in sorted(total.fight_outcomes.items()):
+            lines.append(f'cli_rpg_fights_total{{enemy="{_label(enemy)}",outcome="{outcome}"}} {count}')
+        lines += total.input_seconds.prometheus("cli_rpg_turn_input_wait_seconds", "Time spent waiting for the player per turn")
+        lines += total.logic_seconds.prometheus("cli_rpg_turn_logic_seconds", "Time spent in the game logic per turn")
+        lines += total.animation_seconds.prometheus("cli_rpg_turn_animation_seconds", "Time spent in animations per turn")
+        lines += total.save_seconds.prometheus("cli_rpg_save_duration_seconds", "Duration of saves")
+        lines += total.save_bytes.prometheus("cli_rpg_save_bytes", "Bytes written per save")
+        return lines
+
+    def _histograms(self) -> tuple:
+        return (self.input_seconds, self.logic_seconds, self.animation_seconds, self.save_seconds, self.save_bytes)
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,203 @@
+from gameengine import GameState
+from gamemap import draw_map
+
+########################################################################
+# Text Output of the Game
+########################################################################
+# All texts, which are displayed to the player, are created here. The functions only return strings, so the
+# terminal game and the game server can both use them - each one decides on its own how to send the text.
+
+horizontal_line = "__________________________________________"
+
+title = (f"\n{horizontal_line}\n"
+    "####         ###       ####   \n"
+    "#   #       #   #      #   #  \n"
+    "#    #     #     #     #    #   \n"
+    "#     #   #       #    #     #    \n"
+    "#     #   #       #    #     #    \n"
+    "#    #    # # # # #    #    #  \n"
+    "#   #     #       #    #   #   \n"
+    "####      #       #    ####   \n")
+
+help_text = (f"{horizontal_line}\n"
+    "\nWelcome to a new Dungeons and Dreagons game.\nLet´s discuss some rules at the beginning. At any time, you can type 'exit' to quit the game, 'save' to save your current progress, 'items' to see your current items, 'map' to see a map of the game, 'goto' and the name of a room (eg. 'goto _leftroom') to travel back to a room you have already visited or 'help' to view this message again.\n"
+    f"{horizontal_line}\n")
+
+def render_greeting(player_name: str) -> str:
+    """Message that greets the player and introduces him to the game world
+
+    Args:
+        player_name (str): name of the player
+
+    Returns:
+        str: greeting
+    """
+    return (f"\nHello, {player_name}! I am so happy, that you joined our game world. Let´s start a new Dungeons and Dreagons game.\n"
+            f"In order to play, you will have to talk to me and take some decisions. Are you ready? \nGreat! Lets Go…\n"
+            f"{horizontal_line}\n")
+
+def render_items(state: GameState) -> str:
+    """List the items, which the player currently has
+
+    Args:
+        state (GameState): current state of the game or None, if no game has been started
+
+    Returns:
+        str: list of the items
+    """
+    if state is None or len(state.player_items) == 0:
+        return f"{horizontal_line}\n\nYou currently have no items in your bag.\n{horizontal_line}\n"
+    return (f"{horizontal_line}\n\nThese are the current items in your bag: " +
+            ", ".join(state.player_items.item_names()) + f"\n{horizontal_line}\n")
+
+def render_map(state: GameState) -> str:
+    """Map of the rooms, which the player has visited, and where the player is (drawn by gamemap.py)
+
+    Args:
+        state (GameState): current state of the game or None, if no game has been started
+
+    Returns:
+        str: map of the game
+    """
+    game_map = draw_map(state) if state is not None else ""
+    if game_map == "":
+        return f"{horizontal_line}\n\nYou haven´t explored any room yet.\n{horizontal_line}\n"
+    return f"{horizontal_line}\n\n{game_map}\n{horizontal_line}\n"
+
+def render_invalid_option(valid_options) -> str:
+    """Message for a player, who typed something, which is not a valid option
+
+    Args:
+        valid_options (iterable): valid options
+
+    Returns:
+        str: message
+    """
+    options = " or ".join(f"'{option}'" for option in valid_options)
+    return f"{horizontal_line}\n\nI am sorry, but you have to type either {options}.\n{horizontal_line}\n"
+
+def render_no_route(reason: str) -> str:
+    """Message for a player, who can´t travel to the room he asked for
+
+    Args:
+        reason (str): why there is no route (see gameengine.find_route())
+
+    Returns:
+        str: message
+    """
+    return f"{horizontal_line}\n\n{reason}\n{horizontal_line}\n"
+
+def render_doors(player_name: str, door_names: list, can_return: bool = False) -> str:
+    """Display given doors to the user, before he decides which one he would like to go through
+
+    Args:
+        player_name (str): name of the player
+        door_names (list): Name of the doors, the user may choose (have to be unique)
+        can_return (bool, optional): User has not only the option to go through the doors but return to the previous state. Defaults to False.
+
+    Returns:
+        str: visualization of the doors
+    """
+    number_of_doors = len(door_names)
+    # Visualization of door options (flexible amount if doors)
+    vis_door_top = ""
+    vis_door_middle = ""
+    vis_door_bottom = ""
+    vis_door_name = ""
+    for door in door_names:
+        if len(door) > 5:
+            door_name = door[:6]
+        else:
+            door_name = door
+        vis_door_top += "  ___  "
+        vis_door_middle += " |   | "
+        vis_door_bottom += "  ---  "
+        vis_door_name += f"{door_name:^7}"
+    vis_door_top += "\n"
+    vis_door_middle += "\n"
+    vis_door_bottom += "\n"
+    vis_door_name += "\n"
+    door_visualization = vis_door_top + \
+        (vis_door_middle * 3) + vis_door_bottom + vis_door_name
+    if can_return == False:
+        return (f"\nOk, {player_name}. I see, that you are standing in front of {number_of_doors} doors.\n"
+                f"{door_visualization}"
+                "Through which one would you like to go?\n")
+    door_visualization += "OR: Return to prev. room\n"
+    return (f"\nOk, {player_name}. I see, that you are standing in front of {number_of_doors} doors.\n"
+            f"{door_visualization}"
+            "Through which one would you like to go - or do you want to return?\n")
+
+def render_win() -> str:
+    """Message for a player, who has won the game
+
+    Returns:
+        str: message
+    """
+    return (f"{horizontal_line}\n"
+        "\n"
+        "#                     #  #  #       #\n"
+        " #         #         #   #  # #     #\n"
+        "  #       # #       #    #  #  #    #\n"
+        "   #     #   #     #     #  #   #   #\n"
+        "    #   #     #   #      #  #    #  #\n"
+        "     # #       # #       #  #     # #\n"
+        "      #         #        #  #       #\n"
+        f"{horizontal_line}\n"
+        "\nCongratulations, you have found all the enemies in this place. You may now run around this place for as long as you want - or exit the game.\n"
+        f"{horizontal_line}\n")
+
+def render_event(event: dict, state: GameState) -> str:
+    """Text for an event of the game engine. Pauses have no text - they are displayed as animation.
+
+    Args:
+        event (dict): event of the game engine
+        state (GameState): current state of the game
+
+    Returns:
+        str: text of the event
+    """
+    kind = event["type"]
+    if kind == "message":
+        return event["text"] + "\n"
+    if kind == "travel":
+        count = len(event["rooms"])
+        return f"\nYou hurry through {count} {'room' if count == 1 else 'rooms'}, which you already know.\n"
+    if kind == "doors":
+        return render_doors(state.player_name, event["doors"], can_return=event["can_return"])
+    if kind == "item_found":
+        text = f"\nYou found a new item: {event['item']}! Do you want to take it ?\n"
+        # Drawings of items are loaded from the asset pack
+        image = state.world.item_image(event["item_id"])
+        if image != "":
+            text += image + "\n"
+        return text
+    if kind == "enemy":
+        return f"\nOh boy, you have encountered a {event['enemy']}. Would you like to fight it or hide and back off ?\n"
+    if kind == "missing_weapons":
+        return f"\nUf, fighting a {event['enemy']} without the right kind of weapons – this was hopeless. "
+    if kind == "weapons":
+        return "\nLuckily, you have all the necessary weapons: " + ", ".join(event["weapons"]) + "\n"
+    if kind == "no_multiplier":
+        return "\nBut I noticed, you have no items which amplify the strength of your weapon - this is a pitty.\n"
+    if kind == "dice_prompt":
+        return "\nThe outcome of the fight depends on your dice throw! Are you ready?"
+    if kind == "dice":
+        return f"\nYou rolled a {event['number']}\n"
+    if kind == "cannot_hide":
+        return f"\nUps, you can´t hide from a {event['enemy']}\n"
+    if kind == "fight_result" and event["outcome"] == "win":
+        return f"\nCongratulations, {state.player_name}! You defeated the {event['enemy']}!\n"
+    if kind == "items_lost":
+        return "Whoa, this did not end up lucky for you - you have lost all your items.\n"
+    if kind == "win":
+        return render_win()
+    if kind == "death":
+        cause = event["cause"]
+        if cause in state.world.item_ids:
+            return (f"\nUf, to take this {cause} wasn´t a good choice. As your gaze beginns to rotate, you realize this wasn´t a good idea.\n"
+                    f"The {cause} was toxic - you die and loose the game.\n"
+                    f"{horizontal_line}\n")
+        if cause in state.world.enemy_ids:
+            return f"You got eaten by the {cause} and lost the game. I am sorry.\n"
+    return ""
@@ -0,0 +1,270 @@
+import argparse
+import collections
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import time
+from gameengine import GameState, start_game, step
+from gamereplay import read_transcript
+from gameworld import World, default_world
+
+########################################################################
+# Tournament Runner
+########################################################################
+# Plays many seeded games with a policy (a bot, which chooses the commands) across all cores and merges the
+# statistics into a balance report: win rate, causes of death, items lost to enemies, turns to win and how often
+# found items are taken. The games are split into chunks, every worker process plays whole chunks and returns
+# the counters of its chunk - so only a few kilobytes per chunk travel between the processes. The world is
+# compiled once per worker (when the worker imports the game).
+#
+# Game number i is played with random.Random(seed + i) (for the policy and the dice), so every game of a report
+# can be played again.
+#
+# Policies:
+## - random: chooses any valid option
+## - greedy: takes every item, fights when it has the weapons (hides otherwise) and prefers doors to unvisited rooms
+## - scripted: plays the commands of a transcript and continues randomly, when they are used up or not valid
+## - module:Class: any class with start(state, rng) and choose(state, rng) -> command
+#
+# Usage:
+##   python gametournament.py [--games 1000000] [--policy random greedy scripted] [--workers 8] [--seed 1]
+
+# Turns, after which an unfinished game is counted as timeout
+max_turns = 500
+
+class RandomPolicy:
+    """Chooses any valid option"""
+
+    def start(self, state: GameState, rng: random.Random):
+        """Prepare a new game"""
+
+    def choose(self, state: GameState, rng: random.Random) -> str:
+        """Next command for the pending decision"""
+        return rng.choice(state.options())
+
+class GreedyPolicy:
+    """Takes every item, fights when it has the weapons (hides otherwise) and prefers doors to unvisited rooms"""
+
+    def start(self, state: GameState, rng: random.Random):
+        """Prepare a new game"""
+        self.visited = {state.room}
+
+    def choose(self, state: GameState, rng: random.Random) -> str:
+        """Next command for the pending decision"""
+        pending = state.pending
+        options = state.options()
+        self.visited.add(state.room)
+        if pending["kind"] == "item":
+            return "take"
+        if pending["kind"] == "fight":
+            enemy = pending["enemy"]
+            return "fight" if state.player_items.has_defeat_items(enemy) or not enemy["canHide"] else "hide"
+        transitions = state.world.rooms[state.room].transitions
+        unvisited = [option for option in options if option in transitions and transitions[option][0] not in self.visited]
+        return rng.choice(unvisited or options)
+
+class ScriptedPolicy:
+    """Plays the commands of a transcript, continues randomly when they are used up or not valid
+
+    Args:
+        path (str, optional): file of the transcript. Defaults to the winning playthrough in transcripts/.
+    """
+
+    def __init__(self, path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts", "winning-playthrough.jsonl")):
+        self.commands = read_transcript(path)["commands"]
+
+    def start(self, state: GameState, rng: random.Random):
+        """Prepare a new game"""
+        self.position = 0
+
+    def choose(self, state: GameState, rng: random.Random) -> str:
+        """Next command for the pending decision"""
+        options = state.options()
+        if self.position < len(self.commands) and self.commands[self.position] in options:
+            self.position += 1
+            return self.commands[self.position - 1]
+        self.position = len(self.commands)
+        return rng.choice(options)
+
+policies = {"random": RandomPolicy, "greedy": GreedyPolicy, "scripted": ScriptedPolicy}
+
+def load_policy(name: str):
+    """Create a policy by its name
+
+    Args:
+        name (str): 'random', 'greedy', 'scripted' or 'module:Class'
+
+    Raises:
+        ValueError: if there is no policy with this name
+
+    Returns:
+        object: the policy
+    """
+    if name in policies:
+        return policies[name]()
+    module, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown policy '{name}', expected one of {', '.join(policies)} or module:Class")
+    return getattr(importlib.import_module(module), attribute)()
+
+def play_games(policy_name: str, first: int, count: int, seed: int, world: World = default_world) -> dict:
+    """Play a chunk of games
+
+    Args:
+        policy_name (str): name of the policy (see load_policy())
+        first (int): number of the first game
+        count (int): number of games
+        seed (int): seed of the tournament
+        world (World, optional): compiled world. Defaults to default_world.
+
+    Returns:
+        dict: counters of the games (see merge())
+    """
+    policy = load_policy(policy_name)
+    outcomes = collections.Counter()
+    deaths = collections.Counter()
+    items_lost = collections.Counter()
+    found = collections.Counter()
+    taken = collections.Counter()
+    turns_to_win = collections.Counter()
+    turns = 0
+    for game in range(first, first + count):
+        rng = random.Random(seed + game)
+        state = GameState("Bot", world=world, rng=rng)
+        events = start_game(state)
+        policy.start(state, rng)
+        turn = 0
+        outcome = "timeout"
+        enemy = None
+        while True:
+            for event in events:
+                kind = event["type"]
+                if kind == "item_found":
+                    found[event["item"]] += 1
+                elif kind == "item_taken":
+                    taken[event["item"]] += 1
+                elif kind == "fight_result":
+                    enemy = event["enemy"]
+                elif kind == "items_lost" and event["items"]:
+                    # The items are lost to the enemy of the fight, which was just lost
+                    items_lost[enemy] += 1
+                elif kind == "win":
+                    outcome = "win"
+                elif kind == "death":
+                    outcome = "death"
+                    deaths[event["cause"]] += 1
+                    # Taking a death item ends the game without an item_taken event
+                    if event["cause"] in world.item_ids:
+                        taken[event["cause"]] += 1
+            if outcome != "timeout" or turn >= max_turns:
+                break
+            state, events = step(state, policy.choose(state, rng))
+            turn += 1
+        outcomes[outcome] += 1
+        if outcome == "win":
+            turns_to_win[turn] += 1
+        turns += turn
+    return {"games": count, "turns": turns, "outcomes": outcomes, "deaths": deaths, "items_lost": items_lost,
+            "found": found, "taken": taken, "turns_to_win": turns_to_win}
+
+def merge(results) -> dict:
+    """Add up the counters of several chunks
+
+    Args:
+        results (iterable): results of play_games()
+
+    Returns:
+        dict: 'games', 'turns' and the counters 'outcomes' (win / death / timeout), 'deaths' (cause), 'items_lost'
+            (enemy, which took the items), 'found' and 'taken' (item) and 'turns_to_win' (turns -> games)
+    """
+    total = {"games": 0, "turns": 0}
+    for result in results:
+        for key, value in result.items():
+            if isinstance(value, collections.Counter):
+                total.setdefault(key, collections.Counter()).update(value)
+            else:
+                total[key] += value
+    return total
+
+def tournament(policy_name: str, games: int, seed: int = 0, workers: int = None, chunk: int = 1000) -> dict:
+    """Play games in a pool of worker processes
+
+    Args:
+        policy_name (str): name of the policy (see load_policy())
+        games (int): number of games
+        seed (int, optional): seed of the tournament. Defaults to 0.
+        workers (int, optional): number of processes. Defaults to the number of cores.
+        chunk (int, optional): games per task of a worker. Defaults to 1000.
+
+    Returns:
+        dict: merged counters (see merge())
+    """
+    # Fail early (and not in every worker), if the policy doesn´t exist
+    load_policy(policy_name)
+    tasks = [(policy_name, first, min(chunk, games - first), seed) for first in range(0, games, chunk)]
+    if workers == 1:
+        return merge(play_games(*task) for task in tasks)
+    with multiprocessing.Pool(workers) as pool:
+        return merge(pool.starmap(play_games, tasks, chunksize=1))
+
+def report(policy_name: str, total: dict) -> dict:
+    """Balance report of a tournament
+
+    Args:
+        policy_name (str): name of the policy
+        total (dict): result of tournament()
+
+    Returns:
+        dict: rates and distributions of the tournament
+    """
+    games = total["games"]
+    wins = total["outcomes"]["win"]
+    turns_to_win = sorted(total["turns_to_win"].elements())
+    return {"policy": policy_name, "games": games, "turns": total["turns"],
+            "win_rate": wins / games if games else 0.0,
+            "death_rate": total["outcomes"]["death"] / games if games else 0.0,
+            "timeout_rate": total["outcomes"]["timeout"] / games if games else 0.0,
+            "deaths": {cause: count / games for cause, count in total["deaths"].most_common()},
+            "items_lost": {enemy: count / games for enemy, count in total["items_lost"].most_common()},
+            "turns_to_win": {"mean": sum(turns_to_win) / wins, "p50": turns_to_win[wins // 2],
+                             "p90": turns_to_win[wins * 9 // 10], "min": turns_to_win[0], "max": turns_to_win[-1]} if wins else None,
+            "pickup_rate": {item: total["taken"][item] / count for item, count in sorted(total["found"].items())}}
+
+def print_report(result: dict, seconds: float):
+    """Display a balance report
+
+    Args:
+        result (dict): result of report()
+        seconds (float): duration of the tournament
+    """
+    print(f"\n=== {result['policy']}: {result['games']:,} games, {result['turns']:,} turns in {seconds:.1f} s "
+          f"({result['games'] / max(seconds, 1e-9):,.0f} games/s)")
+    print(f"won {result['win_rate']:.2%}, died {result['death_rate']:.2%}, timeout {result['timeout_rate']:.2%}")
+    for cause, rate in result["deaths"].items():
+        print(f"  died by {cause}: {rate:.2%}")
+    for enemy, rate in result["items_lost"].items():
+        print(f"  items lost to {enemy}: {rate:.2%}")
+    if result["turns_to_win"] is not None:
+        print("turns to win: " + ", ".join(f"{key} {value:.1f}" for key, value in result["turns_to_win"].items()))
+    print("items taken when found: " + ", ".join(f"{item} {rate:.2%}" for item, rate in result["pickup_rate"].items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many games with bots and report win rates and balance statistics")
+    parser.add_argument("--games", type=int, default=100_000, help="number of games per policy")
+    parser.add_argument("--policy", nargs="+", default=["random", "greedy", "scripted"], help="policies: random, greedy, scripted or module:Class")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the tournament")
+    parser.add_argument("--chunk", type=int, default=1000, help="games per task of a worker")
+    parser.add_argument("--json", metavar="FILE", help="also write the reports into this file")
+    arguments = parser.parse_args()
+    results = []
+    for policy_name in arguments.policy:
+        start = time.perf_counter()
+        total = tournament(policy_name, arguments.games, arguments.seed, arguments.workers, arguments.chunk)
+        results.append(report(policy_name, total))
+        print_report(results[-1], time.perf_counter() - start)
+    if arguments.json is not None:
+        with open(arguments.json, "w", encoding="utf-8") as report_file:
+            json.dump(results, report_file, indent=2)
@@ -0,0 +1,262 @@
+import argparse
+import time
+import numpy as np
+from gameengine import GameState, check_win, start_game, step
+from gameworld import World, default_world
+
+########################################################################
+# Vectorized Batch Environment
+########################################################################
+# Runs many independent games side by side, eg. for training agents or balance sweeps. Instead of running the
+# game engine once per game and turn, the engine is used once to explore every decision, which can be reached in
+# a world - the result is an automaton: every node is a decision of the player (room, returns, items, defeated
+# enemies and what is asked), every edge the outcome of an option for each face of the dice. Stepping N games is
+# then a lookup in NumPy arrays:
+##   next nodes = transitions[nodes, actions, faces]
+# The faces of the dice are drawn in bulk for all games at once (fights with 'dice' and 'damage>..&dice'
+# conditions use them, 'random' conditions use their parity like the engine, other steps ignore them).
+#
+# Observations are arrays with one row per game: room ids, whether the player returns, items and defeated enemies
+# as bitsets (uint64 words), the kind of the decision and a mask of the valid actions. An action is the index of
+# an option of the current decision (in the order of GameState.options()), an invalid index leaves the game
+# unchanged. Finished games (won or dead) start again automatically.
+#
+# The automaton only covers worlds, whose reachable decisions fit into memory (the default world has a few
+# hundred) - exploring stops with an error after max_nodes decisions.
+#
+# Usage:
+##   python gamevec.py [--games 100000] [--steps 200] [--seed 1]
+
+# Kinds of decisions in the observations (index of the kind)
+decision_kinds = ("doors", "options", "item", "fight", "dice", "continue", "dead")
+
+class Automaton:
+    """All decisions, which can be reached in a world, and the outcome of every option
+
+    Args:
+        world (World, optional): compiled world. Defaults to default_world.
+        max_nodes (int, optional): maximum number of decisions. Defaults to 1_000_000.
+
+    Raises:
+        ValueError: if the world has more than max_nodes reachable decisions
+    """
+
+    def __init__(self, world: World = default_world, max_nodes: int = 1_000_000):
+        self.world = world
+        self.words = max(1, (max(len(world.items), len(world.enemies)) + 63) // 64)
+        # Node -> state of the engine (only needed while exploring)
+        states = []
+        node_ids = {}
+        self.options = []
+        self.causes = []
+        cause_ids = {}
+        rows = []
+
+        def node(state: GameState) -> int:
+            key = _key(state)
+            if key not in node_ids:
+                if len(states) >= max_nodes:
+                    raise ValueError(f"The world has more than {max_nodes} reachable decisions")
+                node_ids[key] = len(states)
+                states.append(_copy(state))
+                cause = state.pending["cause"] if state.is_over() else None
+                if cause is not None and cause not in cause_ids:
+                    cause_ids[cause] = len(self.causes)
+                    self.causes.append(cause)
+                rows.append((state.room, state.player_returns, _bits(state.player_items), _bits(state.player_dead_enemies),
+                             decision_kinds.index(state.pending["kind"]), state.is_over(),
+                             check_win(state) and not state.is_over(), cause_ids.get(cause, -1)))
+                self.options.append(state.options())
+            return node_ids[key]
+
+        state = GameState(world=world, rng=_Dice())
+        start_game(state)
+        self.start = node(state)
+        # Breadth-first exploration: every option of every decision with every face of the dice
+        edges = []
+        index = 0
+        while index < len(states):
+            targets = []
+            if not (rows[index][5] or rows[index][6]):
+                for command in self.options[index]:
+                    faces = []
+                    for face in range(1, 7):
+                        state = _copy(states[index])
+                        state.rng = dice = _Dice(face)
+                        state, _ = step(state, command)
+                        faces.append(node(state))
+                        # Without a dice throw, all faces have the same outcome
+                        if not dice.thrown:
+                            faces *= 6
+                            break
+                    targets.append(faces)
+            edges.append(targets)
+            index += 1
+        width = max(1, max(len(options) for options in self.options))
+        count = len(states)
+        # Node -> action -> face -> next node (invalid actions and finished games stay in their node)
+        self.transitions = np.repeat(np.arange(count, dtype=np.int32), width * 6).reshape(count, width, 6)
+        for index, targets in enumerate(edges):
+            for action, faces in enumerate(targets):
+                self.transitions[index, action] = faces
+        self.room = np.array([row[0] for row in rows], dtype=np.int32)
+        self.returns = np.array([row[1] for row in rows], dtype=bool)
+        self.items = np.array([_words(row[2], self.words) for row in rows], dtype=np.uint64).reshape(count, self.words)
+        self.defeated = np.array([_words(row[3], self.words) for row in rows], dtype=np.uint64).reshape(count, self.words)
+        self.decision = np.array([row[4] for row in rows], dtype=np.int8)
+        self.dead = np.array([row[5] for row in rows], dtype=bool)
+        self.won = np.array([row[6] for row in rows], dtype=bool)
+        self.cause = np.array([row[7] for row in rows], dtype=np.int16)
+        self.finished = self.dead | self.won
+        self.reward = self.won.astype(np.float32) - self.dead.astype(np.float32)
+        self.option_count = np.array([len(options) for options in self.options], dtype=np.int32)
+        self.valid = np.arange(width) < self.option_count[:, None]
+
+    def __len__(self) -> int:
+        """Number of decisions"""
+        return len(self.room)
+
+class BatchEnv:
+    """N independent games, which are advanced together
+
+    Args:
+        games (int): number of games
+        world (World | Automaton, optional): compiled world or its automaton (to share it between environments).
+            Defaults to default_world.
+        seed (int, optional): seed of the dice. Defaults to None.
+    """
+
+    def __init__(self, games: int, world=default_world, seed: int = None):
+        self.automaton = world if isinstance(world, Automaton) else Automaton(world)
+        self.games = games
+        self.rng = np.random.default_rng(seed)
+        self.nodes = np.full(games, self.automaton.start, dtype=np.int32)
+        # Number of turns of the running games
+        self.turns = np.zeros(games, dtype=np.int32)
+
+    def reset(self) -> dict:
+        """Start all games again
+
+        Returns:
+            dict: observations (see observe())
+        """
+        self.nodes[:] = self.automaton.start
+        self.turns[:] = 0
+        return self.observe()
+
+    def observe(self) -> dict:
+        """Observations of all games
+
+        Returns:
+            dict: arrays with one row per game - 'room' (room id), 'returns', 'items' and 'defeated' (bitsets as
+                uint64 words, bit i is item / enemy i), 'decision' (index in decision_kinds) and 'valid' (mask of
+                the valid actions)
+        """
+        automaton = self.automaton
+        nodes = self.nodes
+        return {"room": automaton.room[nodes], "returns": automaton.returns[nodes], "items": automaton.items[nodes],
+                "defeated": automaton.defeated[nodes], "decision": automaton.decision[nodes], "valid": automaton.valid[nodes]}
+
+    def step(self, actions: np.ndarray):
+        """Advance every game by one action
+
+        Args:
+            actions (np.ndarray): index of the chosen option per game
+
+        Returns:
+            dict: observations after the step (finished games have already started again)
+            np.ndarray: reward per game (1 for a win, -1 for a death, 0 otherwise)
+            np.ndarray: True for every game, which has finished with this step
+            dict: 'invalid' (the action wasn´t valid), 'turns' (turns of the finished games) and 'cause' (index in
+                Automaton.causes of the death, -1 if the player didn´t die)
+        """
+        automaton = self.automaton
+        actions = np.asarray(actions)
+        invalid = (actions < 0) | (actions >= automaton.option_count[self.nodes])
+        faces = self.rng.integers(0, 6, size=self.games)
+        nodes = automaton.transitions[self.nodes, np.where(invalid, 0, actions), faces]
+        nodes = np.where(invalid, self.nodes, nodes)
+        done = automaton.finished[nodes]
+        self.turns += ~invalid
+        info = {"invalid": invalid, "turns": np.where(done, self.turns, 0), "cause": automaton.cause[nodes]}
+        reward = automaton.reward[nodes]
+        self.nodes = np.where(done, automaton.start, nodes).astype(np.int32, copy=False)
+        self.turns[done] = 0
+        return self.observe(), reward, done, info
+
+    def sample_actions(self) -> np.ndarray:
+        """A random valid action for every game"""
+        return (self.rng.random(self.games) * self.automaton.option_count[self.nodes]).astype(np.int32)
+
+class _Dice:
+    # Random number generator of the engine, which always throws the same face (1 to 6)
+    __slots__ = ("face", "thrown")
+
+    def __init__(self, face: int = 1):
+        self.face = face
+        self.thrown = False
+
+    def randint(self, low: int, high: int) -> int:
+        self.thrown = True
+        return low + (self.face - 1) % (high - low + 1)
+
+def _copy(state: GameState) -> GameState:
+    copy = GameState(state.player_name, world=state.world, rng=state.rng)
+    copy.room = state.room
+    copy.player_returns = state.player_returns
+    for id in state.player_items:
+        copy.player_items.add(id)
+    copy.player_dead_enemies = list(state.player_dead_enemies)
+    # The pending decision and the queued actions are never changed by the engine, only replaced
+    copy.pending = state.pending
+    copy.queue = list(state.queue)
+    return copy
+
+def _key(state: GameState) -> tuple:
+    # Two states with the same key have the same future
+    return (state.room, state.player_returns, _bits(state.player_items), _bits(state.player_dead_enemies),
+            _signature(state.pending), tuple(_signature(action) for action in state.queue))
+
+def _signature(value):
+    # Compiled actions and decisions are shared objects - only the dicts, which the engine creates while playing
+    # (found items, dice throws, ...), are compared by their content
+    if value is None:
+        return None
+    return tuple((key, item["id"] if isinstance(item, dict) and "id" in item else
+                  item if isinstance(item, (str, int, float, bool, type(None))) else id(item))
+                 for key, item in value.items())
+
+def _bits(ids) -> int:
+    bits = 0
+    for id in ids:
+        bits |= 1 << id
+    return bits
+
+def _words(bits: int, words: int) -> list:
+    return [(bits >> (64 * word)) & 0xFFFF_FFFF_FFFF_FFFF for word in range(words)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many games with random actions in the vectorized environment")
+    parser.add_argument("--games", type=int, default=100_000, help="number of games, which are played side by side")
+    parser.add_argument("--steps", type=int, default=200, help="number of steps")
+    parser.add_argument("--seed", type=int, help="seed of the dice and the actions")
+    arguments = parser.parse_args()
+    start = time.perf_counter()
+    automaton = Automaton()
+    print(f"Automaton: {len(automaton)} decisions in {(time.perf_counter() - start) * 1000:.1f} ms")
+    env = BatchEnv(arguments.games, automaton, arguments.seed)
+    env.reset()
+    wins = deaths = 0
+    causes = np.zeros(len(automaton.causes) + 1, dtype=np.int64)
+    start = time.perf_counter()
+    for _ in range(arguments.steps):
+        _, reward, done, info = env.step(env.sample_actions())
+        wins += int((reward > 0).sum())
+        deaths += int((reward < 0).sum())
+        causes += np.bincount(info["cause"][done] + 1, minlength=len(causes))
+    duration = time.perf_counter() - start
+    steps = arguments.games * arguments.steps
+    print(f"{steps:,} steps in {duration:.2f} s ({steps / duration:,.0f} steps/s)")
+    print(f"{wins + deaths:,} finished games: {wins:,} won, {deaths:,} died")
+    for cause, count in zip(automaton.causes, causes[1:]):
+        print(f"  died by {cause}: {count:,}")
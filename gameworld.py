@@ -0,0 +1,507 @@
+import pathlib
+
+########################################################################
+# World Definition
+########################################################################
+# The whole game world is described as data: items, enemies and rooms. Each room has a unique key, the actions
+# which happen when the player enters it (or returns to it) and the decisions which lead to other rooms.
+# compile_world() turns this definition once into a World with integer room ids and transition tables,
+# so the game engine never has to compare or concatenate state strings.
+#
+# Actions of a room (a plain string is a shortcut for a message):
+## {"kind": "message", "text": "..."}
+## {"kind": "message", "if_item": "sword", "text": "...", "else_text": "..."}
+## {"kind": "pause"}
+## {"kind": "fight", "enemy": "dragon"}
+## {"kind": "loot", "items": ["sword"], "enemies": [], "found_text": "...", "empty_text": "..."}
+## {"kind": "requires", "item": "torch", "else": [actions, which replace the rest of the room]}
+## {"kind": "death", "cause": "cliff"}
+#
+# The art of the items is not part of the definition - it is kept in an asset pack (assets/item-art.txt) and only
+# loaded, when an image is displayed for the first time.
+
+without_leprechaun = "\nWithout the leprechaun standing in the way you are able to analyze the nest, in which he was collecting his prey."
+
+world_definition = {
+    "items": [
+        {"name": "sword", "type": "weapon", "score": 10, "image": "sword"},
+        {"name": "ring", "type": "multiplier_item", "score": 2, "image": "ring"},
+        {"name": "torch", "type": "discover_item", "score": 0, "image": "torch"},
+        {"name": "suspicious berry", "type": "death_item", "score": 0, "image": "suspicious berry"},
+    ],
+    "enemies": [
+        {"name": "leprechaun", "defeat_items": ["sword"], "defeat_condition": "dice -5", "loss_consequence": "loose_items", "canHide": False},
+        {"name": "dragon", "defeat_items": ["sword"], "defeat_condition": "damage>41&dice", "loss_consequence": "death", "canHide": True},
+    ],
+    # Enemies, which have to be defeated to win the game
+    "winning_enemies": ["dragon", "leprechaun"],
+    "start": "",
+    "assets": pathlib.Path(__file__).parent.joinpath("assets/item-art.txt"),
+    "rooms": [
+        ########################################################################
+        # Start-Room
+        {"key": "",
+         "doors": {"left": "_leftroom", "middle": "_middleroom", "right": "_rightroom"}},
+        ########################################################################
+        # Left-Room
+        {"key": "_leftroom",
+         "enter": ["\nAs you walk into the room behind the left door, you see that the room is empty. You may now decide to return to the previous room or inspect the room further."],
+         "return": ["\nYou are standing on the edge of the seemingless empty room on the left side again - You may now decide to return to the previous room or inspect the room again."],
+         "options": {"return": "", "inspect": "_leftroom_inspect"}},
+        {"key": "_leftroom_inspect",
+         "enter": [{"kind": "loot", "items": ["sword"],
+                    "found_text": "\nYou start to closely inspect the seemingless empty room - oh what is this:",
+                    "empty_text": "\nThere is nothing more to find in this room"},
+                   "\nWould you like to stay in the room or return ?"],
+         "options": {"return": "_leftroom", "stay": "_leftroom_inspect"}},
+        ########################################################################
+        # Middle-Room
+        {"key": "_middleroom",
+         "enter": ["\nOh, this room seems to just be hallway for further adventures. It is a very long and narrow corridor with some light at the end.\nDo you want to go down the hallway or return ?"],
+         "return": ["\nHere you are, back at the beginning of the narrow corridor behind the middle door. Would you like to return through the middle door or head back down the hallway?"],
+         "options": {"go down": "_middleroom_go down", "return": ""}},
+        {"key": "_middleroom_go down",
+         "enter": ["\nSo, the light at the end of the corridor is a torch stuck between two doors."],
+         "return": ["\nYou are now standing in front of the two doors again, which are seperated by a torch."],
+         "doors": {"old": "_middleroom_go down_oldroom", "modern": "_middleroom_go down_modernroom", "return": "_middleroom"}},
+        {"key": "_middleroom_go down_oldroom",
+         "enter": ["\nThe oak door creaks heavily as you push it, but with some effort you manage to open it. You look into a dusty and mysterious room - where you can´t see anything.",
+                   "\nWould you like to inspect the dark room or return?"],
+         "return": ["\nYou stand at the edge of room and extinguish your torch again. You may go back and inspect the room again or return through the old door."],
+         "options": {"inspect": "_middleroom_go down_oldroom_inspect", "return": "_middleroom_go down"}},
+        {"key": "_middleroom_go down_oldroom_inspect",
+         "enter": [{"kind": "requires", "item": "torch",
+                    "else": ["\nIt is super dark in this room - what were you thinking? You carefully take your first leap...",
+                             {"kind": "pause"},
+                             "and step into the void. You lose your balance and fall into the depths of a cliff. Sorry, you have died and lost the game.",
+                             {"kind": "death", "cause": "cliff"}]},
+                   "\nWhen you are already about to go into the room, you remeber, that you have picked up a torch before.\nYou light up your torch and look into the room:",
+                   {"kind": "pause"},
+                   "\nThat was close: You are literally standing on the edge of a cliff. But with the light of the torch you manage to circumvent the danger - and head straight to an old box, which stands right behind the cliff.",
+                   "\nYou open up the box, and:",
+                   {"kind": "pause"},
+                   {"kind": "loot", "items": ["ring"], "found_text": "", "empty_text": "\nThere is nothing more to find here."},
+                   {"kind": "message", "if_item": "sword",
+                    "text": "\nThis is a pretty ring - actually, did you realize, that your sword started shining once you took the ring ?",
+                    "else_text": "\nThis is a pretty ring - actually, did you realize, there is a sword engraved on the side of the ring?"},
+                   "\nWould you like to stay here or return ?"],
+         "options": {"return": "_middleroom_go down_oldroom", "stay": "_middleroom_go down_oldroom_inspect"}},
+        {"key": "_middleroom_go down_modernroom",
+         "enter": [{"kind": "fight", "enemy": "leprechaun"},
+                   {"kind": "loot", "items": ["torch", "suspicious berry"], "enemies": ["leprechaun"],
+                    "found_text": without_leprechaun, "empty_text": without_leprechaun},
+                   "\nWould you like to stay or return?"],
+         "options": {"stay": "_middleroom_go down_modernroom", "return": "_middleroom_go down"}},
+        ########################################################################
+        # Right-Room
+        {"key": "_rightroom",
+         "enter": [{"kind": "fight", "enemy": "dragon"},
+                   "\nThere is nothing more to find in this room\nWould you like to stay in the room or return ?"],
+         "options": {"return": "", "stay": "_rightroom"}},
+    ],
+}
+
+########################################################################
+# Compiled World
+########################################################################
+
+class Room:
+    """Compiled room of the world
+
+    Attributes:
+        id (int): index of the room in World.rooms
+        key (str): unique key of the room in the world definition (same as the old player_state strings)
+        parent (int): id of the room, to which 'return' leads (-1 for the start room)
+        transitions (dict): command -> (id of the next room, whether the player returns)
+        enter_actions (tuple): actions when the player enters the room
+        return_actions (tuple): actions when the player returns to the room
+        items (list): ids of the items, which can be found in the room
+        enemies (list): ids of the enemies in the room
+    """
+    __slots__ = ("id", "key", "parent", "transitions", "enter_actions", "return_actions", "items", "enemies")
+
+    def __init__(self, id: int, key: str):
+        self.id = id
+        self.key = key
+        self.parent = -1
+        self.transitions = {}
+        self.enter_actions = ()
+        self.return_actions = ()
+        self.items = []
+        self.enemies = []
+
+class World:
+    """Compiled game world with integer room ids and O(1) transition tables. It is also the registry of all items
+    and enemies: every item and enemy exists exactly once and is referred to by its integer id.
+
+    Attributes:
+        rooms (list): all rooms, the index of a room is its id
+        room_ids (dict): key of a room -> id of the room
+        items (list): all items, the index of an item is its id
+        enemies (list): all enemies, the index of an enemy is its id
+        item_ids (dict): name of an item -> id of the item
+        enemy_ids (dict): name of an enemy -> id of the enemy
+        item_enemies (list): per item the ids of the enemies, for which it is a defeat item
+        winning_enemies (frozenset): ids of the enemies, which have to be defeated to win the game
+        start (int): id of the room, in which a new game starts
+        assets_path (pathlib.Path): asset pack with the art of the items
+        routes (Routes): routes between the rooms (for the goto command)
+    """
+
+    def __init__(self):
+        self.rooms = []
+        self.room_ids = {}
+        self.items = []
+        self.enemies = []
+        self.item_ids = {}
+        self.enemy_ids = {}
+        self.item_enemies = []
+        self.winning_enemies = frozenset()
+        self.start = 0
+        self.assets_path = None
+        self.routes = Routes(self)
+        self._images = None
+
+    def room_id(self, key: str) -> int:
+        """Find the id of a room by its key
+
+        Args:
+            key (str): key of the room (eg. an old player_state string from a saved game)
+
+        Raises:
+            ValueError: if the world has no room with this key
+
+        Returns:
+            int: id of the room
+        """
+        if key not in self.room_ids:
+            raise ValueError(f"Unknown room '{key}'")
+        return self.room_ids[key]
+
+    def parent(self, id: int) -> int:
+        """Id of the room, to which 'return' leads (-1 for the start room)"""
+        return self.rooms[id].parent
+
+    def children(self, id: int) -> list:
+        """Ids of the rooms behind the doors of a room (the rooms, which return to it)
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            list: ids of the rooms
+        """
+        rooms = self.rooms
+        return list(dict.fromkeys(target for target, returns in rooms[id].transitions.values()
+                                  if not returns and target != id and rooms[target].parent == id))
+
+    def item_image(self, id: int) -> str:
+        """Get the art of an item. The asset pack is loaded, when the first image is requested.
+
+        Args:
+            id (int): id of the item
+
+        Returns:
+            str: art of the item or "", if it has none
+        """
+        if self._images is None:
+            self._images = load_asset_pack(self.assets_path) if self.assets_path is not None else {}
+        return self._images.get(self.items[id]["image"], "")
+
+class Routes:
+    """Routes between the rooms of a world. 'return' leads every room back to the room, from which it is entered,
+    so the rooms form a tree and the shortest route between two rooms goes up to their closest common room and
+    down again. The ways up are followed with World.parent() (which a generated dungeon computes from the id of
+    the room) when a route is needed - nothing is stored, so the routes cost no memory, however many rooms the
+    players discover.
+    """
+
+    def __init__(self, world: "World"):
+        self.world = world
+
+    def path(self, id: int) -> list:
+        """Way down from the top of the tree to a room
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            list: ids of the rooms from the top of the tree down to the room
+        """
+        path = [id]
+        parent = self.world.parent(id)
+        while parent >= 0:
+            path.append(parent)
+            parent = self.world.parent(parent)
+        path.reverse()
+        return path
+
+    def entry(self, id: int) -> str:
+        """Command in the room above a room, which leads into it
+
+        Args:
+            id (int): id of the room
+
+        Returns:
+            str: command or None, if the room can´t be entered from the room above it
+        """
+        parent = self.world.parent(id)
+        if parent < 0:
+            return None
+        return next((command for command, (target, returns) in self.world.rooms[parent].transitions.items()
+                     if target == id and not returns), None)
+
+    def route(self, source: int, target: int) -> list:
+        """Route between two rooms
+
+        Args:
+            source (int): id of the room, in which the route starts
+            target (int): id of the room, in which the route ends
+
+        Returns:
+            list: (command, id of the next room) for every step of the route or None, if there is no route
+        """
+        source_path = self.path(source)
+        target_path = self.path(target)
+        if source_path[0] != target_path[0]:
+            return None
+        common = 1
+        while common < min(len(source_path), len(target_path)) and source_path[common] == target_path[common]:
+            common += 1
+        route = [("return", room) for room in reversed(source_path[common - 1:-1])]
+        route += [(self.entry(room), room) for room in target_path[common:]]
+        if any(command is None for command, _ in route):
+            return None
+        return route
+
+def load_asset_pack(path: pathlib.Path) -> dict:
+    """Load all images of an asset pack. Every image starts with a line '@@ <name of the image>'.
+
+    Args:
+        path (pathlib.Path): path of the asset pack
+
+    Returns:
+        dict: name of the image -> image
+    """
+    images = {}
+    name = None
+    with open(path, "r") as asset_file:
+        lines = asset_file.read().splitlines(keepends=True)
+    for line in lines:
+        if line.startswith("@@ "):
+            name = line[3:].rstrip("\n")
+            images[name] = ""
+        elif name is not None:
+            images[name] += line
+    return images
+
+def compile_world(definition: dict) -> World:
+    """Compile a world definition into a World, which can be used by the game engine
+
+    Args:
+        definition (dict): world definition, see world_definition for an example
+
+    Raises:
+        ValueError: if the definition refers to rooms, items or enemies, which do not exist
+
+    Returns:
+        World: compiled world
+    """
+    world = World()
+    compile_registry(world, definition)
+    # 1. Assign an integer id to every room
+    for room_definition in definition["rooms"]:
+        if room_definition["key"] in world.room_ids:
+            raise ValueError(f"Room '{room_definition['key']}' is defined twice")
+        room = Room(len(world.rooms), room_definition["key"])
+        world.rooms.append(room)
+        world.room_ids[room.key] = room.id
+    world.start = world.room_id(definition["start"])
+    # 2. Build transition tables and actions of every room
+    for room_definition in definition["rooms"]:
+        compile_room(world, world.rooms[world.room_ids[room_definition["key"]]], room_definition)
+    return world
+
+def parse_defeat_condition(condition: str) -> dict:
+    """Parse the defeat condition of an enemy. There are different kinds of conditions:
+    random (50:50 chance), dice (eg. 'dice -5': dice throw smaller than 5, also '+' for bigger and '=' for equal),
+    damage (eg. 'damage>41&dice': damage of the player, multiplied by a dice throw, bigger than 41 - without
+    '&dice' the damage alone decides) and none (every other condition - the player always wins).
+
+    Args:
+        condition (str): defeat condition as written in the world definition
+
+    Raises:
+        ValueError: if a dice or damage condition has no valid number
+
+    Returns:
+        dict: parsed condition with 'kind', 'compare', 'number' and 'multiplier'
+    """
+    parsed = {"kind": "none", "compare": "", "number": 0, "multiplier": ""}
+    try:
+        if condition == "random":
+            parsed["kind"] = "random"
+        elif condition.startswith("dice"):
+            comparison = condition.split()[1]
+            parsed.update(kind="dice", compare=comparison[0], number=int(comparison[1:]))
+        elif condition.startswith("damage"):
+            threshold, _, multiplier = condition.split(">")[1].partition("&")
+            parsed.update(kind="damage", number=int(threshold), multiplier=multiplier)
+    except (IndexError, ValueError):
+        raise ValueError(f"Invalid defeat condition '{condition}'")
+    return parsed
+
+def wins_fight(condition: dict, fight_score: int = 0, dice: int = 0) -> bool:
+    """Decide the outcome of a fight for a parsed defeat condition (all defeat items are available)
+
+    Args:
+        condition (dict): parsed defeat condition
+        fight_score (int, optional): damage the player inflicts (weapons times multiplier items). Defaults to 0.
+        dice (int, optional): dice throw (1 to 6) or for 'random' conditions the random number (0 or 1). Defaults to 0.
+
+    Returns:
+        bool: True, if the player wins the fight
+    """
+    if condition["kind"] == "random":
+        return dice == 1
+    if condition["kind"] == "dice":
+        if condition["compare"] == "+":
+            return dice > condition["number"]
+        if condition["compare"] == "-":
+            return dice < condition["number"]
+        if condition["compare"] == "=":
+            return dice == condition["number"]
+        return False
+    if condition["kind"] == "damage":
+        if condition["multiplier"] == "dice":
+            fight_score *= dice
+        return fight_score > condition["number"]
+    return True
+
+def fight_score(world: World, enemy: dict, item_ids) -> int:
+    """Damage a player with the given items inflicts on an enemy: the score of the weapons, which can be used
+    against the enemy, multiplied by the scores of all multiplier items
+
+    Args:
+        world (World): compiled world
+        enemy (dict): enemy of the world
+        item_ids (iterable): ids of the items of the player
+
+    Returns:
+        int: fight score
+    """
+    multiplier = 1
+    weapon_score = 0
+    for id in item_ids:
+        item = world.items[id]
+        if item["type"] == "multiplier_item":
+            multiplier *= item["score"]
+        elif item["type"] == "weapon" and id in enemy["defeat_item_ids"]:
+            weapon_score += item["score"]
+    return weapon_score * multiplier
+
+def compile_registry(world: World, definition: dict):
+    """Compile the items and enemies of a world definition into the registry of a world (also used by generated
+    worlds, which compile their rooms later)
+
+    Args:
+        world (World): world without items and enemies
+        definition (dict): world definition with 'items', 'enemies' and 'winning_enemies' (the rooms are not used)
+
+    Raises:
+        ValueError: if an enemy refers to an item, which does not exist, or a winning enemy does not exist
+    """
+    world.assets_path = definition.get("assets")
+    # Items and enemies get ids in the order of the definition - new ones have to be added at the end to keep saves valid
+    for item in definition["items"]:
+        world.item_ids[item["name"]] = len(world.items)
+        world.items.append(dict(item, id=len(world.items)))
+    for enemy in definition["enemies"]:
+        defeat_item_ids = frozenset(_find(world.item_ids, name, "item") for name in enemy["defeat_items"])
+        world.enemy_ids[enemy["name"]] = len(world.enemies)
+        world.enemies.append(dict(enemy, id=len(world.enemies), defeat_item_ids=defeat_item_ids,
+                                  condition=parse_defeat_condition(enemy["defeat_condition"])))
+    world.item_enemies = [tuple(enemy["id"] for enemy in world.enemies if item["id"] in enemy["defeat_item_ids"])
+                          for item in world.items]
+    world.winning_enemies = frozenset(_find(world.enemy_ids, name, "enemy") for name in definition["winning_enemies"])
+
+def compile_room(world: World, room: Room, room_definition: dict):
+    """Compile the definition of a room into its transition table and actions. The ids of all rooms have to be
+    known (world.room_id()), the other rooms themselves don´t have to be compiled yet.
+
+    Args:
+        world (World): world with a compiled registry (see compile_registry())
+        room (Room): room, which is compiled
+        room_definition (dict): definition of the room, see world_definition for examples
+
+    Raises:
+        ValueError: if the room refers to rooms, items or enemies, which do not exist
+    """
+    if "doors" in room_definition:
+        prompt = _compile_doors(world, room, room_definition["doors"])
+    else:
+        prompt = _compile_options(world, room, room_definition["options"])
+    room.enter_actions = tuple(_compile_actions(world, room, room_definition.get("enter", []))) + (prompt,)
+    if "return" in room_definition:
+        room.return_actions = tuple(_compile_actions(world, room, room_definition["return"])) + (prompt,)
+    else:
+        room.return_actions = room.enter_actions
+
+def _compile_doors(world: World, room: Room, doors: dict) -> dict:
+    door_names = [door for door in doors if door != "return"]
+    door_options = " or ".join(f"'{door} door'" for door in door_names)
+    options = tuple(f"{door} door" for door in door_names)
+    for door in door_names:
+        room.transitions[f"{door} door"] = (world.room_id(doors[door]), False)
+    can_return = "return" in doors
+    if can_return:
+        message = f"Write eithter {door_options} to select either of them - you may also type 'return' to go back to the previous room"
+        options += ("return",)
+        room.parent = world.room_id(doors["return"])
+        room.transitions["return"] = (room.parent, True)
+    else:
+        message = f"Write eithter {door_options} to select either of them"
+    return {"kind": "prompt",
+            "pending": {"kind": "doors", "message": message, "options": options},
+            "event": {"type": "doors", "doors": door_names, "can_return": can_return}}
+
+def _compile_options(world: World, room: Room, options: dict) -> dict:
+    string_options = " or ".join(f"'{opt}'" for opt in options)
+    for option, key in options.items():
+        room.transitions[option] = (world.room_id(key), option == "return")
+        if option == "return":
+            room.parent = world.room_id(key)
+    return {"kind": "prompt",
+            "pending": {"kind": "options", "message": f"Write eithter {string_options} to select either of them",
+                        "options": tuple(options)},
+            "event": None}
+
+def _compile_actions(world: World, room: Room, actions: list) -> list:
+    compiled_actions = []
+    for action in actions:
+        if isinstance(action, str):
+            action = {"kind": "message", "text": action}
+        else:
+            action = dict(action)
+        if action["kind"] == "fight":
+            action["enemy"] = world.enemies[_find(world.enemy_ids, action["enemy"], "enemy")]
+            room.enemies.append(action["enemy"]["id"])
+        elif action["kind"] == "loot":
+            action["items"] = [world.items[_find(world.item_ids, name, "item")] for name in action["items"]]
+            action["enemies"] = [world.enemies[_find(world.enemy_ids, name, "enemy")] for name in action.get("enemies", [])]
+            room.items += [item["id"] for item in action["items"]]
+        elif action["kind"] == "requires":
+            action["item"] = _find(world.item_ids, action["item"], "item")
+            action["else"] = tuple(_compile_actions(world, room, action["else"]))
+        elif action["kind"] == "message" and "if_item" in action:
+            action["if_item"] = _find(world.item_ids, action["if_item"], "item")
+        compiled_actions.append(action)
+    return compiled_actions
+
+def _find(table: dict, name: str, what: str):
+    if name not in table:
+        raise ValueError(f"Unknown {what} '{name}'")
+    return table[name]
+
+# The world of the game is compiled once, when the game starts
+default_world = compile_world(world_definition)